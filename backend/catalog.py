@@ -0,0 +1,179 @@
+"""In-process, read-only view of the mental model catalog.
+
+The catalog (sections + models) comes from ``seed_data.py`` and does not change
+while the server runs, so it is loaded from MongoDB once after seeding and every
+catalog read endpoint is served from the indexed structures below.  The catalog
+is swapped atomically on an explicit reload, when a change stream reports a
+write, or when the catalog-version document written by ``seeding.py`` changes,
+so readers always see one consistent snapshot.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CATALOG_POLL_INTERVAL = float(os.environ.get("CATALOG_POLL_INTERVAL", "30"))
+
+
+def content_hash(value) -> str:
+    """Stable sha256 of a JSON-serialisable value."""
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CatalogSnapshot:
+    """Immutable indexed copy of the sections and mental_models collections."""
+
+    def __init__(self, sections: List[dict], models: List[dict], meta: Optional[dict] = None):
+        self.sections: Tuple[dict, ...] = tuple(sorted(sections, key=lambda s: s["index"]))
+        self.models: Tuple[dict, ...] = tuple(
+            sorted(models, key=lambda m: (m["section_index"], m["model_index"]))
+        )
+        self.by_id: Dict[str, dict] = {m["id"]: m for m in self.models}
+        self.by_key: Dict[Tuple[str, int], dict] = {
+            (m["section_slug"], m["model_index"]): m for m in self.models
+        }
+        by_section: Dict[str, List[dict]] = {}
+        for m in self.models:
+            by_section.setdefault(m["section_slug"], []).append(m)
+        self.by_section: Dict[str, Tuple[dict, ...]] = {
+            slug: tuple(items) for slug, items in by_section.items()
+        }
+        self.position: Dict[str, int] = {m["id"]: i for i, m in enumerate(self.models)}
+        self.version = content_hash([self.sections, self.models])[:16]
+        self.loaded_at = datetime.now(timezone.utc)
+        # Version/time of the seed data this snapshot was read after (if known)
+        meta = meta or {}
+        self.source_version: Optional[str] = meta.get("version")
+        self.last_modified = self.loaded_at
+        if meta.get("updated_at"):
+            self.last_modified = datetime.fromisoformat(meta["updated_at"])
+        self._derived: Dict[str, object] = {}
+
+    def derived(self, name: str, build: Callable[["CatalogSnapshot"], object]):
+        """Structure computed once from this snapshot (search index, etc.)."""
+        if name not in self._derived:
+            self._derived[name] = build(self)
+        return self._derived[name]
+
+
+class Catalog:
+    """Holder for the current :class:`CatalogSnapshot`."""
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._builders: Dict[str, Callable[[CatalogSnapshot], object]] = {}
+
+    def register(self, name: str, build: Callable[[CatalogSnapshot], object]):
+        """Register a derived structure, built eagerly whenever a snapshot loads."""
+        self._builders[name] = build
+        if self._snapshot is not None:
+            self._snapshot.derived(name, build)
+
+    def derived(self, name: str):
+        return self.snapshot.derived(name, self._builders[name])
+
+    def _build(self, sections: List[dict], models: List[dict], meta: Optional[dict]) -> CatalogSnapshot:
+        snapshot = CatalogSnapshot(sections, models, meta)
+        for name, build in self._builders.items():
+            snapshot.derived(name, build)
+        return snapshot
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            raise RuntimeError("Catalog has not been loaded")
+        return self._snapshot
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version if self._snapshot else None
+
+    async def load(self, db) -> CatalogSnapshot:
+        """(Re)load both collections and atomically swap in the new snapshot."""
+        async with self._lock:
+            sections, models, meta = await asyncio.gather(
+                db.sections.find({}, {"_id": 0}).to_list(None),
+                db.mental_models.find({}, {"_id": 0, "content_hash": 0}).to_list(None),
+                db.meta.find_one({"_id": "catalog"}, {"version": 1, "updated_at": 1}),
+            )
+            # Index building and pre-rendering are CPU-bound; keep them off the event loop
+            snapshot = await asyncio.to_thread(self._build, sections, models, meta)
+            previous = self.version
+            self._snapshot = snapshot
+            if previous != snapshot.version:
+                logger.info(
+                    "Catalog loaded: %d sections, %d models (version %s)",
+                    len(snapshot.sections), len(snapshot.models), snapshot.version,
+                )
+            return snapshot
+
+    # --- Read helpers used by the route handlers ---
+
+    def sections(self) -> Tuple[dict, ...]:
+        return self.snapshot.sections
+
+    def models(self, section: Optional[str] = None) -> Tuple[dict, ...]:
+        snap = self.snapshot
+        if section:
+            return snap.by_section.get(section, ())
+        return snap.models
+
+    def get(self, section_slug: str, model_index: int) -> Optional[dict]:
+        return self.snapshot.by_key.get((section_slug, model_index))
+
+    def get_by_id(self, model_id: str) -> Optional[dict]:
+        return self.snapshot.by_id.get(model_id)
+
+
+async def watch_catalog(
+    db, catalog: Catalog, poll_interval: float = CATALOG_POLL_INTERVAL, reload_db=None
+):
+    """Reload the catalog whenever the catalog collections change.
+
+    Uses a change stream where available (replica sets).  On a standalone
+    server it falls back to polling the catalog-version document, which is one
+    small indexed read per interval.  ``db`` may read from secondaries, but
+    reloads go through ``reload_db`` (default ``db``), which should read from
+    the primary: a change event or a new version can arrive before a lagging
+    secondary has the write, and reloading from it would keep the old models
+    under the new version.
+    """
+    reload_db = reload_db if reload_db is not None else db
+    pipeline = [{"$match": {"ns.coll": {"$in": ["mental_models", "sections", "meta"]}}}]
+    try:
+        async with db.watch(pipeline) as stream:
+            async for _ in stream:
+                # Drain the rest of a burst (e.g. a bulk re-seed) before reloading once
+                while await stream.try_next() is not None:
+                    pass
+                await catalog.load(reload_db)
+        return
+    except OperationFailure as e:
+        logger.info("Catalog change stream unavailable (%s); polling the catalog version", e)
+    except asyncio.CancelledError:
+        raise
+    except PyMongoError:
+        logger.exception("Catalog change stream stopped; polling the catalog version")
+
+    while True:
+        await asyncio.sleep(poll_interval)
+        try:
+            meta = await db.meta.find_one({"_id": "catalog"}, {"version": 1})
+        except PyMongoError:
+            logger.warning("Catalog version check failed", exc_info=True)
+            continue
+        if meta and meta.get("version") != catalog.snapshot.source_version:
+            await catalog.load(reload_db)
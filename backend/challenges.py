@@ -0,0 +1,346 @@
+"""Challenge day completion and streaks.
+
+Completing a day is one conditional ``find_one_and_update``: ``$addToSet``
+guarded by ``completed_days: {$ne: day}``.  The post-image tells whether this
+request added the day, so concurrent completions from several devices can
+neither lose a day nor double count it.  The reflection log is an upsert on the
+unique (user_id, challenge_id, day) index, so retries do not add duplicate logs.
+It is written after the completion update has confirmed that the challenge is
+the caller's active one, together with the streak and stats updates.
+
+The same update ORs the day into ``completion_bitmap`` (bit ``day - 1``) and
+raises ``last_completed_day``.  ``last_run`` (the run ending at the last
+completed day) and ``longest_streak`` are derived from the post-image bitmap
+and written back guarded on that bitmap, so a slower request cannot overwrite
+a newer result.  ``streak`` is always the run ending at the challenge's
+current day; it changes with the date, so it is never stored and every
+response decodes it from the bitmap with a few bit operations instead of
+scanning ``completed_days``.
+
+Starting a challenge resolves its models against the in-memory catalog in the
+order the client chose them, then deactivates the previous challenge and
+inserts the new one in one ordered ``bulk_write``.  A partial unique index
+allows one active challenge per user; a concurrent start that loses the race
+is retried.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import stats
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_DAYS = 30
+CHALLENGE_MODELS = 5
+START_ATTEMPTS = 3
+DUPLICATE_KEY = 11000
+LOG_DEDUPE_MIGRATION_ID = "migration:challenge_log_days"
+BITMAP_MIGRATION_ID = "migration:challenge_bitmap"
+
+STREAK_FIELDS = {"completion_bitmap": 0, "last_completed_day": 0, "last_run": 0, "longest_streak": 0}
+
+
+class NoActiveChallenge(LookupError):
+    pass
+
+
+class InvalidChallenge(ValueError):
+    pass
+
+
+def day_bit(day: int) -> int:
+    return 1 << (day - 1)
+
+
+def bitmap_of(days) -> int:
+    bitmap = 0
+    for day in days:
+        if 1 <= day <= CHALLENGE_DAYS:
+            bitmap |= day_bit(day)
+    return bitmap
+
+
+def run_ending_at(bitmap: int, day: int) -> int:
+    """Number of consecutive completed days ending with ``day``."""
+    if day < 1:
+        return 0
+    missing = ~bitmap & ((1 << day) - 1)
+    return day - missing.bit_length()
+
+
+def longest_run(bitmap: int) -> int:
+    run = 0
+    while bitmap:
+        bitmap &= bitmap << 1
+        run += 1
+    return run
+
+
+def streak_fields(bitmap: int) -> dict:
+    last = bitmap.bit_length()
+    return {
+        "completion_bitmap": bitmap,
+        "last_completed_day": last,
+        "last_run": run_ending_at(bitmap, last),
+        "longest_streak": longest_run(bitmap),
+    }
+
+
+def current_day(challenge: dict, now: Optional[datetime] = None) -> int:
+    started = datetime.fromisoformat(challenge["started_at"])
+    now = now or datetime.now(timezone.utc)
+    return max(min((now - started).days + 1, CHALLENGE_DAYS), 1)
+
+
+def decode(challenge: dict) -> dict:
+    """Add ``current_day`` and the live streak to a stored challenge."""
+    bitmap = challenge.get("completion_bitmap", 0)
+    day = current_day(challenge)
+    challenge["current_day"] = day
+    challenge["streak"] = run_ending_at(bitmap, day)
+    # Challenges stored before last_run existed
+    challenge.setdefault("last_run", run_ending_at(bitmap, bitmap.bit_length()))
+    challenge.setdefault("longest_streak", longest_run(bitmap))
+    return challenge
+
+
+def history(challenge: dict) -> dict:
+    bitmap = challenge.get("completion_bitmap", 0)
+    decode(challenge)
+    return {
+        "challenge_id": challenge["id"],
+        "current_day": challenge["current_day"],
+        "streak": challenge["streak"],
+        "last_run": challenge["last_run"],
+        "longest_streak": challenge["longest_streak"],
+        "last_completed_day": challenge.get("last_completed_day", bitmap.bit_length()),
+        "days": [
+            {"day": day, "completed": bool(bitmap & day_bit(day))}
+            for day in range(1, CHALLENGE_DAYS + 1)
+        ],
+    }
+
+
+def new_challenge(model_ids: List[str], lookup: Callable[[str], Optional[dict]]) -> dict:
+    """Build a challenge document for ``model_ids``, resolved in the given order."""
+    if len(model_ids) != CHALLENGE_MODELS:
+        raise InvalidChallenge(f"Exactly {CHALLENGE_MODELS} models required")
+    if len(set(model_ids)) != len(model_ids):
+        raise InvalidChallenge("Models must be distinct")
+    models = [lookup(model_id) for model_id in model_ids]
+    if not all(models):
+        raise InvalidChallenge("One or more models not found")
+    return {
+        "id": str(uuid.uuid4()),
+        "model_ids": list(model_ids),
+        "model_titles": [m["title"] for m in models],
+        "model_slugs": [m["section_slug"] for m in models],
+        "model_indices": [m["model_index"] for m in models],
+        "completed_days": [],
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        **STREAK_FIELDS,
+        "is_active": True,
+    }
+
+
+def _start_ops(user_id: str, challenge: dict) -> list:
+    return [
+        UpdateMany({"user_id": user_id, "is_active": True}, {"$set": {"is_active": False}}),
+        InsertOne({**challenge, "user_id": user_id}),
+    ]
+
+
+def _is_duplicate(error: BulkWriteError) -> bool:
+    return any(e.get("code") == DUPLICATE_KEY for e in error.details.get("writeErrors", []))
+
+
+async def start(db, user_id: str, challenge: dict) -> dict:
+    """Make ``challenge`` the user's only active challenge."""
+    for attempt in range(START_ATTEMPTS):
+        try:
+            await db.challenges.bulk_write(_start_ops(user_id, challenge), ordered=True)
+            break
+        except BulkWriteError as e:
+            # Another start activated a challenge between our two writes
+            if not _is_duplicate(e) or attempt == START_ATTEMPTS - 1:
+                raise
+    await stats.challenge_started(db, user_id, challenge["id"])
+    return challenge
+
+
+async def start_many(db, challenges: Dict[str, dict]) -> Dict[str, str]:
+    """Start one challenge per user; returns ``{user_id: error}`` for failures."""
+    if not challenges:
+        return {}
+    # All deactivations land before any insert, so each user's pair stays ordered
+    users = list(challenges)
+    await db.challenges.bulk_write(
+        [UpdateMany({"user_id": u, "is_active": True}, {"$set": {"is_active": False}}) for u in users],
+        ordered=False,
+    )
+    errors: Dict[str, str] = {}
+    try:
+        await db.challenges.bulk_write(
+            [InsertOne({**challenges[u], "user_id": u}) for u in users], ordered=False
+        )
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") == DUPLICATE_KEY:
+                errors[users[error["index"]]] = "Concurrent challenge start"
+            else:
+                errors[users[error["index"]]] = error.get("errmsg", "Write failed")
+    await asyncio.gather(*(
+        stats.challenge_started(db, user_id, c["id"])
+        for user_id, c in challenges.items() if user_id not in errors
+    ))
+    return errors
+
+
+def _active_filter(user_id: str, challenge_id: Optional[str]) -> dict:
+    query = {"user_id": user_id, "is_active": True}
+    if challenge_id:
+        query["id"] = challenge_id
+    return query
+
+
+async def _mark_day(db, user_id: str, challenge_id: Optional[str], day: int):
+    """Add ``day`` to the active challenge; returns (challenge, newly_completed)."""
+    query = _active_filter(user_id, challenge_id)
+    projection = {"_id": 0, "id": 1, "started_at": 1, "completed_days": 1, **{f: 1 for f in STREAK_FIELDS}}
+    challenge = await db.challenges.find_one_and_update(
+        {**query, "completed_days": {"$ne": day}},
+        {
+            "$addToSet": {"completed_days": day},
+            "$bit": {"completion_bitmap": {"or": day_bit(day)}},
+            "$max": {"last_completed_day": day},
+        },
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+    if challenge:
+        return challenge, True
+    # Either the day was already completed or there is no such challenge
+    challenge = await db.challenges.find_one(query, projection)
+    if not challenge:
+        raise NoActiveChallenge()
+    return challenge, False
+
+
+async def _record_streaks(db, user_id: str, challenge: dict):
+    fields = streak_fields(challenge.get("completion_bitmap", 0))
+    challenge.update(fields)
+    await db.challenges.update_one(
+        {"user_id": user_id, "id": challenge["id"], "completion_bitmap": fields["completion_bitmap"]},
+        {"$set": {"last_run": fields["last_run"], "longest_streak": fields["longest_streak"]}},
+    )
+
+
+def _log_update(reflection: Optional[str]) -> dict:
+    update = {
+        "$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        },
+    }
+    # A repeated completion only replaces the reflection when it carries one
+    if reflection is not None:
+        update["$set"] = {"reflection": reflection}
+    else:
+        update["$setOnInsert"]["reflection"] = None
+    return update
+
+
+async def _upsert_log(db, user_id: str, challenge_id: str, day: int, reflection: Optional[str]):
+    return await db.challenge_logs.update_one(
+        {"user_id": user_id, "challenge_id": challenge_id, "day": day}, _log_update(reflection), upsert=True
+    )
+
+
+def _log_op(user_id: str, challenge_id: str, day: int, reflection: Optional[str]) -> UpdateOne:
+    return UpdateOne(
+        {"user_id": user_id, "challenge_id": challenge_id, "day": day}, _log_update(reflection), upsert=True
+    )
+
+
+async def complete_day(
+    db,
+    user_id: str,
+    day: int,
+    reflection: Optional[str] = None,
+    challenge_id: Optional[str] = None,
+    buffer=None,
+) -> dict:
+    if buffer is not None:
+        # Write-behind: only the completion itself is awaited
+        challenge, newly_completed = await _mark_day(db, user_id, challenge_id, day)
+        await buffer.put("challenge_logs", _log_op(user_id, challenge["id"], day, reflection))
+        if newly_completed:
+            await buffer.put("user_stats", stats.challenge_day_completed_op(user_id, challenge["id"]))
+            await _record_streaks(db, user_id, challenge)
+        return _completion(challenge, day, newly_completed)
+    # The log is only written once the challenge is known to be the caller's
+    # active one, so a stale challenge id cannot overwrite an old reflection
+    challenge, newly_completed = await _mark_day(db, user_id, challenge_id, day)
+    followups = [_upsert_log(db, user_id, challenge["id"], day, reflection)]
+    if newly_completed:
+        followups.append(_record_streaks(db, user_id, challenge))
+        followups.append(stats.challenge_day_completed(db, user_id, challenge["id"]))
+    await asyncio.gather(*followups)
+    return _completion(challenge, day, newly_completed)
+
+
+def _completion(challenge: dict, day: int, newly_completed: bool) -> dict:
+    decode(challenge)
+    return {
+        "status": "completed",
+        "day": day,
+        "total_completed": len(challenge.get("completed_days", [])),
+        "newly_completed": newly_completed,
+        "streak": challenge["streak"],
+        "last_run": challenge["last_run"],
+        "longest_streak": challenge["longest_streak"],
+    }
+
+
+async def dedupe_logs(db):
+    """Keep one log per challenge day so the unique index can be built (runs once)."""
+    if await db.meta.find_one({"_id": LOG_DEDUPE_MIGRATION_ID}, {"_id": 1}):
+        return
+    duplicates = db.challenge_logs.aggregate([
+        {"$sort": {"completed_at": -1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "challenge_id": "$challenge_id", "day": "$day"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    # The most recent log of each day is kept
+    ops = [DeleteOne({"_id": _id}) async for group in duplicates for _id in group["ids"][1:]]
+    if ops:
+        result = await db.challenge_logs.bulk_write(ops, ordered=False)
+        logger.info("Removed %d duplicate challenge logs", result.deleted_count)
+    await db.meta.update_one({"_id": LOG_DEDUPE_MIGRATION_ID}, {"$set": {"done": True}}, upsert=True)
+
+
+async def backfill_bitmaps(db):
+    """Derive streak fields for challenges created before they existed (runs once)."""
+    if await db.meta.find_one({"_id": BITMAP_MIGRATION_ID}, {"_id": 1}):
+        return
+    cursor = db.challenges.find(
+        {"completion_bitmap": {"$exists": False}}, {"_id": 1, "completed_days": 1}
+    )
+    ops = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": streak_fields(bitmap_of(doc.get("completed_days", [])))})
+        async for doc in cursor
+    ]
+    if ops:
+        await db.challenges.bulk_write(ops, ordered=False)
+        logger.info("Backfilled streaks for %d challenges", len(ops))
+    await db.meta.update_one({"_id": BITMAP_MIGRATION_ID}, {"$set": {"done": True}}, upsert=True)
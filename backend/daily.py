@@ -0,0 +1,83 @@
+"""Daily model rotation.
+
+The rotation is a pure function of the date: days are counted from a fixed
+epoch and split into cycles of ``len(models)`` days.  Within a cycle every model
+is picked exactly once, in an order given by a seeded shuffle of the catalog
+(or catalog order when shuffling is disabled), so consecutive days do not walk
+through one section.  Per-user schedules mix the user id into the seed, and
+per-timezone picks only change which local date is looked up, so none of this
+touches the database.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAILY_MODEL_SHUFFLE = os.environ.get("DAILY_MODEL_SHUFFLE", "1") not in ("0", "false", "False")
+DAILY_MODEL_SEED = os.environ.get("DAILY_MODEL_SEED", "ai-powered-mind")
+EPOCH = date(2024, 1, 1)
+
+
+def today(tz: tzinfo = timezone.utc) -> date:
+    return datetime.now(tz).date()
+
+
+def seconds_until_midnight(tz: tzinfo = timezone.utc) -> float:
+    now = datetime.now(tz)
+    midnight = datetime.combine(now.date() + timedelta(days=1), time(0), tzinfo=tz)
+    return max((midnight - now).total_seconds(), 0.0)
+
+
+def _seed(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("/".join(parts).encode()).digest()[:8], "big")
+
+
+class DailySchedule:
+    """Deterministic day -> model rotation over one catalog snapshot."""
+
+    def __init__(self, models: Sequence[dict], seed: str = DAILY_MODEL_SEED, shuffle: bool = DAILY_MODEL_SHUFFLE):
+        self.models = tuple(models)
+        self.seed = seed
+        self.shuffle = shuffle
+        self._orders: Dict[Tuple[Optional[str], int], Tuple[int, ...]] = {}
+
+    def _order(self, user_id: Optional[str], cycle: int) -> Tuple[int, ...]:
+        key = (user_id, cycle)
+        order = self._orders.get(key)
+        if order is None:
+            positions = list(range(len(self.models)))
+            if self.shuffle or user_id is not None:
+                random.Random(_seed(self.seed, user_id or "", str(cycle))).shuffle(positions)
+            order = tuple(positions)
+            # Only the current and next cycle are ever needed per user
+            if len(self._orders) > 4096:
+                self._orders.clear()
+            self._orders[key] = order
+        return order
+
+    def pick(self, day: date, user_id: Optional[str] = None) -> Optional[dict]:
+        if not self.models:
+            return None
+        cycle, offset = divmod((day - EPOCH).days, len(self.models))
+        return self.models[self._order(user_id, cycle)[offset]]
+
+    def upcoming(self, start: date, days: int, user_id: Optional[str] = None) -> List[Tuple[date, dict]]:
+        return [
+            (day, self.pick(day, user_id))
+            for day in (start + timedelta(days=i) for i in range(days))
+        ]
+
+
+async def roll_over_daily(warm: Callable[[date], Awaitable[None]]):
+    """Prepare the next UTC day's pick as soon as the day starts."""
+    while True:
+        await asyncio.sleep(seconds_until_midnight() + 0.5)
+        try:
+            await warm(today())
+        except Exception:
+            logger.exception("Daily model rollover failed")
@@ -0,0 +1,211 @@
+"""Database client configuration.
+
+``DatabaseSettings`` reads pool sizes, timeouts, wire compression and the
+catalog read preference from the environment.  ``create_client`` builds the
+Motor client with bounded timeouts: a slow or unreachable node fails requests
+after a few seconds instead of holding every waiting request on the event loop.
+Catalog change detection (the change stream or version polling) goes through
+a secondary-preferred database handle, while catalog reloads and user data
+(journal, challenges, progress) always go to the primary.
+``PoolStats`` is a connection-pool listener whose counters back the
+``/diagnostics/pool`` endpoint.
+
+``STORAGE_BACKEND=sqlite`` replaces the Motor client with the embedded
+``SQLiteClient`` from ``sqlite_store``, storing each database as a SQLite file
+under ``SQLITE_PATH`` (``:memory:`` keeps everything in process).  The Mongo
+pool, compression and read-preference settings do not apply to it.
+"""
+import os
+import threading
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+DEFAULT_MONGO_URL = "mongodb://127.0.0.1:27017"
+DEFAULT_DB_NAME = "ai_powered_mind"
+DEFAULT_SQLITE_PATH = "data"
+STORAGE_BACKENDS = ("mongo", "sqlite")
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _available_compressors(wanted: List[str]) -> List[str]:
+    """Keep the compressors whose Python package is installed (zlib always is)."""
+    modules = {"zstd": "zstandard", "snappy": "snappy"}
+    available = []
+    for name in wanted:
+        module = modules.get(name)
+        if module:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        available.append(name)
+    return available
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    url: str = DEFAULT_MONGO_URL
+    db_name: str = DEFAULT_DB_NAME
+    max_pool_size: int = 100
+    min_pool_size: int = 5
+    max_idle_time_ms: int = 300_000
+    wait_queue_timeout_ms: int = 5_000
+    server_selection_timeout_ms: int = 5_000
+    connect_timeout_ms: int = 5_000
+    socket_timeout_ms: int = 20_000
+    compressors: List[str] = field(default_factory=lambda: ["zstd", "snappy", "zlib"])
+    catalog_read_preference: str = "secondaryPreferred"
+    catalog_max_staleness_s: int = -1
+    storage_backend: str = "mongo"
+    sqlite_path: str = DEFAULT_SQLITE_PATH
+
+    def __post_init__(self):
+        if self.catalog_read_preference not in READ_PREFERENCES:
+            raise ValueError(
+                f"Unknown MONGO_CATALOG_READ_PREFERENCE {self.catalog_read_preference!r}; "
+                f"expected one of {', '.join(READ_PREFERENCES)}"
+            )
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        default = cls()
+        compressors = os.environ.get("MONGO_COMPRESSORS")
+        return cls(
+            url=os.environ.get("MONGO_URL") or os.environ.get("MONGO_URI") or default.url,
+            db_name=os.environ.get("DB_NAME", default.db_name),
+            max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", default.max_pool_size),
+            min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", default.min_pool_size),
+            max_idle_time_ms=_env_int("MONGO_MAX_IDLE_TIME_MS", default.max_idle_time_ms),
+            wait_queue_timeout_ms=_env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", default.wait_queue_timeout_ms),
+            server_selection_timeout_ms=_env_int(
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS", default.server_selection_timeout_ms
+            ),
+            connect_timeout_ms=_env_int("MONGO_CONNECT_TIMEOUT_MS", default.connect_timeout_ms),
+            socket_timeout_ms=_env_int("MONGO_SOCKET_TIMEOUT_MS", default.socket_timeout_ms),
+            compressors=[c.strip() for c in compressors.split(",") if c.strip()]
+            if compressors is not None else default.compressors,
+            catalog_read_preference=os.environ.get(
+                "MONGO_CATALOG_READ_PREFERENCE", default.catalog_read_preference
+            ),
+            catalog_max_staleness_s=_env_int("MONGO_CATALOG_MAX_STALENESS_S", default.catalog_max_staleness_s),
+            storage_backend=os.environ.get("STORAGE_BACKEND", default.storage_backend).lower(),
+            sqlite_path=os.environ.get("SQLITE_PATH", default.sqlite_path),
+        )
+
+    def client_options(self) -> dict:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+        }
+        compressors = _available_compressors(self.compressors)
+        if compressors:
+            options["compressors"] = ",".join(compressors)
+        return options
+
+    def describe(self) -> dict:
+        """Settings without the connection string, which may hold credentials."""
+        settings = asdict(self)
+        del settings["url"]
+        settings["compressors"] = _available_compressors(self.compressors)
+        return settings
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Per-server connection pool counters, fed by pymongo pool events."""
+
+    COUNTERS = ("created", "closed", "checked_out", "checked_in", "checkout_failed", "cleared")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(self.COUNTERS + ("waiting",), 0))
+
+    def _bump(self, event, counter: str, by: int = 1):
+        # Events arrive from pymongo's background threads as well as the loop's
+        with self._lock:
+            self._servers["%s:%s" % event.address][counter] += by
+
+    def pool_created(self, event):
+        self._bump(event, "created", 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event, "cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event, "created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event, "closed")
+
+    def connection_check_out_started(self, event):
+        self._bump(event, "waiting")
+
+    def connection_check_out_failed(self, event):
+        self._bump(event, "waiting", -1)
+        self._bump(event, "checkout_failed")
+
+    def connection_checked_out(self, event):
+        self._bump(event, "waiting", -1)
+        self._bump(event, "checked_out")
+
+    def connection_checked_in(self, event):
+        self._bump(event, "checked_in")
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            servers = {address: dict(counters) for address, counters in self._servers.items()}
+        for counters in servers.values():
+            counters["open"] = counters["created"] - counters["closed"]
+            counters["in_use"] = counters["checked_out"] - counters["checked_in"]
+        return servers
+
+
+def create_client(settings: DatabaseSettings, listeners: Sequence = ()):
+    if settings.storage_backend == "sqlite":
+        from sqlite_store import SQLiteClient
+
+        return SQLiteClient(settings.sqlite_path)
+    if settings.storage_backend != "mongo":
+        raise ValueError(
+            f"Unknown STORAGE_BACKEND {settings.storage_backend!r}; expected one of {', '.join(STORAGE_BACKENDS)}"
+        )
+    return AsyncIOMotorClient(settings.url, event_listeners=list(listeners), **settings.client_options())
+
+
+def catalog_database(client, settings: DatabaseSettings):
+    """Database handle for watching the catalog, which tolerates replication lag.
+
+    Reloads must not use it: a secondary can still lack the write that
+    triggered them.
+    """
+    mode = READ_PREFERENCES[settings.catalog_read_preference]
+    preference = mode() if mode is Primary else mode(max_staleness=settings.catalog_max_staleness_s)
+    return client.get_database(settings.db_name, read_preference=preference)
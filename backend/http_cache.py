@@ -0,0 +1,222 @@
+"""HTTP caching for catalog responses.
+
+Catalog payloads are identical for every client, so each response known up
+front is rendered once per catalog version, pre-compressed with gzip and
+brotli, and stored on the catalog snapshot together with a content-hash ETag.
+Responses for other parameters (page sizes, etc.) are kept uncompressed in a
+small LRU, so a new value costs one render and never a brotli pass on the
+event loop.  Handlers then write the stored bytes straight to the socket in
+the encoding the client accepts.  Requests carrying a matching
+``If-None-Match`` (or a current ``If-Modified-Since``) get an empty 304, and
+every response advertises ``Cache-Control`` with ``stale-while-revalidate`` so
+browsers and CDNs can reuse it.
+"""
+import gzip
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None
+
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", "300"))
+CATALOG_STALE_WHILE_REVALIDATE = int(os.environ.get("CATALOG_STALE_WHILE_REVALIDATE", "86400"))
+BROTLI_QUALITY = int(os.environ.get("CATALOG_BROTLI_QUALITY", "11"))
+CATALOG_EXTRA_RESPONSES = int(os.environ.get("CATALOG_EXTRA_RESPONSES", "256"))
+GZIP_LEVEL = 9
+MIN_COMPRESS_SIZE = 512
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def render(adapter: TypeAdapter, data, **kwargs) -> bytes:
+    """Validate ``data`` like FastAPI's ``response_model`` would and encode it."""
+    return dumps(adapter.dump_python(adapter.validate_python(data), mode="json", **kwargs))
+
+
+class CachedBody:
+    """A rendered JSON body and its pre-compressed representations."""
+
+    __slots__ = ("body", "hash", "encoded")
+
+    def __init__(self, body: bytes, compress: bool = True):
+        self.body = body
+        self.hash = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded: Dict[str, bytes] = {}
+        if compress and len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.hash}-{encoding}"' if encoding else f'"{self.hash}"'
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """Pick the stored encoding the client prefers (br over gzip on a tie)."""
+        if not self.encoded or not accept_encoding:
+            return None
+        qualities: Dict[str, float] = {}
+        for part in accept_encoding.lower().split(","):
+            name, *params = part.split(";")
+            quality = 1.0
+            for param in params:
+                key, _, value = param.partition("=")
+                if key.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            qualities[name.strip()] = quality
+        best, best_quality = None, 0.0
+        for encoding in ("br", "gzip"):
+            # An explicit q=0 refuses an encoding even when * accepts the rest
+            quality = qualities.get(encoding, qualities.get("*", 0.0))
+            if encoding in self.encoded and quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+
+def _etag_matches(header: str, entry: CachedBody) -> bool:
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        # Any encoding of the same content is a match
+        if tag.strip('"').split("-", 1)[0] == entry.hash:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None or since.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+class CatalogResponses:
+    """Serves catalog responses rendered once per catalog version.
+
+    ``prerender`` maps a catalog snapshot to ``{key: body}`` for every response
+    known up front; it runs whenever a snapshot loads (off the event loop) and
+    those bodies are pre-compressed.  Other keys are rendered on first use and
+    kept uncompressed in an LRU of ``max_extra`` entries per snapshot.
+    """
+
+    def __init__(
+        self,
+        catalog,
+        prerender: Optional[Callable[[object], Dict[str, bytes]]] = None,
+        max_age: int = CATALOG_MAX_AGE,
+        stale_while_revalidate: int = CATALOG_STALE_WHILE_REVALIDATE,
+        max_extra: int = CATALOG_EXTRA_RESPONSES,
+    ):
+        self.catalog = catalog
+        self.cache_control = f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+        self.max_extra = max_extra
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        catalog.register("responses", lambda snapshot: {
+            key: CachedBody(body) for key, body in (prerender(snapshot) if prerender else {}).items()
+        })
+        catalog.register("extra_responses", lambda snapshot: OrderedDict())
+
+    def store(self, key: str, entry: CachedBody):
+        """Add a body rendered (and compressed) ahead of time to the current snapshot."""
+        self.catalog.derived("responses")[key] = entry
+
+    def cached(self, key: str, render_body: Callable[[], bytes]) -> CachedBody:
+        entry = self.catalog.derived("responses").get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+        extra: "OrderedDict[str, CachedBody]" = self.catalog.derived("extra_responses")
+        entry = extra.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            extra.move_to_end(key)
+            return entry
+        self.stats["misses"] += 1
+        entry = extra[key] = CachedBody(render_body(), compress=False)
+        while len(extra) > self.max_extra:
+            extra.popitem(last=False)
+            self.stats["evictions"] += 1
+        return entry
+
+    def respond(
+        self,
+        request: Request,
+        key: Optional[str],
+        render_body: Callable[[], bytes],
+        cache_control: Optional[str] = None,
+        last_modified: Optional[datetime] = None,
+    ) -> Response:
+        """Serve a catalog payload; ``key=None`` renders without storing it."""
+        if key is not None:
+            entry = self.cached(key, render_body)
+        else:
+            entry = CachedBody(render_body(), compress=False)
+        return self.send(request, entry, cache_control, last_modified)
+
+    def send(
+        self,
+        request: Request,
+        entry: CachedBody,
+        cache_control: Optional[str] = None,
+        last_modified: Optional[datetime] = None,
+    ) -> Response:
+        """Serve an already rendered body with the catalog's validators and caching headers.
+
+        ``last_modified`` is for bodies that change more often than the catalog
+        (e.g. daily picks); it defaults to the catalog's.
+        """
+        encoding = entry.negotiate(request.headers.get("accept-encoding", ""))
+        catalog_modified = self.catalog.snapshot.last_modified
+        if last_modified is None or last_modified < catalog_modified:
+            last_modified = catalog_modified
+        last_modified = last_modified.astimezone(timezone.utc)
+        headers = {
+            "ETag": entry.etag(encoding),
+            "Last-Modified": format_datetime(last_modified, usegmt=True),
+            "Cache-Control": cache_control or self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            if _etag_matches(if_none_match, entry):
+                return Response(status_code=304, headers=headers)
+        elif if_modified_since and _not_modified_since(if_modified_since, last_modified):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(content=entry.encoded[encoding], media_type="application/json", headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
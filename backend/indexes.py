@@ -0,0 +1,142 @@
+"""Declared MongoDB indexes.
+
+``INDEXES`` is the single list of indexes the queries in ``server.py`` rely on.
+They are created idempotently at startup, and ``index_report`` compares the
+declaration with what the server actually has (and how often each index has
+been used) for the diagnostics endpoint.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# An index with the same name exists but with other keys or options
+INDEX_CONFLICT_CODES = (85, 86)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "mental_models": [
+        IndexModel([("section_slug", ASCENDING), ("model_index", ASCENDING)],
+                   name="section_slug_model_index", unique=True),
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+    ],
+    "sections": [
+        IndexModel([("index", ASCENDING)], name="index", unique=True),
+    ],
+    "journal_entries": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="user_id_created_at_id"),
+        # Imported entries keep their ids, so ids are only unique within a user
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)], name="user_id_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("content", TEXT), ("model_title", TEXT)],
+                   name="user_id_text", weights={"content": 1, "model_title": 3}),
+    ],
+    "challenges": [
+        # At most one active challenge per user
+        IndexModel([("user_id", ASCENDING)], name="user_id_active", unique=True,
+                   partialFilterExpression={"is_active": True}),
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+    ],
+    "challenge_logs": [
+        IndexModel([("user_id", ASCENDING), ("challenge_id", ASCENDING), ("day", ASCENDING)],
+                   name="user_id_challenge_id_day", unique=True),
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("reflection", TEXT)], name="user_id_text"),
+    ],
+    "user_progress": [
+        IndexModel([("user_id", ASCENDING)], name="user_id", unique=True),
+    ],
+    "user_stats": [
+        IndexModel([("user_id", ASCENDING)], name="user_id", unique=True),
+    ],
+}
+
+# Indexes that were declared once and would still constrain writes if kept
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    "journal_entries": ["id"],  # replaced by user_id_id
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index; returns ``{collection: [failed index names]}``.
+
+    ``create_indexes`` is a no-op for indexes that already exist.  An index
+    whose declaration changed is dropped and rebuilt, and retired indexes are
+    dropped.  A failure (e.g. duplicates blocking a unique index) is logged
+    and reported rather than preventing startup.
+    """
+    for collection, names in RETIRED_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                logger.info("Dropping retired index %s.%s", collection, name)
+                await db[collection].drop_index(name)
+    failures: Dict[str, List[str]] = {}
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+            continue
+        except OperationFailure:
+            pass
+        # Retry one by one to find out which index is the problem
+        for model in models:
+            name = model.document["name"]
+            try:
+                try:
+                    await db[collection].create_indexes([model])
+                except OperationFailure as e:
+                    if e.code not in INDEX_CONFLICT_CODES:
+                        raise
+                    logger.info("Rebuilding index %s.%s", collection, name)
+                    await db[collection].drop_index(name)
+                    await db[collection].create_indexes([model])
+            except OperationFailure as e:
+                failures.setdefault(collection, []).append(name)
+                logger.error("Could not create index %s.%s: %s", collection, name, e)
+    return failures
+
+
+def _same_key(existing: dict, spec: dict) -> bool:
+    declared = list(spec["key"].items())
+    if TEXT not in spec["key"].values():
+        return [tuple(k) for k in existing["key"]] == declared
+    # Text fields are stored as _fts/_ftsx plus a weights document
+    prefix = [(f, d) for f, d in declared if d != TEXT]
+    fields = {f for f, d in declared if d == TEXT}
+    return [tuple(k) for k in existing["key"]][:len(prefix)] == prefix \
+        and set(existing.get("weights", {})) == fields
+
+
+async def _index_usage(db, collection: str) -> Dict[str, int]:
+    try:
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+    except OperationFailure:
+        return {}
+    return {s["name"]: int(s.get("accesses", {}).get("ops", 0)) for s in stats}
+
+
+async def index_report(db) -> Dict[str, dict]:
+    """Declared vs. existing indexes per collection, with access counts."""
+    report = {}
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        usage = await _index_usage(db, collection)
+        declared = {m.document["name"]: m.document for m in models}
+        missing, mismatched = [], []
+        for name, spec in declared.items():
+            if name not in existing:
+                missing.append(name)
+            elif not _same_key(existing[name], spec) \
+                    or bool(existing[name].get("unique")) != bool(spec.get("unique")):
+                mismatched.append(name)
+        report[collection] = {
+            "declared": sorted(declared),
+            "missing": missing,
+            "mismatched": mismatched,
+            "undeclared": sorted(n for n in existing if n not in declared and n != "_id_"),
+            "unused": sorted(n for n, ops in usage.items() if ops == 0 and n != "_id_"),
+            "usage": usage,
+        }
+    return report
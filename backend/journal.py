@@ -0,0 +1,332 @@
+"""Journal paging, bulk import and full-text search.
+
+The journal is listed newest first and keyset-paginated on (created_at, id).
+A cursor is the last entry's key, base64url-encoded JSON; ``page_query``
+turns it back into a filter for the entries that follow it.
+
+``POST /journal/bulk`` bodies are either NDJSON (one entry per line) or a JSON
+array of entries.  The body is parsed as it streams in, each row is validated
+on its own, and valid rows are written with unordered ``insert_many`` in
+chunks of ``JOURNAL_BULK_CHUNK``.  While one chunk is being written the next
+one is parsed, and at most one write is in flight.  Rows that fail validation
+or insertion are reported by index without stopping the import; only a
+malformed JSON array or a body that is not UTF-8 ends it early.
+
+Search runs on MongoDB text indexes over journal ``content``/``model_title``
+and challenge-log ``reflection``.  Both indexes are prefixed with ``user_id``,
+so a search only scans the caller's own entries, and MongoDB keeps them up to
+date on every insert and delete.  Results from both collections are merged by
+text score and paginated by offset.
+"""
+import asyncio
+import base64
+import binascii
+import codecs
+import json
+import os
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from http_cache import loads
+
+JOURNAL_BULK_CHUNK = int(os.environ.get("JOURNAL_BULK_CHUNK", "1000"))
+JOURNAL_BULK_MAX_ROWS = int(os.environ.get("JOURNAL_BULK_MAX_ROWS", "10000"))
+MAX_ROW_CHARS = 1 << 20
+MAX_REPORTED_ERRORS = 1000
+DUPLICATE_KEY = 11000
+JOURNAL_SORT = [("created_at", -1), ("id", -1)]
+
+
+class MalformedBody(ValueError):
+    pass
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(entry: dict) -> str:
+    raw = json.dumps([entry["created_at"], entry["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(cursor)
+    # Anything but [created_at, id] (e.g. an object, whose keys would unpack) is rejected
+    if not isinstance(key, list) or len(key) != 2 or not all(isinstance(part, str) for part in key):
+        raise InvalidCursor(cursor)
+    return key[0], key[1]
+
+
+def page_query(user_id: str, cursor: Optional[str] = None) -> dict:
+    """Filter for ``user_id``'s entries after ``cursor`` in (created_at, id) descending order."""
+    query: Dict[str, Any] = {"user_id": user_id}
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": entry_id}},
+        ]
+    return query
+
+
+class _ArrayParser:
+    """Incrementally yields the elements of a top-level JSON array."""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self):
+        self.buffer = ""
+        self.started = False
+        self.after_value = False
+        self.done = False
+        self.count = 0
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        self.buffer += text
+        values, pos, buffer = [], 0, self.buffer
+        while not self.done:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if not self.started:
+                if char != "[":
+                    raise MalformedBody("Expected a JSON array")
+                self.started = True
+                pos += 1
+            elif char == "]" and (self.after_value or not self.count):
+                self.done = True
+                pos += 1
+            elif self.after_value:
+                if char != ",":
+                    raise MalformedBody("Expected ',' between array elements")
+                self.after_value = False
+                pos += 1
+            else:
+                try:
+                    value, pos = self.decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    # Usually the element is just not complete yet
+                    if final or len(buffer) - pos > MAX_ROW_CHARS:
+                        raise MalformedBody(f"Invalid JSON: {e.msg}")
+                    break
+                values.append(value)
+                self.count += 1
+                self.after_value = True
+        self.buffer = buffer[pos:]
+        if final and not self.done:
+            raise MalformedBody("Unterminated JSON array")
+        if self.done and self.buffer.strip():
+            raise MalformedBody("Unexpected data after the JSON array")
+        return values
+
+
+def _decode(decoder, chunk: bytes, final: bool = False) -> str:
+    try:
+        return decoder.decode(chunk, final)
+    except UnicodeDecodeError:
+        raise MalformedBody("Body is not valid UTF-8")
+
+
+async def iter_rows(body: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield ``(index, value)`` per row; ``value`` is an exception for unparsable NDJSON lines."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = None  # _ArrayParser, or False for NDJSON
+    pending = ""
+    index = 0
+    async for chunk in body:
+        text = pending + _decode(decoder, chunk)
+        if parser is None:
+            stripped = text.lstrip()
+            if not stripped:
+                pending = ""
+                continue
+            parser = _ArrayParser() if stripped[0] == "[" else False
+        if parser:
+            pending = ""
+            for value in parser.feed(text):
+                yield index, value
+                index += 1
+            continue
+        *lines, pending = text.split("\n")
+        if len(pending) > MAX_ROW_CHARS:
+            raise MalformedBody("Line too long")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+    tail = pending + _decode(decoder, b"", final=True)
+    if parser:
+        for value in parser.feed(tail, final=True):
+            yield index, value
+            index += 1
+    elif tail.strip():
+        yield index, _parse_line(tail)
+
+
+def _parse_line(line: str):
+    try:
+        return loads(line)
+    except ValueError as e:
+        return MalformedBody(f"Invalid JSON: {e}")
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.truncated = False
+
+    def fail(self, index: int, detail: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "detail": detail})
+
+    def as_dict(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "truncated": self.truncated,
+            "errors": self.errors,
+        }
+
+
+async def _insert_chunk(db, docs: List[dict], indexes: List[int], report: ImportReport):
+    try:
+        result = await db.journal_entries.insert_many(docs, ordered=False)
+        report.inserted += len(result.inserted_ids)
+    except BulkWriteError as e:
+        report.inserted += e.details.get("nInserted", 0)
+        for error in e.details.get("writeErrors", []):
+            detail = "Duplicate id" if error.get("code") == DUPLICATE_KEY else error.get("errmsg", "Write failed")
+            report.fail(indexes[error["index"]], detail)
+
+
+async def import_entries(
+    db,
+    body: AsyncIterator[bytes],
+    to_doc: Callable[[Any], dict],
+    chunk_size: int = JOURNAL_BULK_CHUNK,
+    max_rows: int = JOURNAL_BULK_MAX_ROWS,
+) -> dict:
+    """Validate rows with ``to_doc`` and insert them; returns the import report."""
+    report = ImportReport()
+    docs: List[dict] = []
+    indexes: List[int] = []
+    writing = None
+    next_index = 0
+    try:
+        async for index, row in iter_rows(body):
+            next_index = index + 1
+            if index >= max_rows:
+                report.truncated = True
+                report.fail(index, f"Row limit of {max_rows} reached")
+                break
+            if isinstance(row, Exception):
+                report.fail(index, str(row))
+                continue
+            try:
+                docs.append(to_doc(row))
+            except ValueError as e:
+                report.fail(index, str(e))
+                continue
+            indexes.append(index)
+            if len(docs) >= chunk_size:
+                if writing is not None:
+                    await writing
+                writing = asyncio.create_task(_insert_chunk(db, docs, indexes, report))
+                docs, indexes = [], []
+    except MalformedBody as e:
+        report.truncated = True
+        report.fail(next_index, str(e))
+    finally:
+        if writing is not None:
+            await writing
+    if docs:
+        await _insert_chunk(db, docs, indexes, report)
+    return report.as_dict()
+
+
+SEARCH_SOURCES = ("journal", "reflections")
+TEXT_SCORE = {"$meta": "textScore"}
+
+
+def _date_range(after: Optional[str], before: Optional[str]) -> Dict[str, str]:
+    bounds = {}
+    if after:
+        bounds["$gte"] = after
+    if before:
+        bounds["$lt"] = before
+    return bounds
+
+
+async def _search_collection(collection, query: dict, projection: dict, limit: int) -> List[dict]:
+    return await collection.find(query, {**projection, "score": TEXT_SCORE}) \
+        .sort([("score", TEXT_SCORE)]).limit(limit).to_list(limit)
+
+
+async def search(
+    db,
+    user_id: str,
+    text: str,
+    sources=SEARCH_SOURCES,
+    model_title: Optional[str] = None,
+    section_slug: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 20,
+) -> Tuple[List[dict], bool]:
+    """Ranked matches for ``text``; returns (page, has_more)."""
+    wanted = offset + limit + 1
+    pending, kinds = [], []
+    if "journal" in sources:
+        query = {"user_id": user_id, "$text": {"$search": text}}
+        if model_title is not None:
+            query["model_title"] = model_title
+        if section_slug is not None:
+            query["section_slug"] = section_slug
+        if after or before:
+            query["created_at"] = _date_range(after, before)
+        pending.append(_search_collection(
+            db.journal_entries, query,
+            {"_id": 0, "id": 1, "content": 1, "model_title": 1, "section_slug": 1, "created_at": 1},
+            wanted,
+        ))
+        kinds.append("journal")
+    # Reflections are not tied to a model, so model filters exclude them
+    if "reflections" in sources and model_title is None and section_slug is None:
+        query = {"user_id": user_id, "$text": {"$search": text}}
+        if after or before:
+            query["completed_at"] = _date_range(after, before)
+        pending.append(_search_collection(
+            db.challenge_logs, query,
+            {"_id": 0, "id": 1, "challenge_id": 1, "day": 1, "reflection": 1, "completed_at": 1},
+            wanted,
+        ))
+        kinds.append("reflection")
+    results = []
+    for kind, docs in zip(kinds, await asyncio.gather(*pending)):
+        for doc in docs:
+            if kind == "journal":
+                results.append({**doc, "type": "journal"})
+            else:
+                results.append({
+                    "type": "reflection",
+                    "id": doc["id"],
+                    "content": doc.get("reflection") or "",
+                    "created_at": doc["completed_at"],
+                    "challenge_id": doc["challenge_id"],
+                    "day": doc["day"],
+                    "score": doc["score"],
+                })
+    # Best match first, newer entries first among equal scores
+    results.sort(key=lambda r: (r["score"], r["created_at"]), reverse=True)
+    return results[offset:offset + limit], len(results) > offset + limit
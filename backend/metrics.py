@@ -0,0 +1,280 @@
+"""Prometheus-style metrics for requests, database commands and caches.
+
+``MetricsMiddleware`` records, per route template, method and status:
+- request counts
+- latency and response-size histograms
+- the time spent in MongoDB commands
+
+It also tracks requests in flight.  ``CommandMetrics`` is a pymongo command
+listener that times each command by collection and command name.  Motor runs
+pymongo calls with a copy of the caller's context, so command time is also
+added to the request that issued it.
+
+Everything lives in an in-process ``Registry`` that ``/metrics`` renders in
+the Prometheus text format; no client library or collector is needed.  Values
+that already live elsewhere, like cache counters, are read at scrape time
+through ``Registry.collect``.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+METRICS = os.environ.get("METRICS", "1") not in ("0", "false", "False")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), by: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + by
+
+    def set(self, labels: Labels, value: float):
+        with self._lock:
+            self.values[labels] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, labels: Labels, value: float):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self.series.items()]
+        lines = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(total)}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.families: List[_Family] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, family: _Family) -> _Family:
+        self.families.append(family)
+        return family
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Labels = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Labels = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collect(self, collector: Callable[[], None]):
+        """Run ``collector`` before every render, to copy in values kept elsewhere."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines: List[str] = []
+        for family in self.families:
+            lines.extend(family.header())
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+http_requests = registry.counter(
+    "http_requests_total", "Requests by route template, method and status.", ("route", "method", "status")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.", ("route", "method")
+)
+http_response_size = registry.histogram(
+    "http_response_size_bytes", "Response body size as sent, after compression.", ("route", "method"), SIZE_BUCKETS
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "Requests currently being served.")
+http_db_time = registry.histogram(
+    "http_request_db_seconds", "Time spent in MongoDB commands per request.", ("route", "method")
+)
+db_commands = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round-trip time.", ("collection", "command", "outcome")
+)
+cache_requests = registry.counter("cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+cache_removals = registry.counter(
+    "cache_removals_total", "Entries dropped by eviction, expiry or invalidation.", ("cache", "reason")
+)
+cache_entries = registry.gauge("cache_entries", "Entries currently cached.", ("cache",))
+cache_hit_ratio = registry.gauge(
+    "cache_hit_ratio", "Lookups served without computing (hits and coalesced) over all lookups.", ("cache",)
+)
+
+# Running total of command time for the request being served
+_request_db_time: ContextVar[Optional[List[float]]] = ContextVar("request_db_time", default=None)
+
+
+def track_cache(name: str, stats: Callable[[], Dict[str, int]]):
+    """Expose a cache's counters (``hits``, ``misses`` and optionally
+    ``coalesced``, ``evictions``, ``expirations``, ``invalidations``, ``size``)
+    at every scrape."""
+
+    def collect():
+        counters = stats()
+        for result in ("hits", "misses", "coalesced"):
+            if result in counters:
+                cache_requests.set((name, result), counters[result])
+        for reason in ("evictions", "expirations", "invalidations"):
+            if reason in counters:
+                cache_removals.set((name, reason), counters[reason])
+        if "size" in counters:
+            cache_entries.set((name,), counters["size"])
+        served = counters.get("hits", 0) + counters.get("coalesced", 0)
+        lookups = served + counters.get("misses", 0)
+        cache_hit_ratio.set((name,), served / lookups if lookups else 0.0)
+
+    registry.collect(collect)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times MongoDB commands by collection and command name."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, object], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._pending.pop((event.request_id, event.connection_id), "")
+        seconds = event.duration_micros / 1_000_000
+        db_commands.observe((collection, event.command_name, outcome), seconds)
+        total = _request_db_time.get()
+        if total is not None:
+            total[0] += seconds
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request metrics.
+
+    ``db_time`` is off when the app does not run on MongoDB, since nothing
+    would feed the per-request command time.
+    """
+
+    def __init__(self, app, db_time: bool = True):
+        self.app = app
+        self.db_time = db_time
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        size = 0
+        db_time = [0.0]
+        token = _request_db_time.set(db_time)
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.inc(by=-1)
+            _request_db_time.reset(token)
+            # FastAPI stores the matched route in the scope; raw paths would explode cardinality
+            route = scope.get("route")
+            labels = (getattr(route, "path", UNMATCHED_ROUTE), scope["method"])
+            http_requests.inc(labels + (str(status),))
+            http_latency.observe(labels, time.perf_counter() - started)
+            http_response_size.observe(labels, size)
+            if self.db_time:
+                http_db_time.observe(labels, db_time[0])
@@ -0,0 +1,184 @@
+"""Bounded async LRU cache with TTL and request coalescing.
+
+``cached(cache)`` memoizes an async function on its arguments.  Arguments are
+normalized first (``normalize`` maps a parameter name to a function, e.g. to
+lower-case a search query), so equivalent requests share one entry.  Entries
+expire after ``ttl`` seconds and the least recently used entry is evicted when
+the cache is full.
+
+Concurrent misses for the same key are coalesced: the first caller computes
+the value and the others await its result instead of repeating the work.  If
+the first caller fails, the error is passed on to the waiters and nothing is
+stored; if it is cancelled, the next waiter computes instead.
+
+``version`` is read on every lookup.  When it changes (for example, the
+catalog version after a reload), every entry is dropped, and results computed
+against the old version are not stored.  Cached values are shared between
+callers and must be treated as read-only.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+
+_NO_VERSION = object()
+_MISSING = object()
+
+
+class AsyncLRUCache:
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        version: Optional[Callable[[], Hashable]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+        self.clock = clock
+        self._version: Any = _NO_VERSION
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def _check_version(self):
+        if self.version is None:
+            return
+        version = self.version()
+        if version != self._version:
+            if self._version is not _NO_VERSION:
+                self.counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._version = version
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires = entry
+        if expires <= self.clock():
+            del self._entries[key]
+            self.counters["expirations"] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value):
+        self._entries[key] = (value, self.clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        while True:
+            self._check_version()
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.counters["hits"] += 1
+                return value
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this caller was cancelled, not the computation
+        self.counters["misses"] += 1
+        version = self._version
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters get the error; nobody else has to retrieve it
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._pending[key]
+        self._check_version()
+        if version == self._version:
+            self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        self.counters["invalidations"] += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "in_flight": len(self._pending),
+            "hit_ratio": round((self.counters["hits"] + self.counters["coalesced"]) / lookups, 4) if lookups else 0.0,
+            **self.counters,
+        }
+
+
+def _freeze(value) -> Hashable:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_freeze(v) for v in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def normalize_text(value: Optional[str]) -> Optional[str]:
+    """Case- and whitespace-insensitive form of a free-text query.
+
+    One trailing space is kept: search only expands the last word by prefix
+    while it is still being typed, so "bias " and "bias" differ.
+    """
+    if value is None:
+        return None
+    normalized = " ".join(value.lower().split())
+    return normalized + " " if normalized and value[-1].isspace() else normalized
+
+
+def cached(cache: AsyncLRUCache, normalize: Optional[Dict[str, Callable[[Any], Any]]] = None):
+    """Memoize an async function in ``cache``, keyed on its normalized arguments."""
+    normalize = normalize or {}
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            # The function sees the normalized arguments, so a cached value
+            # is exactly what any request with the same key would compute
+            for name, normalizer in normalize.items():
+                bound.arguments[name] = normalizer(bound.arguments[name])
+            key = (fn.__qualname__,) + tuple((name, _freeze(v)) for name, v in bound.arguments.items())
+            return await cache.get_or_compute(key, lambda: fn(*bound.args, **bound.kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
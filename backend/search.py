@@ -0,0 +1,194 @@
+"""Full-text search over the mental model catalog.
+
+An inverted index is built once per catalog snapshot.  Terms are lower-cased,
+stop-word filtered and stemmed; every posting stores its precomputed BM25F
+contribution (title > explanation > example), so a query is a handful of dict
+lookups and additions.  The last query term also matches by prefix, which keeps
+type-ahead from ``SearchPage.js`` useful while a word is still being typed.
+"""
+import math
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+FIELD_BOOSTS = {"title": 3.0, "explanation": 1.5, "example": 1.0}
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_EXPANSIONS = 64
+
+TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by can for from how in is it its of on or than that the "
+    "then them they this to was what when with you your".split()
+)
+
+# Ordered longest-first so e.g. "ations" wins over "s"
+_SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("iveness", "ive"),
+    ("ations", "ate"), ("ation", "ate"), ("ments", ""), ("ment", ""), ("ness", ""),
+    ("ingly", ""), ("ing", ""), ("edly", ""), ("ies", "y"), ("ied", "y"), ("ed", ""),
+    ("ers", ""), ("er", ""), ("ly", ""), ("es", ""), ("s", ""),
+)
+
+
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer (a small subset of Porter's rules)."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ss"):
+        return word
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix):
+            base = word[: -len(suffix)] + replacement
+            if len(base) >= 3:
+                # "planning" -> "plann" -> "plan"
+                if suffix in ("ing", "ed", "er", "ers") and len(base) > 3 and base[-1] == base[-2] \
+                        and base[-1] not in "lsz":
+                    base = base[:-1]
+                return base
+    return word
+
+
+def tokenize(text: str) -> List[Tuple[str, str, int, int]]:
+    """Return ``(surface, stem, start, end)`` for every indexable token."""
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        surface = match.group().lower()
+        if surface in STOP_WORDS:
+            continue
+        tokens.append((surface, stem(surface), match.start(), match.end()))
+    return tokens
+
+
+class SearchHit:
+    __slots__ = ("position", "doc", "score", "terms")
+
+    def __init__(self, position: int, doc: dict, score: float, terms: frozenset):
+        self.position = position
+        self.doc = doc
+        self.score = score
+        self.terms = terms
+
+
+class SearchIndex:
+    """BM25F inverted index over a sequence of catalog model documents."""
+
+    def __init__(self, docs: Sequence[dict], fields: Dict[str, float] = FIELD_BOOSTS):
+        self.docs = tuple(docs)
+        self.fields = dict(fields)
+        # stem -> {doc position: precomputed BM25F score}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        # per doc, per field: stem -> [(start, end), ...] for highlighting
+        self.offsets: List[Dict[str, Dict[str, List[Tuple[int, int]]]]] = []
+        surface_to_stems: Dict[str, set] = {}
+
+        tokenized = []
+        total_len = {f: 0 for f in self.fields}
+        for doc in self.docs:
+            per_field = {}
+            for field in self.fields:
+                tokens = tokenize(doc.get(field) or "")
+                per_field[field] = tokens
+                total_len[field] += len(tokens)
+                for surface, term, _, _ in tokens:
+                    surface_to_stems.setdefault(surface, set()).add(term)
+            tokenized.append(per_field)
+
+        n_docs = len(self.docs) or 1
+        avg_len = {f: (total_len[f] / n_docs) or 1.0 for f in self.fields}
+
+        weighted_tf: Dict[str, Dict[int, float]] = {}
+        for pos, per_field in enumerate(tokenized):
+            doc_offsets: Dict[str, Dict[str, List[Tuple[int, int]]]] = {}
+            for field, tokens in per_field.items():
+                norm = 1 - B + B * len(tokens) / avg_len[field]
+                counts: Dict[str, int] = {}
+                field_offsets: Dict[str, List[Tuple[int, int]]] = {}
+                for _, term, start, end in tokens:
+                    counts[term] = counts.get(term, 0) + 1
+                    field_offsets.setdefault(term, []).append((start, end))
+                for term, tf in counts.items():
+                    bucket = weighted_tf.setdefault(term, {})
+                    bucket[pos] = bucket.get(pos, 0.0) + self.fields[field] * tf / norm
+                doc_offsets[field] = field_offsets
+            self.offsets.append(doc_offsets)
+
+        for term, bucket in weighted_tf.items():
+            df = len(bucket)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            self.postings[term] = {
+                pos: idf * w * (K1 + 1) / (w + K1) for pos, w in bucket.items()
+            }
+
+        self.surfaces: List[str] = sorted(surface_to_stems)
+        self.surface_stems: Dict[str, Tuple[str, ...]] = {
+            s: tuple(sorted(stems)) for s, stems in surface_to_stems.items()
+        }
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        terms = set()
+        i = bisect_left(self.surfaces, prefix)
+        while i < len(self.surfaces) and self.surfaces[i].startswith(prefix):
+            terms.update(self.surface_stems[self.surfaces[i]])
+            if len(terms) >= MAX_PREFIX_EXPANSIONS:
+                break
+            i += 1
+        return sorted(terms)
+
+    def _query_groups(self, query: str, prefix: bool) -> List[List[str]]:
+        """One group of alternative stems per query word (AND across groups)."""
+        tokens = tokenize(query)
+        groups = []
+        for surface, term, _, end in tokens:
+            group = [term]
+            # Only a word still being typed (nothing after it) is matched by prefix
+            if prefix and end == len(query):
+                group = sorted(set(group) | set(self._prefix_terms(surface)))
+            groups.append(group)
+        return groups
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        allowed: Optional[Iterable[int]] = None,
+        prefix: bool = True,
+    ) -> List[SearchHit]:
+        groups = self._query_groups(query, prefix)
+        if not groups:
+            return []
+        allowed_set = set(allowed) if allowed is not None else None
+        scores: Optional[Dict[int, float]] = None
+        matched: Dict[int, set] = {}
+        for group in groups:
+            group_scores: Dict[int, float] = {}
+            for term in group:
+                for pos, score in self.postings.get(term, {}).items():
+                    if allowed_set is not None and pos not in allowed_set:
+                        continue
+                    # Alternatives for one word do not add up; keep the best
+                    if score > group_scores.get(pos, 0.0):
+                        group_scores[pos] = score
+                    matched.setdefault(pos, set()).add(term)
+            if scores is None:
+                scores = group_scores
+            else:
+                scores = {pos: s + group_scores[pos] for pos, s in scores.items() if pos in group_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [
+            SearchHit(pos, self.docs[pos], score, frozenset(matched[pos])) for pos, score in ranked
+        ]
+
+    def highlights(self, hit: SearchHit) -> Dict[str, List[List[int]]]:
+        """Character ``[start, end)`` offsets of matched terms, per field."""
+        result = {}
+        for field, by_term in self.offsets[hit.position].items():
+            spans = sorted(span for term in hit.terms for span in by_term.get(term, ()))
+            if spans:
+                result[field] = [list(span) for span in spans]
+        return result
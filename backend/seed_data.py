@@ -318,6 +318,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 async def seed_everything():
+    from seeding import sync_catalog
+
     # Σύνδεση στη βάση
     mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
     db_name = os.getenv("DB_NAME", "ai_powered_mind")
@@ -327,15 +329,13 @@ async def seed_everything():
     
     print(f"Connecting to MongoDB at {mongo_url}...")
     
-    # Γέμισμα Sections
-    await db.sections.delete_many({})
-    await db.sections.insert_many(SECTIONS)
-    print(f"✅ Seeded {len(SECTIONS)} sections.")
-    
-    # Γέμισμα Models
-    await db.models.delete_many({})
-    await db.models.insert_many(MODELS)
-    print(f"✅ Seeded {len(MODELS)} mental models.")
+    # Συγχρονισμός Sections + Models (μόνο οι αλλαγές)
+    summary = await sync_catalog(db)
+    if summary["status"] == "current":
+        print(f"✅ Catalog already at version {summary['version']}.")
+    else:
+        print(f"✅ Sections: {summary['sections_upserted']} upserted, {summary['sections_deleted']} deleted.")
+        print(f"✅ Mental models: {summary['models_upserted']} upserted, {summary['models_deleted']} deleted.")
     
     client.close()
     print("\n🎉 ALL DONE! Refresh your website now.")
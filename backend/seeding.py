@@ -0,0 +1,130 @@
+"""Idempotent catalog seeding.
+
+Every model and section record from ``seed_data.py`` is hashed, and the hashes
+are kept in a catalog-version document (``meta`` collection, ``_id: "catalog"``).
+On startup only the version is read; when it differs from the code's version,
+the changed records are upserted in one unordered ``bulk_write`` keyed on
+(section_slug, model_index) — or the section index — and removed ones deleted.
+Model ids are stable: existing documents keep theirs, new ones get a uuid5
+derived from their key.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+
+from catalog import content_hash
+from seed_data import SECTIONS, MODELS
+
+logger = logging.getLogger(__name__)
+
+CATALOG_META_ID = "catalog"
+MODEL_ID_NAMESPACE = uuid.UUID("6f1d3c1e-5b7a-4c55-9d0e-2b8f5a4e7c31")
+
+
+def model_id(section_slug: str, model_index: int) -> str:
+    return str(uuid.uuid5(MODEL_ID_NAMESPACE, f"{section_slug}/{model_index}"))
+
+
+def model_documents() -> Dict[str, dict]:
+    """Seed models as stored in ``mental_models`` (without ``id``), keyed by slug:index."""
+    section_map = {s["index"]: s for s in SECTIONS}
+    docs = {}
+    for m in MODELS:
+        sec = section_map[m["section_index"]]
+        docs[f"{sec['slug']}:{m['model_index']}"] = {
+            "section_index": m["section_index"],
+            "section_slug": sec["slug"],
+            "section_name": sec["short_name"],
+            "model_index": m["model_index"],
+            "title": m["title"],
+            "explanation": m["explanation"],
+            "example": m["example"],
+            "ai_prompt": m["ai_prompt"],
+        }
+    return docs
+
+
+def section_documents() -> Dict[str, dict]:
+    return {str(s["index"]): dict(s) for s in SECTIONS}
+
+
+def build_manifest() -> Tuple[dict, Dict[str, dict], Dict[str, dict]]:
+    models = model_documents()
+    sections = section_documents()
+    manifest = {
+        "models": {key: content_hash(doc) for key, doc in models.items()},
+        "sections": {key: content_hash(doc) for key, doc in sections.items()},
+    }
+    manifest["version"] = content_hash(manifest)[:16]
+    return manifest, models, sections
+
+
+def _diff(new: Dict[str, str], old: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    changed = [key for key, h in new.items() if old.get(key) != h]
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+async def sync_catalog(db) -> dict:
+    """Bring ``mental_models`` and ``sections`` in line with ``seed_data.py``."""
+    manifest, models, sections = build_manifest()
+    meta = await db.meta.find_one({"_id": CATALOG_META_ID}, {"version": 1})
+    if meta and meta.get("version") == manifest["version"]:
+        return {"status": "current", "version": manifest["version"]}
+
+    previous = await db.meta.find_one({"_id": CATALOG_META_ID}) or {}
+    model_changes, model_removals = _diff(manifest["models"], previous.get("models", {}))
+    section_changes, section_removals = _diff(manifest["sections"], previous.get("sections", {}))
+
+    model_ops = []
+    for key in model_changes:
+        doc = models[key]
+        model_ops.append(UpdateOne(
+            {"section_slug": doc["section_slug"], "model_index": doc["model_index"]},
+            {
+                "$set": {**doc, "content_hash": manifest["models"][key]},
+                "$setOnInsert": {"id": model_id(doc["section_slug"], doc["model_index"])},
+            },
+            upsert=True,
+        ))
+    for key in model_removals:
+        slug, index = key.rsplit(":", 1)
+        model_ops.append(DeleteOne({"section_slug": slug, "model_index": int(index)}))
+
+    section_ops = [
+        UpdateOne({"index": int(key)}, {"$set": sections[key]}, upsert=True)
+        for key in section_changes
+    ]
+    section_ops.extend(DeleteOne({"index": int(key)}) for key in section_removals)
+
+    if model_ops:
+        await db.mental_models.bulk_write(model_ops, ordered=False)
+    if section_ops:
+        await db.sections.bulk_write(section_ops, ordered=False)
+    if not previous:
+        # First versioned sync: drop anything left over from earlier seeding schemes
+        await db.mental_models.delete_many({"$nor": [
+            {"section_slug": d["section_slug"], "model_index": d["model_index"]}
+            for d in models.values()
+        ]})
+        await db.sections.delete_many({"index": {"$nin": [s["index"] for s in SECTIONS]}})
+
+    updated_at = datetime.now(timezone.utc)
+    await db.meta.replace_one(
+        {"_id": CATALOG_META_ID},
+        {**manifest, "updated_at": updated_at.isoformat()},
+        upsert=True,
+    )
+    summary = {
+        "status": "updated",
+        "version": manifest["version"],
+        "models_upserted": len(model_changes),
+        "models_deleted": len(model_removals),
+        "sections_upserted": len(section_changes),
+        "sections_deleted": len(section_removals),
+    }
+    logger.info("Catalog synced: %s", summary)
+    return summary
@@ -1,15 +1,35 @@
-from fastapi import FastAPI, APIRouter, Query, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware  # Χρησιμοποίησε αυτό το import
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from pymongo import InsertOne
+import asyncio
 import logging
 import uuid
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
-from datetime import datetime, timezone
-from seed_data import SECTIONS, MODELS, INTRODUCTION, CONCLUSION
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
+from typing import Dict, List, Literal, Optional, Tuple, Union
+from datetime import datetime, time, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from seed_data import INTRODUCTION, CONCLUSION
+from seeding import sync_catalog
+from indexes import ensure_indexes, index_report
+from database import DatabaseSettings, PoolStats, catalog_database, create_client
+from users import (
+    DEFAULT_USER_ID, USER_ID_RE, claim_default, current_user, optional_user, require_admin, migrate_user_ids,
+)
+from daily import DailySchedule, roll_over_daily, seconds_until_midnight, today
+import stats
+import challenges
+import journal
+from write_behind import WRITE_BEHIND, WriteBuffer
+from catalog import Catalog, watch_catalog
+from search import SearchIndex
+from similarity import SimilarityGraph, TOP_K
+from http_cache import CachedBody, CatalogResponses, render, dumps
+from response_cache import AsyncLRUCache, cached, normalize_text
+import metrics
+import tracing
 
 # 1. Φόρτωση ρυθμίσεων
 ROOT_DIR = Path(__file__).parent
@@ -24,18 +44,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 # 4. Σύνδεση με τη Βάση
-# Πρώτα κοιτάμε αν υπάρχει η μεταβλητή MONGO_URL (όπως την ονομάσαμε στο Render)
-mongo_url = os.environ.get('MONGO_URL') or os.environ.get('MONGO_URI') or 'mongodb://127.0.0.1:27017'
-client = AsyncIOMotorClient(mongo_url)
-
-# Παίρνουμε το όνομα της βάσης από το Render, αλλιώς χρησιμοποιούμε το 'ai_powered_mind'
-db_name = os.environ.get('DB_NAME', 'ai_powered_mind')
-db = client[db_name]
+# MONGO_URL / DB_NAME (όπως στο Render) και ρυθμίσεις pool/timeouts, βλ. database.py
+db_settings = DatabaseSettings.from_env()
+pool_stats = PoolStats()
+command_metrics = metrics.CommandMetrics()
+slow_queries = tracing.SlowQueryListener()
+listeners = [pool_stats]
+if metrics.METRICS:
+    listeners.append(command_metrics)
+if tracing.TRACING:
+    listeners.append(slow_queries)
+client = create_client(db_settings, listeners)
+db = client[db_settings.db_name]
+# Catalog change detection may use secondaries; reloads and user data use the primary
+catalog_db = catalog_database(client, db_settings)
+if metrics.METRICS:
+    # Per-request command time is only measured on MongoDB
+    app.add_middleware(metrics.MetricsMiddleware, db_time=db_settings.storage_backend == "mongo")
 
 # 5. Router
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=tracing.TracedRoute)
+
+# In-process catalog (sections + mental models), loaded after seeding
+catalog = Catalog()
+catalog.register("search", lambda snapshot: SearchIndex(snapshot.models))
+catalog.register("related", lambda snapshot: SimilarityGraph(snapshot.models))
+catalog.register("daily", lambda snapshot: DailySchedule(snapshot.models))
+background_tasks = []
+write_buffer = WriteBuffer(db) if WRITE_BEHIND else None
 
 # ΣΥΝΕΧΙΖΕΙΣ ΜΕ ΤΑ PYDANTIC MODELS ΣΟΥ...
 
@@ -65,6 +104,121 @@ class MentalModelOut(BaseModel):
     ai_prompt: str
 
 
+class ModelSummaryOut(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    section_slug: str
+    model_index: int
+    title: str
+
+
+class ModelCardOut(ModelSummaryOut):
+    section_index: int
+    section_name: str
+    explanation: str
+
+
+class MentalModelHit(MentalModelOut):
+    score: Optional[float] = None
+    highlights: Optional[Dict[str, List[List[int]]]] = None
+
+
+class RelatedModelOut(MentalModelOut):
+    similarity: float
+
+
+class DailyPickOut(BaseModel):
+    date: str
+    model: MentalModelOut
+
+
+class ModelEdgeOut(BaseModel):
+    source: str
+    target: str
+    score: float
+    cross_section: bool
+
+
+class ModelGraphOut(BaseModel):
+    version: str
+    edges: List[ModelEdgeOut]
+
+
+SectionList = TypeAdapter(List[SectionOut])
+ModelOut = TypeAdapter(MentalModelOut)
+RelatedList = TypeAdapter(List[RelatedModelOut])
+JsonObject = TypeAdapter(dict)
+
+# Named projections of the model list: view -> (schema, fields)
+MODEL_VIEWS = {
+    "summary": ModelSummaryOut,
+    "card": ModelCardOut,
+    "full": MentalModelOut,
+}
+MODEL_VIEW_LISTS = {view: TypeAdapter(List[schema]) for view, schema in MODEL_VIEWS.items()}
+MODEL_FIELDS = tuple(MentalModelOut.model_fields)
+
+
+def view_fields(view: str) -> Tuple[str, ...]:
+    return tuple(f for f in MODEL_FIELDS if f in MODEL_VIEWS[view].model_fields)
+
+
+def parse_fields(fields: str) -> Tuple[str, ...]:
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(MODEL_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id is always included so clients can key their lists
+    return tuple(f for f in MODEL_FIELDS if f in requested or f == "id")
+
+
+def project(doc: dict, fields: Tuple[str, ...]) -> dict:
+    return {f: doc[f] for f in fields}
+
+
+def models_key(view: str, section: Optional[str], count: int) -> str:
+    return f"models:{view}:{section or ''}:{count}"
+
+
+def render_models(models, view: str = "full") -> bytes:
+    return render(MODEL_VIEW_LISTS[view], list(models))
+
+
+def prerender_catalog(snapshot) -> Dict[str, bytes]:
+    """Every catalog response that does not depend on free-form input."""
+    payloads = {
+        "sections": render(SectionList, list(snapshot.sections)),
+        "introduction": render(JsonObject, INTRODUCTION),
+        "conclusion": render(JsonObject, CONCLUSION),
+    }
+    for view in MODEL_VIEWS:
+        payloads[models_key(view, None, len(snapshot.models))] = render_models(snapshot.models, view)
+        for slug, models in snapshot.by_section.items():
+            payloads[models_key(view, slug, len(models))] = render_models(models, view)
+    for m in snapshot.models:
+        payloads[f"model:{m['section_slug']}:{m['model_index']}"] = render(ModelOut, m)
+    # Today's pick; roll_over_daily adds each following day's
+    day = today()
+    pick = snapshot.derived("daily", DailySchedule).pick(day)
+    if pick:
+        payloads[f"daily:{day.isoformat()}"] = render(ModelOut, pick)
+    return payloads
+
+
+catalog_responses = CatalogResponses(catalog, prerender_catalog)
+metrics.track_cache("catalog_responses", lambda: catalog_responses.stats)
+
+# Search and related-model results depend only on their parameters and the catalog
+models_search_cache = AsyncLRUCache("models_search", version=lambda: catalog.version)
+related_cache = AsyncLRUCache("related_models", version=lambda: catalog.version)
+metrics.track_cache("models_search", models_search_cache.stats)
+metrics.track_cache("related_models", related_cache.stats)
+# Slim model index (summary view) for the bootstrap bundle
+catalog.register("model_summaries", lambda snapshot: [
+    project(m, view_fields("summary")) for m in snapshot.models
+])
+
+
 class JournalEntry(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -80,11 +234,51 @@ class JournalEntryCreate(BaseModel):
     section_slug: Optional[str] = None
 
 
+class JournalEntryImport(JournalEntryCreate):
+    model_config = ConfigDict(extra="forbid")
+    id: Optional[str] = Field(None, min_length=1, max_length=64)
+    created_at: Optional[datetime] = None
+
+
+class JournalSearchHit(BaseModel):
+    type: Literal["journal", "reflection"]
+    id: str
+    content: str
+    created_at: str
+    score: float
+    model_title: Optional[str] = None
+    section_slug: Optional[str] = None
+    challenge_id: Optional[str] = None
+    day: Optional[int] = None
+
+
+class JournalSearchOut(BaseModel):
+    results: List[JournalSearchHit]
+    next_offset: Optional[int] = None
+
+
+class JournalBulkDelete(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=10000)
+    section_slug: Optional[str] = None
+    model_title: Optional[str] = None
+    before: Optional[datetime] = None
+    after: Optional[datetime] = None
+    all: bool = False
+
+
 # --- 30-Day Challenge Models ---
 class ChallengeCreate(BaseModel):
     model_ids: List[str]  # 5 model IDs to practice
 
 
+class ChallengeBatchItem(ChallengeCreate):
+    user_id: str = Field(pattern=USER_ID_RE.pattern)
+
+
+class ChallengeBatchCreate(BaseModel):
+    challenges: List[ChallengeBatchItem] = Field(max_length=1000)
+
+
 class ChallengeOut(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -101,9 +295,15 @@ class ChallengeOut(BaseModel):
 
 class ChallengeDayComplete(BaseModel):
     day: int
+    challenge_id: Optional[str] = None
     reflection: Optional[str] = None
 
 
+class ProgressOut(BaseModel):
+    read_models: List[str] = []
+    bookmarks: List[str] = []
+
+
 class ChallengeLogOut(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -113,35 +313,31 @@ class ChallengeLogOut(BaseModel):
     completed_at: str
 
 
+@app.on_event("startup")
+async def create_indexes():
+    await migrate_user_ids(db)
+    await challenges.dedupe_logs(db)
+    await challenges.backfill_bitmaps(db)
+    await ensure_indexes(db)
+
+
 # Seed database on startup
 @app.on_event("startup")
 async def seed_database():
-    count = await db.mental_models.count_documents({})
-    if count == 0:
-        logging.info("Seeding mental models...")
-        section_map = {s["index"]: s for s in SECTIONS}
-        docs = []
-        for m in MODELS:
-            sec = section_map[m["section_index"]]
-            docs.append({
-                "id": str(uuid.uuid4()),
-                "section_index": m["section_index"],
-                "section_slug": sec["slug"],
-                "section_name": sec["short_name"],
-                "model_index": m["model_index"],
-                "title": m["title"],
-                "explanation": m["explanation"],
-                "example": m["example"],
-                "ai_prompt": m["ai_prompt"],
-            })
-        await db.mental_models.insert_many(docs)
-        logging.info(f"Seeded {len(docs)} mental models.")
-
-    sec_count = await db.sections.count_documents({})
-    if sec_count == 0:
-        logging.info("Seeding sections...")
-        await db.sections.insert_many([{**s} for s in SECTIONS])
-        logging.info(f"Seeded {len(SECTIONS)} sections.")
+    await sync_catalog(db)
+
+
+@app.on_event("startup")
+async def load_catalog():
+    # The first load reads the primary so it sees what seeding just wrote
+    await catalog.load(db)
+    background_tasks.append(asyncio.create_task(watch_catalog(catalog_db, catalog, reload_db=db)))
+    background_tasks.append(asyncio.create_task(stats.reconcile_periodically(db)))
+    background_tasks.append(asyncio.create_task(roll_over_daily(warm_daily_model)))
+    if write_buffer is not None:
+        write_buffer.start()
+    if tracing.TRACING:
+        slow_queries.bind(db, asyncio.get_running_loop())
 
 
 # ==================== API Routes ====================
@@ -152,241 +348,621 @@ async def root():
 
 
 @api_router.get("/sections", response_model=List[SectionOut])
-async def get_sections():
-    sections = await db.sections.find({}, {"_id": 0}).sort("index", 1).to_list(100)
-    return sections
+async def get_sections(request: Request):
+    return catalog_responses.respond(
+        request, "sections", lambda: render(SectionList, list(catalog.sections()))
+    )
 
 
-@api_router.get("/models", response_model=List[MentalModelOut])
+@api_router.get(
+    "/models",
+    response_model=List[Union[MentalModelHit, ModelCardOut, ModelSummaryOut]],
+    response_model_exclude_none=True,
+)
 async def get_models(
+    request: Request,
     section: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     limit: int = Query(300, ge=1, le=500),
+    highlight: bool = Query(False),
+    view: Literal["summary", "card", "full"] = Query("full"),
+    fields: Optional[str] = Query(None, description="Comma-separated model fields; overrides view"),
 ):
-    query = {}
+    models = catalog.models(section)
+    selected = parse_fields(fields) if fields else view_fields(view)
+    if not search:
+        page = models[:limit]
+        if fields:
+            # Too many field sets to cache; projecting the page is cheap
+            return catalog_responses.respond(request, None, lambda: dumps([project(m, selected) for m in page]))
+        # Unknown sections are not cached so arbitrary slugs cannot grow the store
+        known = not section or section in catalog.snapshot.by_section
+        return catalog_responses.respond(
+            request, models_key(view, section, len(page)) if known else None, lambda: render_models(page, view)
+        )
+    entry = await search_models(search, section, limit, highlight, selected)
+    return catalog_responses.send(request, entry)
+
+
+@cached(models_search_cache, normalize={"search": normalize_text})
+async def search_models(
+    search: str, section: Optional[str], limit: int, highlight: bool, selected: Tuple[str, ...]
+) -> CachedBody:
+    # Ranked full-text search; results are ordered by relevance
+    index = catalog.derived("search")
+    allowed = None
     if section:
-        query["section_slug"] = section
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"explanation": {"$regex": search, "$options": "i"}},
-            {"example": {"$regex": search, "$options": "i"}},
-        ]
-    models = await db.mental_models.find(query, {"_id": 0}).sort(
-        [("section_index", 1), ("model_index", 1)]
-    ).to_list(limit)
-    return models
+        position = catalog.snapshot.position
+        allowed = [position[m["id"]] for m in catalog.models(section)]
+    hits = index.search(search, limit=limit, allowed=allowed)
+    results = []
+    for hit in hits:
+        result = project(hit.doc, selected)
+        result["score"] = round(hit.score, 4)
+        if highlight:
+            result["highlights"] = index.highlights(hit)
+        results.append(result)
+    # Too many distinct queries to pay for brotli on every miss
+    return CachedBody(dumps(results), compress=False)
 
 
 @api_router.get("/models/{section_slug}/{model_index}", response_model=MentalModelOut)
-async def get_model(section_slug: str, model_index: int):
-    model = await db.mental_models.find_one(
-        {"section_slug": section_slug, "model_index": model_index}, {"_id": 0}
-    )
+async def get_model(request: Request, section_slug: str, model_index: int):
+    model = catalog.get(section_slug, model_index)
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
-    return model
+    return catalog_responses.respond(
+        request, f"model:{section_slug}:{model_index}", lambda: render(ModelOut, model)
+    )
 
 
 @api_router.get("/introduction")
-async def get_introduction():
-    return INTRODUCTION
+async def get_introduction(request: Request):
+    return catalog_responses.respond(request, "introduction", lambda: render(JsonObject, INTRODUCTION))
 
 
 @api_router.get("/conclusion")
-async def get_conclusion():
-    return CONCLUSION
+async def get_conclusion(request: Request):
+    return catalog_responses.respond(request, "conclusion", lambda: render(JsonObject, CONCLUSION))
 
 
 # --- Daily Model ---
+def resolve_timezone(tz: Optional[str]) -> tzinfo:
+    if not tz:
+        return timezone.utc
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+
+
+def daily_model(day=None, user_id: Optional[str] = None) -> Optional[dict]:
+    # Deterministic daily rotation, precomputed per catalog snapshot
+    return catalog.derived("daily").pick(day or today(), user_id)
+
+
+async def warm_daily_model(day):
+    version = catalog.version
+    model = daily_model(day)
+    if model:
+        # Compressed off the event loop, like the pre-rendered catalog bodies
+        entry = await asyncio.to_thread(CachedBody, render(ModelOut, model))
+        if catalog.version == version:
+            catalog_responses.store(f"daily:{day.isoformat()}", entry)
+
+
 @api_router.get("/daily-model", response_model=MentalModelOut)
-async def get_daily_model():
-    now = datetime.now(timezone.utc)
-    day_of_year = now.timetuple().tm_yday
-    total = await db.mental_models.count_documents({})
-    if total == 0:
+async def get_daily_model(
+    request: Request,
+    tz: Optional[str] = Query(None, description="IANA timezone for the local date, default UTC"),
+    personal: bool = Query(False),
+    user_id: Optional[str] = Depends(optional_user),
+):
+    zone = resolve_timezone(tz)
+    day = today(zone)
+    schedule_user = (user_id or DEFAULT_USER_ID) if personal else None
+    model = daily_model(day, schedule_user)
+    if not model:
         raise HTTPException(status_code=404, detail="No models found")
-    # Deterministic daily rotation
-    idx = day_of_year % total
-    model = await db.mental_models.find({}, {"_id": 0}).sort(
-        [("section_index", 1), ("model_index", 1)]
-    ).skip(idx).limit(1).to_list(1)
-    return model[0]
+    # Cached until the pick changes at local midnight, and modified when it did
+    max_age = int(seconds_until_midnight(zone))
+    return catalog_responses.respond(
+        request,
+        None if personal else f"daily:{day.isoformat()}",
+        lambda: render(ModelOut, model),
+        cache_control=f"{'private' if personal else 'public'}, max-age={max_age}",
+        last_modified=datetime.combine(day, time(0), tzinfo=zone),
+    )
+
+
+@api_router.get("/daily-model/schedule", response_model=List[DailyPickOut])
+async def get_daily_schedule(
+    days: int = Query(7, ge=1, le=90),
+    tz: Optional[str] = Query(None),
+    personal: bool = Query(False),
+    user_id: Optional[str] = Depends(optional_user),
+):
+    schedule_user = (user_id or DEFAULT_USER_ID) if personal else None
+    picks = catalog.derived("daily").upcoming(today(resolve_timezone(tz)), days, schedule_user)
+    return [{"date": day.isoformat(), "model": model} for day, model in picks if model]
 
 
 # --- Related Models ---
-@api_router.get("/models/{section_slug}/{model_index}/related", response_model=List[MentalModelOut])
-async def get_related_models(section_slug: str, model_index: int):
-    model = await db.mental_models.find_one(
-        {"section_slug": section_slug, "model_index": model_index}, {"_id": 0}
-    )
+@api_router.get("/models/{section_slug}/{model_index}/related", response_model=List[RelatedModelOut])
+async def get_related_models(
+    request: Request,
+    section_slug: str,
+    model_index: int,
+    limit: int = Query(5, ge=1, le=TOP_K),
+):
+    model = catalog.get(section_slug, model_index)
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
-    # Find models with similar words in title
-    title_words = [w for w in model["title"].split() if len(w) > 3]
-    if not title_words:
-        title_words = model["title"].split()[:2]
-    or_conditions = [{"title": {"$regex": w, "$options": "i"}} for w in title_words[:3]]
-    or_conditions.extend([{"explanation": {"$regex": w, "$options": "i"}} for w in title_words[:2]])
-    related = await db.mental_models.find(
+    return catalog_responses.send(request, await related_models(model["id"], limit))
+
+
+@cached(related_cache)
+async def related_models(model_id: str, limit: int) -> CachedBody:
+    model = catalog.get_by_id(model_id)
+    section_slug = model["section_slug"]
+    graph = catalog.derived("related")
+    position = catalog.snapshot.position[model["id"]]
+    related = [{**m, "similarity": score} for m, score in graph.related(position, limit)]
+    # Models with no vocabulary overlap fall back to their own section
+    if len(related) < limit:
+        existing_ids = {r["id"] for r in related} | {model["id"]}
+        for e in catalog.models(section_slug):
+            if e["id"] not in existing_ids and len(related) < limit:
+                related.append({**e, "similarity": 0.0})
+    return CachedBody(render(RelatedList, related), compress=False)
+
+
+@api_router.get("/models/graph", response_model=ModelGraphOut)
+async def get_model_graph(
+    per_model: int = Query(3, ge=1, le=TOP_K),
+    min_score: float = Query(0.1, ge=0, le=1),
+    cross_section: bool = Query(False),
+):
+    graph = catalog.derived("related")
+    edges = [
         {
-            "$or": or_conditions,
-            "$and": [
-                {"$or": [
-                    {"section_slug": {"$ne": section_slug}},
-                    {"model_index": {"$ne": model_index}}
-                ]}
-            ]
-        },
-        {"_id": 0}
-    ).limit(5).to_list(5)
-    # If not enough, grab random from same section
-    if len(related) < 3:
-        extras = await db.mental_models.find(
-            {"section_slug": section_slug, "model_index": {"$ne": model_index}},
-            {"_id": 0}
-        ).limit(5).to_list(5)
-        existing_ids = {r["id"] for r in related}
-        for e in extras:
-            if e["id"] not in existing_ids and len(related) < 5:
-                related.append(e)
-    return related[:5]
+            "source": a["id"],
+            "target": b["id"],
+            "score": score,
+            "cross_section": a["section_slug"] != b["section_slug"],
+        }
+        for a, b, score in graph.edges(per_model, min_score, cross_section_only=cross_section)
+    ]
+    return {"version": catalog.version, "edges": edges}
+
+
+# --- Catalog ---
+@api_router.post("/catalog/reload", dependencies=[Depends(require_admin)])
+async def reload_catalog():
+    # The primary, so a reload right after a catalog write sees it
+    snapshot = await catalog.load(db)
+    return {
+        "version": snapshot.version,
+        "sections": len(snapshot.sections),
+        "models": len(snapshot.models),
+    }
+
+
+# --- Diagnostics ---
+@api_router.get("/diagnostics/pool", dependencies=[Depends(require_admin)])
+async def get_pool_diagnostics():
+    return {"settings": db_settings.describe(), "servers": pool_stats.snapshot()}
+
+
+@api_router.get("/diagnostics/write-behind")
+async def get_write_behind_metrics():
+    if write_buffer is None:
+        return {"enabled": False}
+    return write_buffer.metrics()
+
+
+@api_router.get("/diagnostics/indexes", dependencies=[Depends(require_admin)])
+async def get_index_diagnostics():
+    return await index_report(db)
+
+
+@api_router.get("/diagnostics/caches")
+async def get_cache_diagnostics():
+    return {
+        "catalog_responses": catalog_responses.stats,
+        "models_search": models_search_cache.stats(),
+        "related_models": related_cache.stats(),
+    }
+
+
+@api_router.get("/diagnostics/traces", dependencies=[Depends(require_admin)])
+async def get_traces(
+    limit: int = Query(50, ge=1, le=tracing.TRACE_BUFFER),
+    min_ms: float = Query(0, ge=0),
+    route: Optional[str] = Query(None, description="Route template, e.g. /api/models"),
+):
+    if not tracing.TRACING:
+        raise HTTPException(status_code=404, detail="Tracing is disabled")
+    return tracing.recent_traces(limit, min_ms, route)
+
+
+@api_router.post("/diagnostics/profile", dependencies=[Depends(require_admin)])
+async def profile_event_loop(
+    seconds: float = Query(5, gt=0, le=tracing.MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+):
+    """Sample the event loop and return collapsed stacks for a flame graph."""
+    if not tracing.TRACING:
+        raise HTTPException(status_code=404, detail="Tracing is disabled")
+    try:
+        stacks = await tracing.profile_loop(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=stacks, media_type="text/plain")
+
+
+# Prometheus scrape target, outside /api like other infrastructure endpoints
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if not metrics.METRICS:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 # --- Journal ---
 @api_router.get("/journal", response_model=List[JournalEntry])
-async def get_journal_entries():
-    entries = await db.journal_entries.find({}, {"_id": 0}).sort("created_at", -1).to_list(200)
+async def get_journal_entries(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(200, ge=1, le=500),
+    user_id: str = Depends(current_user),
+):
+    # Newest first, keyset-paginated; the next page's cursor goes in X-Next-Cursor
+    try:
+        query = journal.page_query(user_id, cursor)
+    except journal.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    entries = await db.journal_entries.find(
+        query, {"_id": 0, "user_id": 0}
+    ).sort(journal.JOURNAL_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers["X-Next-Cursor"] = journal.encode_cursor(entries[-1])
     return entries
 
 
+@api_router.get("/journal/export")
+async def export_journal_entries(user_id: str = Depends(current_user)):
+    # Streams every entry as NDJSON straight from the cursor, in constant memory
+    async def stream():
+        cursor = db.journal_entries.find({"user_id": user_id}, {"_id": 0, "user_id": 0})
+        async for entry in cursor.sort(journal.JOURNAL_SORT).batch_size(500):
+            yield dumps(entry) + b"\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="journal.ndjson"'},
+    )
+
+
 @api_router.post("/journal", response_model=JournalEntry, status_code=201)
-async def create_journal_entry(entry: JournalEntryCreate):
+async def create_journal_entry(entry: JournalEntryCreate, user_id: str = Depends(current_user)):
     journal = JournalEntry(**entry.model_dump())
-    doc = journal.model_dump()
+    doc = {**journal.model_dump(), "user_id": user_id}
+    if write_buffer is not None:
+        await write_buffer.put("journal_entries", InsertOne(doc))
+        await write_buffer.put("user_stats", stats.journal_added_op(user_id))
+        return journal
     await db.journal_entries.insert_one(doc)
+    await stats.journal_added(db, user_id)
     return journal
 
 
+def utc_iso(value: datetime) -> str:
+    # Stored timestamps are UTC ISO strings, so they sort and compare as text
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def journal_import_doc(row, user_id: str) -> dict:
+    try:
+        entry = JournalEntryImport.model_validate(row)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors()
+        ))
+    doc = JournalEntry(**entry.model_dump(exclude_none=True, exclude={"created_at"})).model_dump()
+    if entry.created_at:
+        doc["created_at"] = utc_iso(entry.created_at)
+    return {**doc, "user_id": user_id}
+
+
+@api_router.get("/journal/search", response_model=JournalSearchOut)
+async def search_journal(
+    q: str = Query(..., min_length=1, max_length=200),
+    source: Literal["all", "journal", "reflections"] = Query("all"),
+    model_title: Optional[str] = Query(None),
+    section_slug: Optional[str] = Query(None),
+    after: Optional[datetime] = Query(None),
+    before: Optional[datetime] = Query(None),
+    offset: int = Query(0, ge=0, le=1000),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(current_user),
+):
+    results, has_more = await journal.search(
+        db, user_id, q,
+        sources=journal.SEARCH_SOURCES if source == "all" else (source,),
+        model_title=model_title,
+        section_slug=section_slug,
+        after=utc_iso(after) if after else None,
+        before=utc_iso(before) if before else None,
+        offset=offset,
+        limit=limit,
+    )
+    return {"results": results, "next_offset": offset + limit if has_more else None}
+
+
+@api_router.post("/journal/bulk")
+async def import_journal_entries(request: Request, user_id: str = Depends(current_user)):
+    """Import many entries from an NDJSON or JSON array body."""
+    report = await journal.import_entries(
+        db, request.stream(), lambda row: journal_import_doc(row, user_id)
+    )
+    if report["inserted"]:
+        await stats.journal_added(db, user_id, report["inserted"])
+    return report
+
+
+@api_router.post("/journal/bulk-delete")
+async def delete_journal_entries(data: JournalBulkDelete, user_id: str = Depends(current_user)):
+    query = {"user_id": user_id}
+    if data.ids is not None:
+        query["id"] = {"$in": data.ids}
+    if data.section_slug is not None:
+        query["section_slug"] = data.section_slug
+    if data.model_title is not None:
+        query["model_title"] = data.model_title
+    created_at = {}
+    if data.before:
+        created_at["$lt"] = utc_iso(data.before)
+    if data.after:
+        created_at["$gte"] = utc_iso(data.after)
+    if created_at:
+        query["created_at"] = created_at
+    if len(query) == 1 and not data.all:
+        raise HTTPException(status_code=400, detail="Give a filter, or all=true to delete every entry")
+    result = await db.journal_entries.delete_many(query)
+    if result.deleted_count:
+        await stats.journal_removed(db, user_id, result.deleted_count)
+    return {"deleted": result.deleted_count}
+
+
 @api_router.delete("/journal/{entry_id}")
-async def delete_journal_entry(entry_id: str):
-    result = await db.journal_entries.delete_one({"id": entry_id})
+async def delete_journal_entry(entry_id: str, user_id: str = Depends(current_user)):
+    result = await db.journal_entries.delete_one({"id": entry_id, "user_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Entry not found")
+    await stats.journal_removed(db, user_id)
     return {"status": "deleted"}
 
 
 # --- 30-Day Challenge ---
 @api_router.post("/challenge", status_code=201)
-async def create_challenge(data: ChallengeCreate):
-    if len(data.model_ids) != 5:
-        raise HTTPException(status_code=400, detail="Exactly 5 models required")
-    # Fetch model details
-    models_found = await db.mental_models.find(
-        {"id": {"$in": data.model_ids}}, {"_id": 0}
-    ).to_list(5)
-    if len(models_found) != 5:
-        raise HTTPException(status_code=400, detail="One or more models not found")
-    # Deactivate any existing active challenge
-    await db.challenges.update_many({"is_active": True}, {"$set": {"is_active": False}})
-    challenge = {
-        "id": str(uuid.uuid4()),
-        "model_ids": data.model_ids,
-        "model_titles": [m["title"] for m in models_found],
-        "model_slugs": [m["section_slug"] for m in models_found],
-        "model_indices": [m["model_index"] for m in models_found],
-        "completed_days": [],
-        "started_at": datetime.now(timezone.utc).isoformat(),
-        "streak": 0,
-        "is_active": True,
-    }
-    await db.challenges.insert_one({**challenge})
+async def create_challenge(data: ChallengeCreate, user_id: str = Depends(current_user)):
+    try:
+        challenge = challenges.new_challenge(data.model_ids, catalog.get_by_id)
+    except challenges.InvalidChallenge as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await challenges.start(db, user_id, challenge)
     challenge["current_day"] = 1
     return challenge
 
 
-@api_router.get("/challenge/active")
-async def get_active_challenge():
-    challenge = await db.challenges.find_one({"is_active": True}, {"_id": 0})
+@api_router.post("/challenge/batch", status_code=201, dependencies=[Depends(require_admin)])
+async def create_challenges(data: ChallengeBatchCreate):
+    """Start challenges for many users at once (cohort onboarding)."""
+    created: Dict[str, dict] = {}
+    errors = []
+    for position, item in enumerate(data.challenges):
+        if item.user_id in created:
+            errors.append({"index": position, "user_id": item.user_id, "detail": "Duplicate user"})
+            continue
+        try:
+            created[item.user_id] = challenges.new_challenge(item.model_ids, catalog.get_by_id)
+        except challenges.InvalidChallenge as e:
+            errors.append({"index": position, "user_id": item.user_id, "detail": str(e)})
+    failed = await challenges.start_many(db, created)
+    errors.extend({"user_id": user, "detail": detail} for user, detail in failed.items())
+    return {
+        "created": [
+            {"user_id": user, "challenge_id": c["id"]} for user, c in created.items() if user not in failed
+        ],
+        "errors": errors,
+    }
+
+
+async def load_active_challenge(user_id: str) -> Optional[dict]:
+    challenge = await db.challenges.find_one(
+        {"user_id": user_id, "is_active": True}, {"_id": 0, "user_id": 0}
+    )
     if not challenge:
         return None
-    # Calculate current day
-    started = datetime.fromisoformat(challenge["started_at"])
-    now = datetime.now(timezone.utc)
-    current_day = min((now - started).days + 1, 30)
-    challenge["current_day"] = current_day
-    # Calculate streak
-    completed = sorted(challenge.get("completed_days", []))
-    streak = 0
-    for d in range(current_day, 0, -1):
-        if d in completed:
-            streak += 1
-        else:
-            break
-    challenge["streak"] = streak
-    return challenge
+    return challenges.decode(challenge)
+
+
+@api_router.get("/challenge/active")
+async def get_active_challenge(user_id: str = Depends(current_user)):
+    return await load_active_challenge(user_id)
 
 
 @api_router.post("/challenge/complete-day")
-async def complete_challenge_day(data: ChallengeDayComplete):
-    challenge = await db.challenges.find_one({"is_active": True}, {"_id": 0})
-    if not challenge:
-        raise HTTPException(status_code=404, detail="No active challenge")
+async def complete_challenge_day(data: ChallengeDayComplete, user_id: str = Depends(current_user)):
     if data.day < 1 or data.day > 30:
         raise HTTPException(status_code=400, detail="Day must be 1-30")
-    completed = challenge.get("completed_days", [])
-    if data.day not in completed:
-        completed.append(data.day)
-        await db.challenges.update_one(
-            {"id": challenge["id"]},
-            {"$set": {"completed_days": completed}}
+    try:
+        return await challenges.complete_day(
+            db, user_id, data.day, data.reflection, challenge_id=data.challenge_id, buffer=write_buffer
         )
-    # Save log entry
-    log = {
-        "id": str(uuid.uuid4()),
-        "challenge_id": challenge["id"],
-        "day": data.day,
-        "reflection": data.reflection,
-        "completed_at": datetime.now(timezone.utc).isoformat(),
-    }
-    await db.challenge_logs.insert_one({**log})
-    return {"status": "completed", "day": data.day, "total_completed": len(completed)}
+    except challenges.NoActiveChallenge:
+        raise HTTPException(status_code=404, detail="No active challenge")
+
+
+@api_router.get("/challenge/{challenge_id}/history")
+async def get_challenge_history(challenge_id: str, user_id: str = Depends(current_user)):
+    challenge = await db.challenges.find_one(
+        {"user_id": user_id, "id": challenge_id},
+        {"_id": 0, "id": 1, "started_at": 1, **{f: 1 for f in challenges.STREAK_FIELDS}},
+    )
+    if not challenge:
+        raise HTTPException(status_code=404, detail="Challenge not found")
+    return challenges.history(challenge)
 
 
 @api_router.get("/challenge/logs")
-async def get_challenge_logs(challenge_id: str):
+async def get_challenge_logs(challenge_id: str, user_id: str = Depends(current_user)):
     logs = await db.challenge_logs.find(
-        {"challenge_id": challenge_id}, {"_id": 0}
+        {"user_id": user_id, "challenge_id": challenge_id}, {"_id": 0, "user_id": 0}
     ).sort("day", 1).to_list(30)
     return logs
 
 
 @api_router.delete("/challenge/{challenge_id}")
-async def delete_challenge(challenge_id: str):
-    await db.challenges.delete_one({"id": challenge_id})
-    await db.challenge_logs.delete_many({"challenge_id": challenge_id})
+async def delete_challenge(challenge_id: str, user_id: str = Depends(current_user)):
+    result = await db.challenges.delete_one({"id": challenge_id, "user_id": user_id})
+    if result.deleted_count:
+        await db.challenge_logs.delete_many({"user_id": user_id, "challenge_id": challenge_id})
+        await stats.challenge_removed(db, user_id, challenge_id)
     return {"status": "deleted"}
 
 
+# --- Reading Progress & Bookmarks ---
+async def get_progress_doc(user_id: str) -> dict:
+    doc = await db.user_progress.find_one({"user_id": user_id}, {"_id": 0, "user_id": 0})
+    return {"read_models": [], "bookmarks": [], **(doc or {})}
+
+
+def require_model(model_id: str) -> str:
+    if not catalog.get_by_id(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+    return model_id
+
+
+@api_router.get("/progress", response_model=ProgressOut)
+async def get_progress(user_id: str = Depends(current_user)):
+    return await get_progress_doc(user_id)
+
+
+@api_router.post("/progress/sync", response_model=ProgressOut)
+async def sync_progress(data: ProgressOut, user_id: str = Depends(current_user)):
+    # Merges a client's local state (e.g. from localStorage) into the stored one
+    read_models = [m for m in data.read_models if catalog.get_by_id(m)]
+    bookmarks = [m for m in data.bookmarks if catalog.get_by_id(m)]
+    await db.user_progress.update_one(
+        {"user_id": user_id},
+        {"$addToSet": {"read_models": {"$each": read_models}, "bookmarks": {"$each": bookmarks}}},
+        upsert=True,
+    )
+    return await get_progress_doc(user_id)
+
+
+@api_router.put("/progress/read/{model_id}")
+async def mark_model_read(model_id: str, user_id: str = Depends(current_user)):
+    await db.user_progress.update_one(
+        {"user_id": user_id}, {"$addToSet": {"read_models": require_model(model_id)}}, upsert=True
+    )
+    return {"status": "read", "model_id": model_id}
+
+
+@api_router.put("/progress/bookmarks/{model_id}")
+async def add_bookmark(model_id: str, user_id: str = Depends(current_user)):
+    await db.user_progress.update_one(
+        {"user_id": user_id}, {"$addToSet": {"bookmarks": require_model(model_id)}}, upsert=True
+    )
+    return {"status": "bookmarked", "model_id": model_id}
+
+
+@api_router.delete("/progress/bookmarks/{model_id}")
+async def remove_bookmark(model_id: str, user_id: str = Depends(current_user)):
+    await db.user_progress.update_one({"user_id": user_id}, {"$pull": {"bookmarks": model_id}})
+    return {"status": "removed", "model_id": model_id}
+
+
+# --- Users ---
+@api_router.post("/users/claim-default")
+async def claim_default_partition(user_id: str = Depends(current_user)):
+    """Take over the data of the shared ``default`` user (pre-tenancy installs)."""
+    moved, skipped = await claim_default(db, user_id)
+    if any(moved.values()):
+        await stats.discard(db, user_id, DEFAULT_USER_ID)
+    return {"claimed": moved, "skipped": skipped}
+
+
 # --- Stats ---
-@api_router.get("/stats")
-async def get_stats():
-    total_models = await db.mental_models.count_documents({})
-    total_sections = await db.sections.count_documents({})
-    total_journal = await db.journal_entries.count_documents({})
-    active_challenge = await db.challenges.find_one({"is_active": True}, {"_id": 0})
-    challenge_progress = 0
-    if active_challenge:
-        challenge_progress = len(active_challenge.get("completed_days", []))
+async def build_stats(user_id: str) -> dict:
+    snapshot = catalog.snapshot
+    counters = await stats.get_user_stats(db, user_id)
     return {
-        "total_models": total_models,
-        "total_sections": total_sections,
-        "total_journal_entries": total_journal,
-        "challenge_progress": challenge_progress,
-        "challenge_active": active_challenge is not None,
+        "total_models": len(snapshot.models),
+        "total_sections": len(snapshot.sections),
+        "total_journal_entries": counters.get("journal_entries", 0),
+        "challenge_progress": counters.get("challenge_progress", 0),
+        "challenge_active": counters.get("active_challenge_id") is not None,
     }
 
 
+@api_router.get("/stats")
+async def get_stats(user_id: str = Depends(current_user)):
+    return await build_stats(user_id)
+
+
+@api_router.post("/stats/reconcile")
+async def reconcile_stats(user_id: str = Depends(current_user)):
+    return await stats.reconcile_user(db, user_id)
+
+
+# --- Bootstrap ---
+BOOTSTRAP_FIELDS = ("sections", "models", "daily_model", "stats", "active_challenge", "introduction")
+
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the bundle"),
+    user_id: str = Depends(current_user),
+):
+    # Everything the SPA needs for first paint in one round-trip
+    wanted = set(BOOTSTRAP_FIELDS)
+    if fields:
+        wanted = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = wanted - set(BOOTSTRAP_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    snapshot = catalog.snapshot
+    bundle = {"version": snapshot.version}
+    if "sections" in wanted:
+        bundle["sections"] = list(snapshot.sections)
+    if "models" in wanted:
+        bundle["models"] = catalog.derived("model_summaries")
+    if "daily_model" in wanted:
+        bundle["daily_model"] = daily_model()
+    if "introduction" in wanted:
+        bundle["introduction"] = INTRODUCTION
+    # Per-user data is read concurrently
+    pending = {}
+    if "stats" in wanted:
+        pending["stats"] = build_stats(user_id)
+    if "active_challenge" in wanted:
+        pending["active_challenge"] = load_active_challenge(user_id)
+    results = await asyncio.gather(*pending.values())
+    bundle.update(zip(pending.keys(), results))
+    return Response(
+        content=dumps(bundle),
+        media_type="application/json",
+        headers={"Cache-Control": "private, no-cache"},
+    )
+
+
 app.include_router(api_router)
 # Στο τέλος του αρχείου, πριν το logging
 
@@ -402,4 +978,8 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    if write_buffer is not None:
+        await write_buffer.close()
     client.close()
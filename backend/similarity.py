@@ -0,0 +1,76 @@
+"""Precomputed related-model graph.
+
+Each model is embedded as a TF-IDF vector over its title, explanation and
+example (using the search tokenizer/stemmer), and the top-k cosine neighbours of
+every model are computed in one batched matrix product when a catalog snapshot
+loads.  Looking up related models is then a list index.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from search import tokenize
+
+TOP_K = 10
+FIELD_WEIGHTS = {"title": 3.0, "explanation": 1.0, "example": 1.0}
+
+
+class SimilarityGraph:
+    """Top-k cosine neighbour table over a sequence of catalog models."""
+
+    def __init__(self, docs: Sequence[dict], k: int = TOP_K):
+        self.docs = tuple(docs)
+        self.k = min(k, max(len(self.docs) - 1, 0))
+        self.neighbours: List[Tuple[Tuple[int, float], ...]] = [() for _ in self.docs]
+        if self.k == 0:
+            return
+
+        vocab: Dict[str, int] = {}
+        rows = []
+        for doc in self.docs:
+            counts: Dict[int, float] = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for _, term, _, _ in tokenize(doc.get(field) or ""):
+                    col = vocab.setdefault(term, len(vocab))
+                    counts[col] = counts.get(col, 0.0) + weight
+            rows.append(counts)
+
+        tf = np.zeros((len(self.docs), len(vocab)), dtype=np.float32)
+        for i, counts in enumerate(rows):
+            cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            vals = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            tf[i, cols] = 1.0 + np.log(vals)
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log((1.0 + len(self.docs)) / (1.0 + df)) + 1.0
+        vectors = tf * idf.astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+
+        sims = vectors @ vectors.T
+        np.fill_diagonal(sims, -1.0)
+        top = np.argpartition(-sims, self.k - 1, axis=1)[:, : self.k]
+        for i in range(len(self.docs)):
+            order = top[i][np.argsort(-sims[i, top[i]], kind="stable")]
+            self.neighbours[i] = tuple(
+                (int(j), round(float(sims[i, j]), 4)) for j in order if sims[i, j] > 0
+            )
+
+    def related(self, position: int, limit: int = 5) -> List[Tuple[dict, float]]:
+        return [(self.docs[j], score) for j, score in self.neighbours[position][:limit]]
+
+    def edges(self, per_model: int, min_score: float = 0.0, cross_section_only: bool = False):
+        """Undirected neighbour edges ``(source, target, score)``, strongest first."""
+        seen = {}
+        for i, neighbours in enumerate(self.neighbours):
+            for j, score in neighbours[:per_model]:
+                if score < min_score:
+                    break
+                if cross_section_only and \
+                        self.docs[i]["section_slug"] == self.docs[j]["section_slug"]:
+                    continue
+                key = (min(i, j), max(i, j))
+                seen[key] = max(score, seen.get(key, 0.0))
+        return sorted(
+            ((self.docs[i], self.docs[j], score) for (i, j), score in seen.items()),
+            key=lambda edge: -edge[2],
+        )
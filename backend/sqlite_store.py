@@ -0,0 +1,987 @@
+"""Embedded SQLite storage behind the Motor collection API.
+
+``STORAGE_BACKEND=sqlite`` swaps the Motor client for ``SQLiteClient``: the
+app keeps its Mongo-style queries, but every collection is a table of JSON
+documents in one local SQLite file per database, in WAL mode.  That gives
+single-node deployments local reads without a network hop, and lets tests and
+benchmarks run without a MongoDB server (``SQLITE_PATH=:memory:``).
+
+Only the subset of the API this app uses is implemented:
+
+- ``find``/``find_one`` with projections, sort/skip/limit and keyset ``$or``s
+- the common comparison, logical and update operators
+- ``bulk_write``, ``insert_many``, ``find_one_and_update``, upserts
+- ``$text`` search with scores
+- a small ``aggregate`` ($match/$sort/$group/$project/$limit/$skip/$count)
+
+Declared indexes become SQLite expression indexes on ``json_extract``, and
+unique and partial unique indexes are enforced by SQLite itself.  Filters on
+indexed fields are pushed down to SQL (indexed fields are assumed to hold
+scalars, which is true for every index in ``indexes.py``).  Anything else is
+matched in Python over the rows SQL returns.  Change streams and
+``$indexStats`` raise ``OperationFailure``, which the callers already treat
+as "not available here".
+
+Calls run synchronously on the event loop.  They are short local reads and
+writes, and each write runs in one ``BEGIN IMMEDIATE`` transaction, so
+read-modify-write operations like ``find_one_and_update`` are atomic.
+"""
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from search import tokenize
+
+DUPLICATE_KEY = 11000
+INDEX_NOT_FOUND = 27
+INDEX_KEY_SPECS_CONFLICT = 86
+CHANGE_STREAM_UNSUPPORTED = 40573
+INDEX_TABLE = "_indexes"
+
+_MISSING = object()
+
+
+# --- Documents -------------------------------------------------------------
+
+def _encode_id(value) -> str:
+    if isinstance(value, ObjectId):
+        return "o" + str(value)
+    if isinstance(value, str):
+        return "s" + value
+    return "j" + json.dumps(value, sort_keys=True)
+
+
+def _decode_id(key: str):
+    kind, raw = key[0], key[1:]
+    if kind == "o":
+        return ObjectId(raw)
+    if kind == "s":
+        return raw
+    return json.loads(raw)
+
+
+def _dumps(doc: dict) -> str:
+    return json.dumps({k: v for k, v in doc.items() if k != "_id"}, default=str, separators=(",", ":"))
+
+
+def _get(doc, path: str):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def _set(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: dict, path: str):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _sort_key(value):
+    """Order values by BSON type bracket first, like MongoDB does."""
+    if value is _MISSING or value is None:
+        return (1, 0)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, json.dumps(value, sort_keys=True, default=str))
+    if isinstance(value, list):
+        return (5, [_sort_key(v) for v in value])
+    if isinstance(value, ObjectId):
+        return (7, str(value))
+    return (9, str(value))
+
+
+# --- Query matching --------------------------------------------------------
+
+def _same(a, b) -> bool:
+    return _sort_key(a) == _sort_key(b)
+
+
+def _equals(value, target) -> bool:
+    if value is _MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(_same(v, target) for v in value)
+    return _same(value, target)
+
+
+def _ordered(value, op: str, arg) -> bool:
+    if value is _MISSING:
+        return False
+    a, b = _sort_key(value), _sort_key(arg)
+    if a[0] != b[0]:
+        return False
+    return {"$gt": a > b, "$gte": a >= b, "$lt": a < b, "$lte": a <= b}[op]
+
+
+def _match_op(value, op: str, arg) -> bool:
+    if op == "$eq":
+        return _equals(value, arg)
+    if op == "$ne":
+        return not _equals(value, arg)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        values = value if isinstance(value, list) else [value]
+        return any(_ordered(v, op, arg) for v in values)
+    if op == "$in":
+        return any(_equals(value, a) for a in arg)
+    if op == "$nin":
+        return not any(_equals(value, a) for a in arg)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$size":
+        return isinstance(value, list) and len(value) == arg
+    raise OperationFailure(f"Unsupported query operator {op}")
+
+
+def _is_operator_dict(cond) -> bool:
+    return isinstance(cond, dict) and bool(cond) and all(k.startswith("$") for k in cond)
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, q) for q in cond):
+                return False
+        elif key == "$text":
+            continue  # scored separately
+        elif key.startswith("$"):
+            raise OperationFailure(f"Unsupported query operator {key}")
+        elif _is_operator_dict(cond):
+            value = _get(doc, key)
+            if not all(_match_op(value, op, arg) for op, arg in cond.items()):
+                return False
+        elif not _equals(_get(doc, key), cond):
+            return False
+    return True
+
+
+def _field_sql(field: str) -> str:
+    if field == "_id":
+        return "_id"
+    return "json_extract(doc, '$.%s')" % field.replace("'", "''")
+
+
+def _type_sql(field: str) -> str:
+    return "json_type(doc, '$.%s')" % field.replace("'", "''")
+
+
+def _sql_value(field: str, value):
+    return _encode_id(value) if field == "_id" else value
+
+
+def _is_scalar(value) -> bool:
+    return isinstance(value, (str, int, float, bool)) or (value is None)
+
+
+def _json_types(value) -> str:
+    """SQLite JSON types in the same BSON type bracket as ``value``.
+
+    Without this guard SQL would compare across brackets (``true = 1``,
+    every number ``< 'a'``), where MongoDB and ``matches`` never match.
+    """
+    if isinstance(value, bool):
+        return "'true', 'false'"
+    if isinstance(value, (int, float)):
+        return "'integer', 'real'"
+    return "'text'"
+
+
+def _translate(query: dict, indexed: frozenset) -> Tuple[List[str], list, bool]:
+    """SQL conditions selecting a superset of ``query``; ``exact`` if not a strict superset."""
+    clauses: List[str] = []
+    params: list = []
+    exact = True
+    for key, cond in query.items():
+        if key == "$or":
+            branches = [_translate(sub, indexed) for sub in cond]
+            if all(b[0] for b in branches):
+                clauses.append("(" + " OR ".join("(" + " AND ".join(b[0]) + ")" for b in branches) + ")")
+                for b in branches:
+                    params.extend(b[1])
+                exact = exact and all(b[2] for b in branches)
+            else:
+                exact = False
+            continue
+        if key.startswith("$") or (key != "_id" and key not in indexed):
+            exact = False
+            continue
+        expr = _field_sql(key)
+        conditions = cond.items() if _is_operator_dict(cond) else [("$eq", cond)]
+        for op, arg in conditions:
+            if op == "$eq" and arg is None:
+                clauses.append(f"{expr} IS NULL")
+            elif op == "$eq" and _is_scalar(arg) or op in ("$gt", "$gte", "$lt", "$lte") and _is_scalar(arg) \
+                    and arg is not None and key != "_id":
+                sql_op = {"$eq": "=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[op]
+                clauses.append(f"{expr} {sql_op} ?")
+                params.append(_sql_value(key, arg))
+                if key != "_id":
+                    clauses.append(f"{_type_sql(key)} IN ({_json_types(arg)})")
+            elif op == "$in" and arg and all(_is_scalar(a) and a is not None for a in arg) \
+                    and (key == "_id" or len({_json_types(a) for a in arg}) == 1):
+                clauses.append(f"{expr} IN ({','.join('?' * len(arg))})")
+                params.extend(_sql_value(key, a) for a in arg)
+                if key != "_id":
+                    clauses.append(f"{_type_sql(key)} IN ({_json_types(arg[0])})")
+            else:
+                exact = False
+    return clauses, params, exact
+
+
+def _upsert_seed(query: dict) -> dict:
+    """Fields an upsert copies from its filter's equality conditions."""
+    doc: dict = {}
+    for key, cond in query.items():
+        if key.startswith("$"):
+            continue
+        if _is_operator_dict(cond):
+            if "$eq" in cond:
+                _set(doc, key, copy.deepcopy(cond["$eq"]))
+        else:
+            _set(doc, key, copy.deepcopy(cond))
+    return doc
+
+
+# --- Updates ---------------------------------------------------------------
+
+def _each(arg) -> list:
+    if isinstance(arg, dict) and "$each" in arg:
+        return list(arg["$each"])
+    return [arg]
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False) -> dict:
+    if not any(k.startswith("$") for k in update):
+        # Replacement document
+        return {"_id": doc.get("_id"), **copy.deepcopy(update)} if "_id" in doc else copy.deepcopy(update)
+    doc = copy.deepcopy(doc)
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, arg in fields.items():
+            if path == "_id" and op != "$setOnInsert" and not inserting:
+                continue
+            current = _get(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                _set(doc, path, copy.deepcopy(arg))
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                _set(doc, path, (0 if current is _MISSING else current) + arg)
+            elif op == "$max":
+                if current is _MISSING or _sort_key(arg) > _sort_key(current):
+                    _set(doc, path, arg)
+            elif op == "$min":
+                if current is _MISSING or _sort_key(arg) < _sort_key(current):
+                    _set(doc, path, arg)
+            elif op in ("$addToSet", "$push"):
+                values = [] if current is _MISSING else list(current)
+                for item in _each(arg):
+                    if op == "$push" or not any(_same(item, v) for v in values):
+                        values.append(copy.deepcopy(item))
+                _set(doc, path, values)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    if _is_operator_dict(arg):
+                        kept = [v for v in current if not all(_match_op(v, o, a) for o, a in arg.items())]
+                    else:
+                        kept = [v for v in current if not _same(v, arg)]
+                    _set(doc, path, kept)
+            elif op == "$bit":
+                value = 0 if current is _MISSING else current
+                for bit_op, operand in arg.items():
+                    value = {"or": value | operand, "and": value & operand, "xor": value ^ operand}[bit_op]
+                _set(doc, path, value)
+            else:
+                raise OperationFailure(f"Unknown update operator {op}")
+    return doc
+
+
+# --- Projection, sorting, text ---------------------------------------------
+
+def project(doc: dict, projection, score: Optional[float] = None) -> dict:
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    meta = [k for k, v in projection.items() if isinstance(v, dict)]
+    fields = {k: v for k, v in projection.items() if not isinstance(v, dict)}
+    include_id = fields.pop("_id", 1)
+    if any(fields.values()):
+        out = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+        for path, wanted in fields.items():
+            value = _get(doc, path)
+            if wanted and value is not _MISSING:
+                _set(out, path, value)
+    else:
+        out = dict(doc)
+        for path in fields:
+            _unset(out, path)
+        if not include_id:
+            out.pop("_id", None)
+    for key in meta:
+        out[key] = score
+    return out
+
+
+def _sort_spec(key_or_list, direction=None) -> List[Tuple[str, Any]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, 1 if direction is None else direction)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [tuple(item) for item in key_or_list]
+
+
+def sort_docs(docs: List[dict], spec, scores: Optional[Dict[int, float]] = None) -> List[dict]:
+    docs = list(docs)
+    for field, direction in reversed(spec):
+        if isinstance(direction, dict):  # {"$meta": "textScore"}
+            docs.sort(key=lambda d: scores.get(id(d), 0.0), reverse=True)
+        else:
+            docs.sort(key=lambda d: _sort_key(_get(d, field)), reverse=direction < 0)
+    return docs
+
+
+def _terms(text: str) -> set:
+    return {token_stem for _, token_stem, _, _ in tokenize(text)}
+
+
+def text_score(doc: dict, terms: set, weights: Dict[str, float]) -> float:
+    score = 0.0
+    for field, weight in weights.items():
+        value = _get(doc, field)
+        if not isinstance(value, str):
+            continue
+        tokens = [token_stem for _, token_stem, _, _ in tokenize(value)]
+        if not tokens:
+            continue
+        counts = Counter(tokens)
+        for term in terms:
+            if counts[term]:
+                score += weight * (0.5 + 0.5 * counts[term] / len(tokens)) * (1 + 0.1 * (counts[term] - 1))
+    return score
+
+
+# --- Aggregation -----------------------------------------------------------
+
+def _eval(expr, doc):
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, dict):
+        return {k: _eval(v, doc) for k, v in expr.items()}
+    return expr
+
+
+def _group(docs: List[dict], spec: dict) -> List[dict]:
+    groups: Dict[str, dict] = {}
+    for doc in docs:
+        key = _eval(spec["_id"], doc)
+        slot = json.dumps(key, sort_keys=True, default=str)
+        group = groups.get(slot)
+        if group is None:
+            group = groups[slot] = {"_id": key, "_values": {}}
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = acc.items()
+            group["_values"].setdefault(field, []).append(_eval(expr, doc))
+    out = []
+    for group in groups.values():
+        row = {"_id": group["_id"]}
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, _), = acc.items()
+            values = group["_values"][field]
+            numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            if op == "$sum":
+                row[field] = sum(numbers)
+            elif op == "$avg":
+                row[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == "$push":
+                row[field] = values
+            elif op == "$addToSet":
+                row[field] = [v for i, v in enumerate(values) if not any(_same(v, w) for w in values[:i])]
+            elif op == "$first":
+                row[field] = values[0]
+            elif op == "$last":
+                row[field] = values[-1]
+            elif op == "$max":
+                row[field] = max(values, key=_sort_key)
+            elif op == "$min":
+                row[field] = min(values, key=_sort_key)
+            else:
+                raise OperationFailure(f"Unsupported accumulator {op}")
+        out.append(row)
+    return out
+
+
+# --- Cursors ---------------------------------------------------------------
+
+class _ResultCursor:
+    """Async iteration and ``to_list`` over lazily computed results."""
+
+    def _results(self) -> List[dict]:
+        raise NotImplementedError
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        results = self._results()
+        return results if length is None else results[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._results():
+            yield doc
+
+    def batch_size(self, size: int):
+        return self
+
+
+class Cursor(_ResultCursor):
+    def __init__(self, collection: "SQLiteCollection", query: Optional[dict], projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, Any]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def _results(self) -> List[dict]:
+        return self._collection._find(self._query, self._projection, self._sort, self._skip, self._limit)
+
+
+class AggregateCursor(_ResultCursor):
+    def __init__(self, collection: "SQLiteCollection", pipeline: List[dict]):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    def _results(self) -> List[dict]:
+        return self._collection._aggregate(self._pipeline)
+
+
+class _NoChangeStream:
+    async def __aenter__(self):
+        raise OperationFailure(
+            "Change streams are not supported by the SQLite backend", CHANGE_STREAM_UNSUPPORTED
+        )
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+# --- Collections -----------------------------------------------------------
+
+class SQLiteCollection:
+    def __init__(self, database: "SQLiteDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._table = '"%s"' % name.replace('"', '""')
+        self._indexed: Optional[frozenset] = None
+        self._text_weights: Optional[Dict[str, float]] = None
+        database._execute(f"CREATE TABLE IF NOT EXISTS {self._table} (_id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+
+    # Index metadata
+
+    def _index_specs(self) -> Dict[str, dict]:
+        rows = self.database._execute(
+            f"SELECT name, spec FROM {INDEX_TABLE} WHERE collection = ?", (self.name,)
+        ).fetchall()
+        return {name: json.loads(spec) for name, spec in rows}
+
+    def _load_index_fields(self):
+        indexed, weights = set(), None
+        for spec in self._index_specs().values():
+            for field, direction in spec["key"]:
+                if direction == "text":
+                    weights = weights or {}
+                    weights[field] = spec.get("weights", {}).get(field, 1)
+                else:
+                    indexed.add(field)
+            # SQLite only uses a partial index when the query repeats its condition
+            indexed.update(spec.get("partialFilterExpression", {}))
+        self._indexed, self._text_weights = frozenset(indexed), weights
+
+    @property
+    def indexed_fields(self) -> frozenset:
+        if self._indexed is None:
+            self._load_index_fields()
+        return self._indexed
+
+    # Reads
+
+    def _rows(self, query: dict, order: str = "", limit: int = 0, skip: int = 0) -> Tuple[list, bool]:
+        clauses, params, exact = _translate(query, self.indexed_fields)
+        sql = f"SELECT _id, doc FROM {self._table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if exact and order:
+            sql += " ORDER BY " + order
+        if exact and (limit or skip):
+            sql += " LIMIT ? OFFSET ?"
+            params = [*params, limit or -1, skip]
+        docs = []
+        for key, raw in self.database._execute(sql, params):
+            doc = json.loads(raw)
+            docs.append({"_id": _decode_id(key), **doc})
+        if not exact:
+            docs = [d for d in docs if matches(d, query)]
+        return docs, exact
+
+    def _find(self, query: dict, projection=None, sort=(), skip: int = 0, limit: int = 0) -> List[dict]:
+        text = query.get("$text")
+        sort = list(sort)
+        order = ""
+        if not text and sort and all(not isinstance(d, dict) for _, d in sort):
+            order = ", ".join(f"{_field_sql(f)} {'DESC' if d < 0 else 'ASC'}" for f, d in sort)
+        # Paging in SQL is only right when SQL also produces the final order
+        pageable = not text and (order or not sort)
+        docs, exact = self._rows(query, order, limit if pageable else 0, skip if pageable else 0)
+        paged = exact and pageable
+        scores: Dict[int, float] = {}
+        if text:
+            if self._text_weights is None:
+                self._load_index_fields()
+            if not self._text_weights:
+                raise OperationFailure("text index required for $text query", INDEX_NOT_FOUND)
+            terms = _terms(text["$search"])
+            scored = []
+            for doc in docs:
+                score = text_score(doc, terms, self._text_weights)
+                if score > 0:
+                    scores[id(doc)] = score
+                    scored.append(doc)
+            docs = scored
+        if not paged:
+            if sort:
+                docs = sort_docs(docs, sort, scores)
+            if skip or limit:
+                docs = docs[skip:skip + limit if limit else None]
+        return [project(doc, projection, scores.get(id(doc))) for doc in docs]
+
+    def find(self, filter: Optional[dict] = None, projection=None, **kwargs) -> Cursor:
+        cursor = Cursor(self, filter, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        return cursor
+
+    async def find_one(self, filter: Optional[dict] = None, projection=None, **kwargs) -> Optional[dict]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = self._find(filter or {}, projection, _sort_spec(kwargs["sort"]) if kwargs.get("sort") else (), 0, 1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: dict, **kwargs) -> int:
+        clauses, params, exact = _translate(filter, self.indexed_fields)
+        if exact and "$text" not in filter:
+            sql = f"SELECT COUNT(*) FROM {self._table}"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            return self.database._execute(sql, params).fetchone()[0]
+        return len(self._find(filter))
+
+    async def distinct(self, key: str, filter: Optional[dict] = None) -> list:
+        values: list = []
+        seen = set()
+        for doc in self._find(filter or {}):
+            value = _get(doc, key)
+            for item in (value if isinstance(value, list) else [value]):
+                marker = _sort_key(item)
+                if item is not _MISSING and repr(marker) not in seen:
+                    seen.add(repr(marker))
+                    values.append(item)
+        return values
+
+    def aggregate(self, pipeline: List[dict], **kwargs) -> AggregateCursor:
+        return AggregateCursor(self, pipeline)
+
+    def _aggregate(self, pipeline: List[dict]) -> List[dict]:
+        docs: Optional[List[dict]] = None
+        for stage in pipeline:
+            (name, arg), = stage.items()
+            if name == "$indexStats":
+                raise OperationFailure("$indexStats is not supported by the SQLite backend")
+            if docs is None:
+                docs = self._find(arg) if name == "$match" else self._find({})
+                if name == "$match":
+                    continue
+            if name == "$match":
+                docs = [d for d in docs if matches(d, arg)]
+            elif name == "$sort":
+                docs = sort_docs(docs, _sort_spec(arg))
+            elif name == "$group":
+                docs = _group(docs, arg)
+            elif name == "$project":
+                docs = [project(d, arg) for d in docs]
+            elif name == "$limit":
+                docs = docs[:arg]
+            elif name == "$skip":
+                docs = docs[arg:]
+            elif name == "$count":
+                docs = [{arg: len(docs)}]
+            else:
+                raise OperationFailure(f"Unsupported pipeline stage {name}")
+        return docs if docs is not None else self._find({})
+
+    # Writes
+
+    def _insert(self, doc: dict):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        try:
+            self.database._execute(
+                f"INSERT INTO {self._table} (_id, doc) VALUES (?, ?)", (_encode_id(doc["_id"]), _dumps(doc))
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", DUPLICATE_KEY)
+        return doc["_id"]
+
+    def _replace(self, old: dict, new: dict):
+        try:
+            self.database._execute(
+                f"UPDATE {self._table} SET doc = ? WHERE _id = ?", (_dumps(new), _encode_id(old["_id"]))
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} ({e})", DUPLICATE_KEY)
+
+    def _update(self, query: dict, update: dict, multi: bool, upsert: bool) -> dict:
+        docs = self._find(query, limit=0 if multi else 1)
+        modified = 0
+        for doc in docs:
+            new = apply_update(doc, update)
+            if new != doc:
+                self._replace(doc, new)
+                modified += 1
+        if docs or not upsert:
+            return {"n": len(docs), "nModified": modified}
+        new = apply_update(_upsert_seed(query), update, inserting=True)
+        return {"n": 1, "nModified": 0, "upserted": self._insert(new)}
+
+    def _delete(self, query: dict, multi: bool) -> int:
+        docs = self._find(query, {"_id": 1}, limit=0 if multi else 1)
+        for doc in docs:
+            self.database._execute(f"DELETE FROM {self._table} WHERE _id = ?", (_encode_id(doc["_id"]),))
+        return len(docs)
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        with self.database._transaction():
+            return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        result = await self.bulk_write([InsertOne(doc) for doc in documents], ordered=ordered)
+        return InsertManyResult([doc["_id"] for doc in documents] if result.inserted_count else [], True)
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        with self.database._transaction():
+            return UpdateResult(self._update(filter, update, False, upsert), True)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        with self.database._transaction():
+            return UpdateResult(self._update(filter, update, True, upsert), True)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        with self.database._transaction():
+            return UpdateResult(self._update(filter, replacement, False, upsert), True)
+
+    async def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        with self.database._transaction():
+            return DeleteResult({"n": self._delete(filter, False)}, True)
+
+    async def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        with self.database._transaction():
+            return DeleteResult({"n": self._delete(filter, True)}, True)
+
+    async def find_one_and_update(
+        self, filter: dict, update: dict, projection=None, sort=None, upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE, **kwargs
+    ) -> Optional[dict]:
+        with self.database._transaction():
+            docs = self._find(filter, sort=_sort_spec(sort) if sort else (), limit=1)
+            if docs:
+                before = docs[0]
+                after = apply_update(before, update)
+                if after != before:
+                    self._replace(before, after)
+            elif upsert:
+                before = None
+                after = apply_update(_upsert_seed(filter), update, inserting=True)
+                self._insert(after)
+            else:
+                return None
+        result = after if return_document else before
+        return project(result, projection) if result is not None else None
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result = {
+            "writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+        }
+        with self.database._transaction():
+            for index, request in enumerate(requests):
+                try:
+                    self._apply(request, index, result)
+                except DuplicateKeyError as e:
+                    result["writeErrors"].append({"index": index, "code": DUPLICATE_KEY, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def _apply(self, request, index: int, result: dict):
+        if isinstance(request, InsertOne):
+            self._insert(request._doc)
+            result["nInserted"] += 1
+        elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+            raw = self._update(request._filter, request._doc, isinstance(request, UpdateMany), request._upsert)
+            if "upserted" in raw:
+                result["nUpserted"] += 1
+                result["upserted"].append({"index": index, "_id": raw["upserted"]})
+            else:
+                result["nMatched"] += raw["n"]
+                result["nModified"] += raw["nModified"]
+        elif isinstance(request, (DeleteOne, DeleteMany)):
+            result["nRemoved"] += self._delete(request._filter, isinstance(request, DeleteMany))
+        else:
+            raise TypeError(f"Unsupported bulk write request {request!r}")
+
+    # Indexes
+
+    async def create_indexes(self, indexes: List[Any], **kwargs) -> List[str]:
+        names = []
+        existing = self._index_specs()
+        for model in indexes:
+            document = model.document
+            name = document["name"]
+            spec = {"key": [[f, d] for f, d in document["key"].items()]}
+            for option in ("unique", "partialFilterExpression", "weights"):
+                if document.get(option):
+                    spec[option] = document[option]
+            if name in existing:
+                if existing[name] != json.loads(json.dumps(spec)):
+                    raise OperationFailure(
+                        f"An index named {name} already exists with different options", INDEX_KEY_SPECS_CONFLICT
+                    )
+                names.append(name)
+                continue
+            self._create_sql_index(name, spec)
+            names.append(name)
+        self._indexed = None
+        self._text_weights = None
+        return names
+
+    def _create_sql_index(self, name: str, spec: dict):
+        columns = [
+            f"{_field_sql(field)}{' DESC' if direction == -1 else ''}"
+            for field, direction in spec["key"] if direction != "text"
+        ]
+        sql_name = '"%s"' % f"{self.name}__{name}".replace('"', '""')
+        with self.database._transaction():
+            if columns:
+                sql = f"CREATE {'UNIQUE ' if spec.get('unique') else ''}INDEX {sql_name} ON {self._table} ({', '.join(columns)})"
+                params: list = []
+                if spec.get("partialFilterExpression"):
+                    fields = frozenset(spec["partialFilterExpression"])
+                    clauses, params, exact = _translate(spec["partialFilterExpression"], fields)
+                    if not exact:
+                        raise OperationFailure(f"Unsupported partial filter for index {name}")
+                    # Index definitions cannot take bound parameters
+                    literals = iter(params)
+                    clauses = [re.sub(r"\?", lambda _: _sql_literal(next(literals)), c) for c in clauses]
+                    sql += " WHERE " + " AND ".join(clauses)
+                try:
+                    self.database._execute(sql)
+                except sqlite3.IntegrityError as e:
+                    raise OperationFailure(f"Index build failed for {name}: {e}", DUPLICATE_KEY)
+            self.database._execute(
+                f"INSERT INTO {INDEX_TABLE} (collection, name, spec) VALUES (?, ?, ?)",
+                (self.name, name, json.dumps(spec)),
+            )
+
+    async def drop_index(self, name: str, **kwargs):
+        with self.database._transaction():
+            deleted = self.database._execute(
+                f"DELETE FROM {INDEX_TABLE} WHERE collection = ? AND name = ?", (self.name, name)
+            ).rowcount
+            if not deleted:
+                raise OperationFailure(f"index not found with name [{name}]", INDEX_NOT_FOUND)
+            sql_name = '"%s"' % f"{self.name}__{name}".replace('"', '""')
+            self.database._execute(f"DROP INDEX IF EXISTS {sql_name}")
+        self._indexed = None
+        self._text_weights = None
+
+    async def index_information(self) -> Dict[str, dict]:
+        info = {"_id_": {"v": 2, "key": [("_id", 1)]}}
+        for name, spec in self._index_specs().items():
+            key = [(f, d) for f, d in spec["key"] if d != "text"]
+            entry = {"v": 2}
+            if any(d == "text" for _, d in spec["key"]):
+                key += [("_fts", "text"), ("_ftsx", 1)]
+                entry["weights"] = {
+                    f: spec.get("weights", {}).get(f, 1) for f, d in spec["key"] if d == "text"
+                }
+            entry["key"] = key
+            for option in ("unique", "partialFilterExpression"):
+                if option in spec:
+                    entry[option] = spec[option]
+            info[name] = entry
+        return info
+
+    def watch(self, *args, **kwargs):
+        return _NoChangeStream()
+
+
+def _sql_literal(value) -> str:
+    if value is True:
+        return "1"
+    if value is False:
+        return "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'%s'" % str(value).replace("'", "''")
+
+
+# --- Databases and client --------------------------------------------------
+
+class SQLiteDatabase:
+    def __init__(self, client: "SQLiteClient", name: str, path: str):
+        self.client = client
+        self.name = name
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} "
+            "(collection TEXT NOT NULL, name TEXT NOT NULL, spec TEXT NOT NULL, PRIMARY KEY (collection, name))"
+        )
+        self._collections: Dict[str, SQLiteCollection] = {}
+
+    def _execute(self, sql: str, params: Iterable = ()):
+        with self._lock:
+            return self._conn.execute(sql, tuple(params))
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._conn.in_transaction:
+                yield
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = SQLiteCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> SQLiteCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> SQLiteCollection:
+        return self[name]
+
+    def watch(self, *args, **kwargs):
+        return _NoChangeStream()
+
+    async def command(self, command, **kwargs) -> dict:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"Command {name} is not supported by the SQLite backend")
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteClient:
+    """Stand-in for ``AsyncIOMotorClient``; one SQLite file per database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._databases: Dict[str, SQLiteDatabase] = {}
+
+    def get_database(self, name: str, **kwargs) -> SQLiteDatabase:
+        # Read preferences and other options have no meaning for a local file
+        database = self._databases.get(name)
+        if database is None:
+            if self.path == ":memory:":
+                location = ":memory:"
+            else:
+                os.makedirs(self.path, exist_ok=True)
+                location = os.path.join(self.path, f"{name}.sqlite3")
+            database = self._databases[name] = SQLiteDatabase(self, name, location)
+        return database
+
+    __getitem__ = get_database
+
+    def __getattr__(self, name: str) -> SQLiteDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_database(name)
+
+    def close(self):
+        for database in self._databases.values():
+            database.close()
+        self._databases.clear()
@@ -0,0 +1,146 @@
+"""Materialized per-user counters for ``/api/stats``.
+
+Write paths keep one ``user_stats`` document per user up to date with ``$inc``
+and ``$set`` updates, so reading stats is a single indexed point read.  Catalog
+totals come from the in-process catalog.  ``reconcile_user`` rebuilds a user's
+document from the source collections.  It runs on the first read of a document
+that has never been reconciled (which covers data written before the counters
+existed) and periodically for every user, to repair drift such as a crash
+between a write and its counter update.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+STATS_RECONCILE_INTERVAL = float(os.environ.get("STATS_RECONCILE_INTERVAL", "86400"))
+
+# Counter values of a user with no data; $inc upserts leave unset fields out
+COUNTER_DEFAULTS = {"journal_entries": 0, "challenge_progress": 0, "active_challenge_id": None}
+COUNTER_FIELDS = tuple(COUNTER_DEFAULTS)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def bump(db, user_id: str, **increments):
+    await db.user_stats.update_one(
+        {"user_id": user_id},
+        {"$inc": increments, "$set": {"updated_at": _now()}},
+        upsert=True,
+    )
+
+
+def journal_added_op(user_id: str, count: int = 1) -> UpdateOne:
+    return UpdateOne(
+        {"user_id": user_id},
+        {"$inc": {"journal_entries": count}, "$set": {"updated_at": _now()}},
+        upsert=True,
+    )
+
+
+async def journal_added(db, user_id: str, count: int = 1):
+    await db.user_stats.bulk_write([journal_added_op(user_id, count)])
+
+
+async def journal_removed(db, user_id: str, count: int = 1):
+    await bump(db, user_id, journal_entries=-count)
+
+
+async def challenge_started(db, user_id: str, challenge_id: str):
+    await db.user_stats.update_one(
+        {"user_id": user_id},
+        {
+            "$set": {"active_challenge_id": challenge_id, "challenge_progress": 0, "updated_at": _now()},
+            "$inc": {"challenges_created": 1},
+        },
+        upsert=True,
+    )
+
+
+def challenge_day_completed_op(user_id: str, challenge_id: str) -> UpdateOne:
+    return UpdateOne(
+        {"user_id": user_id, "active_challenge_id": challenge_id},
+        {"$inc": {"challenge_progress": 1, "days_completed": 1}, "$set": {"updated_at": _now()}},
+    )
+
+
+async def challenge_day_completed(db, user_id: str, challenge_id: str):
+    await db.user_stats.bulk_write([challenge_day_completed_op(user_id, challenge_id)])
+
+
+async def challenge_removed(db, user_id: str, challenge_id: str):
+    await db.user_stats.update_one(
+        {"user_id": user_id, "active_challenge_id": challenge_id},
+        {"$set": {"active_challenge_id": None, "challenge_progress": 0, "updated_at": _now()}},
+    )
+
+
+async def discard(db, *user_ids: str):
+    """Drop counters after data moved between users; the next read rebuilds them."""
+    await db.user_stats.delete_many({"user_id": {"$in": list(user_ids)}})
+
+
+async def reconcile_user(db, user_id: str) -> dict:
+    """Recompute a user's counters from the source collections."""
+    journal_entries, active = await asyncio.gather(
+        db.journal_entries.count_documents({"user_id": user_id}),
+        db.challenges.find_one(
+            {"user_id": user_id, "is_active": True}, {"_id": 0, "id": 1, "completed_days": 1}
+        ),
+    )
+    counters = {
+        "journal_entries": journal_entries,
+        "active_challenge_id": active["id"] if active else None,
+        "challenge_progress": len(active.get("completed_days", [])) if active else 0,
+    }
+    before = await db.user_stats.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": {**counters, "updated_at": _now(), "reconciled_at": _now()}},
+        upsert=True,
+        projection={"_id": 0},
+    )
+    # Only a document that was counted in full before can have drifted
+    if before and "reconciled_at" in before:
+        previous = {f: before.get(f, COUNTER_DEFAULTS[f]) for f in COUNTER_FIELDS}
+        if previous != counters:
+            logger.warning("Stats drift for user %s: %s -> %s", user_id, previous, counters)
+    return counters
+
+
+async def get_user_stats(db, user_id: str) -> dict:
+    doc: Optional[dict] = await db.user_stats.find_one(
+        {"user_id": user_id}, {"_id": 0, "reconciled_at": 1, **{f: 1 for f in COUNTER_FIELDS}}
+    )
+    # A document first created by an $inc upsert has never been counted in full
+    if doc is None or "reconciled_at" not in doc:
+        doc = await reconcile_user(db, user_id)
+    return doc
+
+
+async def reconcile_all(db) -> int:
+    users = set(await db.user_stats.distinct("user_id"))
+    users.update(await db.journal_entries.distinct("user_id"))
+    users.update(await db.challenges.distinct("user_id"))
+    for user_id in users:
+        await reconcile_user(db, user_id)
+    return len(users)
+
+
+async def reconcile_periodically(db, interval: float = STATS_RECONCILE_INTERVAL):
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            count = await reconcile_all(db)
+            logger.info("Reconciled stats for %d users", count)
+        except PyMongoError:
+            logger.exception("Stats reconciliation failed")
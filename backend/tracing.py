@@ -0,0 +1,328 @@
+"""Opt-in request tracing, slow-query logging and a sampling profiler.
+
+With ``TRACING=1`` every API request gets a ``Trace`` with spans for:
+- request parsing and dependencies
+- the handler itself
+- response validation and serialization
+- each MongoDB command issued, with the shape of its filter (values replaced
+  by ``"?"``)
+
+The most recent ``TRACE_BUFFER`` traces are kept in memory and served by
+``/api/diagnostics/traces``.  Commands slower than ``TRACE_SLOW_MS`` are
+logged, and for reads, updates and deletes the server is asked to explain the
+query; the winning plan is logged once per query shape every
+``EXPLAIN_INTERVAL`` seconds.
+
+``profile_loop`` samples the event loop thread's Python stack for a few
+seconds and returns the samples in the collapsed-stack format that
+flamegraph.pl, speedscope and similar tools read.
+
+Everything stays in process; there is no collector to run.  Command spans and
+slow-query logs need the MongoDB backend, since they come from pymongo's
+command monitoring.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+TRACING = os.environ.get("TRACING", "0") in ("1", "true", "True")
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "100"))
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", "200"))
+EXPLAIN_INTERVAL = 300
+MAX_PROFILE_SECONDS = 60
+EXPLAINABLE = {
+    "find": "filter",
+    "aggregate": "pipeline",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+
+def query_shape(value):
+    """The query with every literal replaced by ``"?"``."""
+    if isinstance(value, dict):
+        return {key: query_shape(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in lists and pipelines: keep the structure, not the length
+        shapes = [query_shape(v) for v in value]
+        if shapes and all(s == "?" for s in shapes):
+            return ["?"]
+        return shapes
+    return "?"
+
+
+def command_filter(name: str, command: dict):
+    field = EXPLAINABLE.get(name)
+    if field is None:
+        return None
+    value = command.get(field)
+    if name in ("update", "delete"):
+        return [statement.get("q") for statement in value or ()]
+    return value
+
+
+class Trace:
+    def __init__(self, method: str, route: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.route = route
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.handler_end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def offset_ms(self, at: float) -> float:
+        return round((at - self.start) * 1000, 3)
+
+    def add(self, name: str, start: float, end: float, **attrs):
+        span = {"name": name, "start_ms": self.offset_ms(start), "duration_ms": round((end - start) * 1000, 3)}
+        if attrs:
+            span["attrs"] = attrs
+        # Command spans arrive from Motor's executor threads
+        with self._lock:
+            self.spans.append(span)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "db_ms": round(sum(s["duration_ms"] for s in spans if s["name"].startswith("mongo ")), 3),
+            "spans": spans,
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+recent: Deque[Trace] = deque(maxlen=TRACE_BUFFER)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def recent_traces(limit: int = 50, min_ms: float = 0, route: Optional[str] = None) -> List[dict]:
+    traces = []
+    for trace in reversed(recent):
+        if trace.duration_ms < min_ms or (route and trace.route != route):
+            continue
+        traces.append(trace.as_dict())
+        if len(traces) >= limit:
+            break
+    return traces
+
+
+def _traced_call(call):
+    async def handler(**values):
+        trace = _current.get()
+        started = time.perf_counter()
+        if trace is not None:
+            trace.add("dependencies", trace.start, started)
+        try:
+            return await call(**values)
+        finally:
+            if trace is not None:
+                trace.handler_end = time.perf_counter()
+                trace.add("handler", started, trace.handler_end)
+
+    return handler
+
+
+class TracedRoute(APIRoute):
+    """API route that records a ``Trace`` per request when ``TRACING`` is on."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The request handler looks up dependant.call per request, so wrapping
+        # it here times the endpoint alone, without parsing or serialization
+        if TRACING and asyncio.iscoroutinefunction(self.dependant.call):
+            self.dependant.call = _traced_call(self.dependant.call)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not TRACING:
+            return handler
+        route = self.path
+
+        async def traced_handler(request):
+            trace = Trace(request.method, route)
+            token = _current.set(trace)
+            try:
+                response = await handler(request)
+                trace.status = response.status_code
+                return response
+            finally:
+                end = time.perf_counter()
+                if trace.handler_end is not None:
+                    trace.add("serialize", trace.handler_end, end)
+                trace.duration_ms = trace.offset_ms(end)
+                _current.reset(token)
+                recent.append(trace)
+
+        return traced_handler
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Adds command spans to the current trace and logs slow commands."""
+
+    def __init__(self, db=None, slow_ms: float = TRACE_SLOW_MS):
+        self.db = db
+        self.slow_ms = slow_ms
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[tuple, tuple] = {}
+        self._explained: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def bind(self, db, loop: asyncio.AbstractEventLoop):
+        """Database and loop used to run explains for slow commands."""
+        self.db = db
+        self.loop = loop
+
+    def started(self, event):
+        name = event.command_name
+        command = event.command
+        collection = command.get(name) if name != "getMore" else command.get("collection")
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (
+                time.perf_counter(), collection if isinstance(collection, str) else "", command, _current.get()
+            )
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        started, collection, command, trace = pending
+        name = event.command_name
+        query = command_filter(name, command)
+        shape = query_shape(query) if query is not None else None
+        duration_ms = event.duration_micros / 1000
+        if trace is not None:
+            attrs = {"collection": collection}
+            if shape is not None:
+                attrs["filter"] = shape
+            if failed:
+                attrs["failed"] = True
+            trace.add(f"mongo {name}", started, started + duration_ms / 1000, **attrs)
+        if duration_ms >= self.slow_ms and not failed:
+            shape_key = json.dumps([collection, name, shape], sort_keys=True, default=str)
+            logger.warning(
+                "Slow MongoDB %s on %s took %.1f ms; filter %s", name, collection, duration_ms, shape_key
+            )
+            self._maybe_explain(name, command, shape_key)
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def _maybe_explain(self, name: str, command: dict, shape_key: str):
+        if name not in EXPLAINABLE or self.db is None or self.loop is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(shape_key, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+                return
+            self._explained[shape_key] = now
+        # Session, cluster time and read preference belong to the original request
+        explained = {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber")}
+        self.loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self._explain(explained, shape_key))
+        )
+
+    async def _explain(self, command: dict, shape_key: str):
+        try:
+            result = await self.db.command({"explain": command, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.warning("Could not explain slow query %s: %s", shape_key, e)
+            return
+        planner = result.get("queryPlanner") or (result.get("stages") or [{}])[0].get("$cursor", {}).get(
+            "queryPlanner", {}
+        )
+        logger.warning("Plan for slow query %s: %s", shape_key, plan_summary(planner.get("winningPlan", {})))
+
+
+def plan_summary(plan: dict) -> str:
+    """``LIMIT <- FETCH <- IXSCAN user_id_created_at_id`` for a winning plan."""
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f" {plan['indexName']}"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages) or "unknown"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+_profile_lock = threading.Lock()
+
+
+async def profile_loop(seconds: float, interval: float = 0.005) -> str:
+    """Sample the event loop thread for ``seconds``; returns collapsed stacks.
+
+    Each output line is ``frame;frame;... count``, root first.  Sampling runs
+    in a separate thread, so it sees whatever the loop is executing,
+    including code that blocks it.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    loop_thread = threading.get_ident()
+    samples: Counter = Counter()
+    done = threading.Event()
+
+    def sample():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not done.is_set():
+            frame = sys._current_frames().get(loop_thread)
+            if frame is not None:
+                samples[_collapse(frame)] += 1
+            time.sleep(interval)
+
+    try:
+        sampler = threading.Thread(target=sample, name="loop-profiler", daemon=True)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            done.set()
+            await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+    finally:
+        _profile_lock.release()
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
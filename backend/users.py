@@ -0,0 +1,162 @@
+"""Per-user partitioning of journal, challenge and progress data.
+
+Every request is resolved to a user id by the ``current_user`` dependency and
+every user-owned document carries a ``user_id`` that leads its indexes, so
+queries only touch one user's partition.  When ``AUTH_JWT_SECRET`` is set the
+id is the ``sub`` claim of a bearer token; otherwise clients identify
+themselves with an ``X-User-Id`` header, and requests without one share the
+``default`` partition (which is also where pre-tenancy data is migrated).
+``claim_default`` moves that partition into a user's own, so an existing
+install's journal and challenge follow its first browser to get an id.
+
+Admin endpoints (catalog reload, cohort onboarding, pool and index
+diagnostics, traces and the profiler) depend on ``require_admin``: the request
+must carry ``ADMIN_TOKEN`` as a bearer token, or, with JWT auth, a token whose
+``role`` claim is ``admin``.  With neither configured they refuse every
+request.
+"""
+import hmac
+import logging
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import jwt
+from fastapi import Header, HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_ID = "default"
+USER_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+AUTH_JWT_SECRET = os.environ.get("AUTH_JWT_SECRET")
+AUTH_JWT_ALGORITHM = os.environ.get("AUTH_JWT_ALGORITHM", "HS256")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+ADMIN_ROLE = "admin"
+DUPLICATE_KEY = 11000
+
+USER_COLLECTIONS = ("journal_entries", "challenges", "challenge_logs")
+MIGRATION_ID = "migration:user_id"
+
+
+def _bearer_token(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    return token
+
+
+def _claims(token: str) -> dict:
+    try:
+        return jwt.decode(token, AUTH_JWT_SECRET, algorithms=[AUTH_JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def _user_from_token(authorization: Optional[str]) -> str:
+    claims = _claims(_bearer_token(authorization))
+    user_id = str(claims.get("sub") or "")
+    if not USER_ID_RE.match(user_id):
+        raise HTTPException(status_code=401, detail="Invalid token subject")
+    return user_id
+
+
+async def current_user(
+    authorization: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+) -> str:
+    if AUTH_JWT_SECRET:
+        return _user_from_token(authorization)
+    if x_user_id is None:
+        return DEFAULT_USER_ID
+    if not USER_ID_RE.match(x_user_id):
+        raise HTTPException(status_code=400, detail="Invalid X-User-Id header")
+    return x_user_id
+
+
+async def optional_user(
+    authorization: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+) -> Optional[str]:
+    """Like ``current_user`` but ``None`` for requests that carry no identity."""
+    if not authorization and x_user_id is None:
+        return None
+    return await current_user(authorization, x_user_id)
+
+
+async def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    if not ADMIN_TOKEN and not AUTH_JWT_SECRET:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    token = _bearer_token(authorization)
+    if ADMIN_TOKEN and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return
+    if AUTH_JWT_SECRET and _claims(token).get("role") == ADMIN_ROLE:
+        return
+    raise HTTPException(status_code=403, detail="Admin credentials required")
+
+
+async def migrate_user_ids(db):
+    """Assign documents written before tenancy to the default partition (runs once)."""
+    if await db.meta.find_one({"_id": MIGRATION_ID}, {"_id": 1}):
+        return
+    for collection in USER_COLLECTIONS:
+        result = await db[collection].update_many(
+            {"user_id": {"$exists": False}}, {"$set": {"user_id": DEFAULT_USER_ID}}
+        )
+        if result.modified_count:
+            logger.info("Assigned %d %s to the default user", result.modified_count, collection)
+    await db.meta.update_one({"_id": MIGRATION_ID}, {"$set": {"done": True}}, upsert=True)
+
+
+async def _move_documents(collection, user_id: str) -> Tuple[int, int]:
+    """Move ``collection``'s default documents to ``user_id``; returns (moved, skipped)."""
+    ids = [doc["_id"] async for doc in collection.find({"user_id": DEFAULT_USER_ID}, {"_id": 1})]
+    if not ids:
+        return 0, 0
+    ops = [UpdateOne({"_id": _id, "user_id": DEFAULT_USER_ID}, {"$set": {"user_id": user_id}}) for _id in ids]
+    try:
+        result = await collection.bulk_write(ops, ordered=False)
+        return result.modified_count, 0
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        return e.details.get("nModified", 0), len(errors)
+
+
+async def claim_default(db, user_id: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Move the ``default`` partition into ``user_id``'s; returns (moved, skipped) per collection.
+
+    A document that would collide with one of the user's own (a journal entry
+    whose id the user already has, e.g. from importing the default
+    partition's export) stays in the default partition and is counted as
+    skipped.
+    """
+    if user_id == DEFAULT_USER_ID:
+        return {}, {}
+    # One active challenge per user: the claimant's own stays active
+    if await db.challenges.find_one({"user_id": user_id, "is_active": True}, {"_id": 1}):
+        await db.challenges.update_many(
+            {"user_id": DEFAULT_USER_ID, "is_active": True}, {"$set": {"is_active": False}}
+        )
+    moved, skipped = {}, {}
+    for collection in USER_COLLECTIONS:
+        moved[collection], skipped[collection] = await _move_documents(db[collection], user_id)
+    progress = await db.user_progress.find_one({"user_id": DEFAULT_USER_ID}, {"_id": 0})
+    if progress:
+        await db.user_progress.update_one(
+            {"user_id": user_id},
+            {"$addToSet": {
+                "read_models": {"$each": progress.get("read_models", [])},
+                "bookmarks": {"$each": progress.get("bookmarks", [])},
+            }},
+            upsert=True,
+        )
+        await db.user_progress.delete_one({"user_id": DEFAULT_USER_ID})
+    moved["user_progress"] = int(progress is not None)
+    if any(moved.values()):
+        logger.info("User %s claimed the default partition: %s", user_id, moved)
+    if any(skipped.values()):
+        logger.info("User %s already had documents of the default partition: %s", user_id, skipped)
+    return moved, skipped
@@ -0,0 +1,143 @@
+"""Optional write-behind buffering for high-volume inserts.
+
+With ``WRITE_BEHIND=1`` journal inserts, challenge-log upserts and their stats
+counter updates are not awaited by the request.  They are put on an in-process
+queue as pymongo write operations, and a single writer task drains the queue
+into one unordered ``bulk_write`` per collection whenever ``batch_size``
+operations are waiting or ``flush_interval`` has passed since the first one.
+
+The client is acknowledged once its operations are queued.  Writes that are
+still queued when the process dies are lost; a normal shutdown drains the
+queue before the database client closes.  The queue is bounded: when it is
+full, requests wait for room (backpressure) instead of growing memory.  Reads
+may lag the acknowledged writes by up to one flush interval.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "0") in ("1", "true", "True")
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_MS = float(os.environ.get("WRITE_BEHIND_FLUSH_MS", "50"))
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_ATTEMPTS = 3
+
+
+class WriteBuffer:
+    def __init__(
+        self,
+        db,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_MS / 1000,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.counters = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "backpressure_waits": 0,
+            "max_depth": 0,
+        }
+        self.last_batch_ms = 0.0
+        self._task = None
+
+    def start(self) -> asyncio.Task:
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def put(self, collection: str, *ops):
+        for op in ops:
+            if self.queue.full():
+                self.counters["backpressure_waits"] += 1
+            await self.queue.put((collection, op))
+            self.counters["enqueued"] += 1
+        self.counters["max_depth"] = max(self.counters["max_depth"], self.queue.qsize())
+
+    async def _next_batch(self) -> List[Tuple[str, object]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            except Exception:
+                self.counters["failed"] += len(batch)
+                logger.exception("Buffered write batch failed")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch: List[Tuple[str, object]]):
+        started = time.perf_counter()
+        by_collection: Dict[str, list] = defaultdict(list)
+        for collection, op in batch:
+            by_collection[collection].append(op)
+        await asyncio.gather(*(self._write_collection(c, ops) for c, ops in by_collection.items()))
+        self.counters["batches"] += 1
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+    async def _write_collection(self, collection: str, ops: list):
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                await self.db[collection].bulk_write(ops, ordered=False)
+                self.counters["written"] += len(ops)
+                return
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                self.counters["written"] += len(ops) - len(errors)
+                self.counters["failed"] += len(errors)
+                logger.error("%d buffered writes to %s failed: %s", len(errors), collection, errors[:3])
+                return
+            except ConnectionFailure:
+                if attempt < WRITE_ATTEMPTS - 1:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+            except PyMongoError:
+                break
+        self.counters["failed"] += len(ops)
+        logger.error("Dropped %d buffered writes to %s", len(ops), collection)
+
+    async def close(self):
+        """Write out everything queued, then stop the writer."""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": True,
+            "depth": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            **self.counters,
+        }
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""Latency and throughput benchmarks for the /api routes.
+
+The app runs in-process, with its startup and shutdown hooks, and is driven
+through httpx's ASGI transport, so no server or network is involved.  By
+default it uses the embedded SQLite backend in memory (``--storage sqlite``),
+which makes runs hermetic and repeatable.  ``--storage mongo`` runs against
+``MONGO_URL`` instead and needs an empty database.
+
+Each scenario first sends a few requests one at a time under ``tracemalloc``
+to measure the peak memory allocated per request.  It then sends the rest
+from ``--concurrency`` workers and reports p50/p95/p99 latency and requests
+per second.
+
+    python backend_bench.py                          # run, print a table
+    python backend_bench.py --save bench.json        # also write the results
+    python backend_bench.py --compare bench.json     # exit 1 on regressions
+    python backend_bench.py -k search -n 2000        # only matching scenarios
+
+Compared against a baseline, a scenario regresses when p95 latency or
+allocations grow, or requests/sec drop, by more than ``--tolerance``.
+Latency numbers are only comparable between runs on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+Request = Tuple[str, str, dict]  # method, path, httpx keyword arguments
+
+SEARCH_TERMS = ["bias", "thinking", "feedback loop", "first principles", "decision", "systems"]
+BENCH_USERS = 50
+
+
+@dataclass
+class Scenario:
+    name: str
+    routes: Tuple[str, ...]  # "METHOD /api/path" templates this scenario covers
+    request: Callable[[int], Request]
+    setup: Optional[Callable[["Bench"], Awaitable[None]]] = None
+    expect: Tuple[int, ...] = (200,)
+    max_requests: Optional[int] = None  # for scenarios that run out of valid requests
+
+
+def user(i: int) -> dict:
+    return {"X-User-Id": f"bench-{i % BENCH_USERS}"}
+
+
+def admin() -> dict:
+    return {"Authorization": f"Bearer {os.environ['ADMIN_TOKEN']}"}
+
+
+def typed_prefix(i: int) -> str:
+    """The query after the i-th keystroke, cycling through SEARCH_TERMS."""
+    lengths = [len(term) for term in SEARCH_TERMS]
+    i %= sum(lengths)
+    for term, length in zip(SEARCH_TERMS, lengths):
+        if i < length:
+            return term[:i + 1]
+        i -= length
+    return SEARCH_TERMS[0]
+
+
+class Bench:
+    def __init__(self, client, app_module):
+        self.client = client
+        self.server = app_module
+        self.model_ids: List[str] = []
+        self.model_paths: List[str] = []
+        self.journal_ids: Dict[str, List[str]] = {}
+        self.challenge_ids: List[str] = []
+
+    async def send(self, request: Request):
+        method, path, kwargs = request
+        return await self.client.request(method, path, **kwargs)
+
+    async def prepare(self):
+        """Shared fixtures: model ids, and journal entries for every bench user."""
+        models = (await self.client.get("/api/models", params={"view": "summary"})).json()
+        self.model_ids = [m["id"] for m in models]
+        self.model_paths = [f"{m['section_slug']}/{m['model_index']}" for m in models]
+        for u in range(BENCH_USERS):
+            rows = "\n".join(
+                json.dumps({
+                    "content": f"Entry {n} about {SEARCH_TERMS[n % len(SEARCH_TERMS)]} and daily focus",
+                    "model_title": models[n % len(models)]["title"],
+                    "section_slug": models[n % len(models)]["section_slug"],
+                })
+                for n in range(40)
+            )
+            await self.client.post("/api/journal/bulk", content=rows.encode(), headers=user(u))
+
+    async def start_challenges(self, count: int = BENCH_USERS):
+        body = {"challenges": [
+            {"user_id": f"bench-{u}", "model_ids": self.model_ids[u % 20:u % 20 + 5]} for u in range(count)
+        ]}
+        created = (await self.client.post("/api/challenge/batch", json=body, headers=admin())).json()["created"]
+        self.challenge_ids = [c["challenge_id"] for c in sorted(created, key=lambda c: int(c["user_id"][6:]))]
+
+    async def create_entries(self, count: int):
+        for i in range(count):
+            entry = (await self.client.post("/api/journal", json={"content": f"scratch {i}"}, headers=user(i))).json()
+            self.journal_ids.setdefault("scratch", []).append(entry["id"])
+
+
+def scenarios(bench: Bench) -> List[Scenario]:
+    def model(i: int) -> str:
+        return bench.model_paths[i % len(bench.model_paths)]
+
+    def model_id(i: int) -> str:
+        return bench.model_ids[i % len(bench.model_ids)]
+
+    def scratch_id(i: int) -> str:
+        return bench.journal_ids["scratch"][i]
+
+    return [
+        Scenario("root", ("GET /api/",), lambda i: ("GET", "/api/", {})),
+        Scenario("sections", ("GET /api/sections",), lambda i: ("GET", "/api/sections", {})),
+        Scenario("models_list", ("GET /api/models",), lambda i: ("GET", "/api/models", {"params": {"limit": 300}})),
+        Scenario(
+            "models_summary", ("GET /api/models",),
+            lambda i: ("GET", "/api/models", {"params": {"view": "summary"}}),
+        ),
+        # SearchPage.js sends ?search=<query>&limit=300 after each pause in typing
+        Scenario(
+            "search_as_you_type", ("GET /api/models",),
+            lambda i: ("GET", "/api/models", {"params": {"search": typed_prefix(i), "limit": 300}}),
+        ),
+        Scenario(
+            "model_detail", ("GET /api/models/{section_slug}/{model_index}",),
+            lambda i: ("GET", f"/api/models/{model(i)}", {}),
+        ),
+        Scenario(
+            "related", ("GET /api/models/{section_slug}/{model_index}/related",),
+            lambda i: ("GET", f"/api/models/{model(i)}/related", {}),
+        ),
+        Scenario("graph", ("GET /api/models/graph",), lambda i: ("GET", "/api/models/graph", {})),
+        Scenario("introduction", ("GET /api/introduction",), lambda i: ("GET", "/api/introduction", {})),
+        Scenario("conclusion", ("GET /api/conclusion",), lambda i: ("GET", "/api/conclusion", {})),
+        Scenario("daily_model", ("GET /api/daily-model",), lambda i: ("GET", "/api/daily-model", {})),
+        Scenario(
+            "daily_schedule", ("GET /api/daily-model/schedule",),
+            lambda i: ("GET", "/api/daily-model/schedule", {"params": {"days": 30}}),
+        ),
+        Scenario("bootstrap", ("GET /api/bootstrap",), lambda i: ("GET", "/api/bootstrap", {"headers": user(i)})),
+        Scenario("stats", ("GET /api/stats",), lambda i: ("GET", "/api/stats", {"headers": user(i)})),
+        Scenario(
+            "journal_list", ("GET /api/journal",),
+            lambda i: ("GET", "/api/journal", {"params": {"limit": 20}, "headers": user(i)}),
+        ),
+        Scenario(
+            "journal_search", ("GET /api/journal/search",),
+            lambda i: ("GET", "/api/journal/search", {
+                "params": {"q": SEARCH_TERMS[i % len(SEARCH_TERMS)]}, "headers": user(i),
+            }),
+        ),
+        Scenario(
+            "journal_export", ("GET /api/journal/export",),
+            lambda i: ("GET", "/api/journal/export", {"headers": user(i)}),
+        ),
+        Scenario(
+            "journal_create", ("POST /api/journal",),
+            lambda i: ("POST", "/api/journal", {"json": {"content": f"Bench entry {i}"}, "headers": user(i)}),
+            expect=(201,),
+        ),
+        Scenario(
+            "journal_bulk", ("POST /api/journal/bulk",),
+            lambda i: ("POST", "/api/journal/bulk", {
+                "content": "\n".join(json.dumps({"content": f"bulk {i}.{n}"}) for n in range(20)).encode(),
+                "headers": user(i),
+            }),
+        ),
+        Scenario(
+            "journal_delete", ("DELETE /api/journal/{entry_id}",),
+            lambda i: ("DELETE", f"/api/journal/{scratch_id(i)}", {"headers": user(i)}),
+            setup=lambda b: b.create_entries(500),
+            max_requests=500,
+        ),
+        Scenario(
+            "journal_bulk_delete", ("POST /api/journal/bulk-delete",),
+            lambda i: ("POST", "/api/journal/bulk-delete", {
+                "json": {"ids": [f"missing-{i}"]}, "headers": user(i),
+            }),
+        ),
+        Scenario(
+            "challenge_start", ("POST /api/challenge",),
+            lambda i: ("POST", "/api/challenge", {
+                "json": {"model_ids": [model_id(i + k) for k in range(5)]}, "headers": {"X-User-Id": f"starter-{i}"},
+            }),
+            expect=(201,),
+        ),
+        Scenario(
+            "challenge_batch", ("POST /api/challenge/batch",),
+            lambda i: ("POST", "/api/challenge/batch", {"json": {"challenges": [
+                {"user_id": f"cohort-{i}-{u}", "model_ids": [model_id(u + k) for k in range(5)]} for u in range(20)
+            ]}, "headers": admin()}),
+            expect=(201,),
+        ),
+        # Every bench user completes successive days at once, as after a reminder push
+        Scenario(
+            "challenge_completion_burst", ("POST /api/challenge/complete-day",),
+            lambda i: ("POST", "/api/challenge/complete-day", {
+                "json": {
+                    "day": i // BENCH_USERS + 1,
+                    "reflection": f"Day {i // BENCH_USERS + 1} reflection",
+                    "challenge_id": bench.challenge_ids[i % BENCH_USERS],
+                },
+                "headers": user(i),
+            }),
+            setup=lambda b: b.start_challenges(),
+            max_requests=30 * BENCH_USERS,
+        ),
+        Scenario(
+            "challenge_active", ("GET /api/challenge/active",),
+            lambda i: ("GET", "/api/challenge/active", {"headers": user(i)}),
+        ),
+        Scenario(
+            "challenge_history", ("GET /api/challenge/{challenge_id}/history",),
+            lambda i: ("GET", f"/api/challenge/{bench.challenge_ids[i % BENCH_USERS]}/history", {"headers": user(i)}),
+        ),
+        Scenario(
+            "challenge_logs", ("GET /api/challenge/logs",),
+            lambda i: ("GET", "/api/challenge/logs", {
+                "params": {"challenge_id": bench.challenge_ids[i % BENCH_USERS]}, "headers": user(i),
+            }),
+        ),
+        Scenario(
+            "challenge_delete", ("DELETE /api/challenge/{challenge_id}",),
+            lambda i: ("DELETE", f"/api/challenge/missing-{i}", {"headers": user(i)}),
+        ),
+        Scenario("progress", ("GET /api/progress",), lambda i: ("GET", "/api/progress", {"headers": user(i)})),
+        Scenario(
+            "progress_read", ("PUT /api/progress/read/{model_id}",),
+            lambda i: ("PUT", f"/api/progress/read/{model_id(i)}", {"headers": user(i)}),
+        ),
+        Scenario(
+            "bookmark_add", ("PUT /api/progress/bookmarks/{model_id}",),
+            lambda i: ("PUT", f"/api/progress/bookmarks/{model_id(i)}", {"headers": user(i)}),
+        ),
+        Scenario(
+            "bookmark_remove", ("DELETE /api/progress/bookmarks/{model_id}",),
+            lambda i: ("DELETE", f"/api/progress/bookmarks/{model_id(i)}", {"headers": user(i)}),
+        ),
+        Scenario(
+            "progress_sync", ("POST /api/progress/sync",),
+            lambda i: ("POST", "/api/progress/sync", {
+                "json": {"read_models": [model_id(i), model_id(i + 1)], "bookmarks": [model_id(i + 2)]},
+                "headers": user(i),
+            }),
+        ),
+        Scenario(
+            "users_claim_default", ("POST /api/users/claim-default",),
+            lambda i: ("POST", "/api/users/claim-default", {"headers": user(i)}),
+        ),
+        Scenario(
+            "stats_reconcile", ("POST /api/stats/reconcile",),
+            lambda i: ("POST", "/api/stats/reconcile", {"headers": user(i)}),
+        ),
+        Scenario(
+            "catalog_reload", ("POST /api/catalog/reload",),
+            lambda i: ("POST", "/api/catalog/reload", {"headers": admin()}),
+            max_requests=20,
+        ),
+        Scenario(
+            "diagnostics_pool", ("GET /api/diagnostics/pool",),
+            lambda i: ("GET", "/api/diagnostics/pool", {"headers": admin()}),
+        ),
+        Scenario(
+            "diagnostics_write_behind", ("GET /api/diagnostics/write-behind",),
+            lambda i: ("GET", "/api/diagnostics/write-behind", {}),
+        ),
+        Scenario(
+            "diagnostics_caches", ("GET /api/diagnostics/caches",),
+            lambda i: ("GET", "/api/diagnostics/caches", {}),
+        ),
+        Scenario(
+            "diagnostics_indexes", ("GET /api/diagnostics/indexes",),
+            lambda i: ("GET", "/api/diagnostics/indexes", {"headers": admin()}),
+            max_requests=200,
+        ),
+        # 404 unless the server runs with TRACING=1
+        Scenario(
+            "diagnostics_traces", ("GET /api/diagnostics/traces",),
+            lambda i: ("GET", "/api/diagnostics/traces", {"params": {"limit": 20}, "headers": admin()}),
+            expect=(200, 404),
+        ),
+        Scenario(
+            "diagnostics_profile", ("POST /api/diagnostics/profile",),
+            lambda i: ("POST", "/api/diagnostics/profile", {"params": {"seconds": 0.05}, "headers": admin()}),
+            expect=(200, 404, 409),
+            max_requests=20,
+        ),
+    ]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+async def measure_allocations(bench: Bench, scenario: Scenario, count: int) -> float:
+    """Mean peak traced memory per request, in KiB, for requests 0..count-1."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(count):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            response = await bench.send(scenario.request(i))
+            await response.aread()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024 if peaks else 0.0
+
+
+async def run_scenario(bench: Bench, scenario: Scenario, requests: int, concurrency: int, alloc_samples: int) -> dict:
+    if scenario.setup is not None:
+        await scenario.setup(bench)
+    total = min(requests, scenario.max_requests or requests)
+    alloc_samples = min(alloc_samples, total // 10)
+    alloc_kib = await measure_allocations(bench, scenario, alloc_samples)
+
+    latencies: List[float] = []
+    errors: Dict[int, int] = {}
+    next_index = alloc_samples
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await bench.send(scenario.request(i))
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in scenario.expect:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "alloc_kib": round(alloc_kib, 1),
+        "errors": {str(status): count for status, count in sorted(errors.items())},
+    }
+
+
+def uncovered_routes(app_module, planned: List[Scenario]) -> List[str]:
+    covered = {route for scenario in planned for route in scenario.routes}
+    missing = []
+    for route in app_module.api_router.routes:
+        for method in sorted(route.methods or ()):
+            name = f"{method} {route.path}"
+            if name not in covered:
+                missing.append(name)
+    return missing
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        checks = [
+            ("p95_ms", result["p95_ms"] > before["p95_ms"] * (1 + tolerance)),
+            ("alloc_kib", result["alloc_kib"] > before["alloc_kib"] * (1 + tolerance) and before["alloc_kib"]),
+            ("rps", result["rps"] < before["rps"] * (1 - tolerance)),
+        ]
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append(f"{name}: {metric} {before[metric]} -> {result[metric]}")
+    return regressions
+
+
+def print_table(results: Dict[str, dict], baseline: Optional[Dict[str, dict]]):
+    header = f"{'scenario':<28}{'reqs':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'KiB/req':>10}"
+    if baseline:
+        header += f"{'p95 Δ':>9}{'req/s Δ':>9}"
+    print(header)
+    for name, r in results.items():
+        line = f"{name:<28}{r['requests']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}" \
+               f"{r['rps']:>10.1f}{r['alloc_kib']:>10.1f}"
+        before = (baseline or {}).get(name)
+        if before:
+            line += f"{_change(r['p95_ms'], before['p95_ms']):>9}{_change(r['rps'], before['rps']):>9}"
+        if r["errors"]:
+            line += f"  errors {r['errors']}"
+        print(line)
+
+
+def _change(now: float, before: float) -> str:
+    return f"{(now - before) / before * 100:+.0f}%" if before else "n/a"
+
+
+def load_app(storage: str):
+    if storage == "sqlite":
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ.setdefault("SQLITE_PATH", ":memory:")
+    else:
+        os.environ["STORAGE_BACKEND"] = "mongo"
+    os.environ.setdefault("ADMIN_TOKEN", "bench-admin")
+    sys.path.insert(0, BACKEND_DIR)
+    import server
+
+    # Per-request logging would dominate the timings
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return server
+
+
+async def main(args) -> int:
+    import httpx
+
+    server = load_app(args.storage)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            bench = Bench(client, server)
+            await bench.prepare()
+            await bench.start_challenges()
+            planned = scenarios(bench)
+            missing = uncovered_routes(server, planned)
+            if missing:
+                print("Routes without a scenario:", ", ".join(missing))
+            if args.k:
+                planned = [s for s in planned if args.k in s.name]
+            results = {}
+            for scenario in planned:
+                results[scenario.name] = await run_scenario(
+                    bench, scenario, args.requests, args.concurrency, args.alloc_samples
+                )
+    print_table(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "storage": args.storage,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "scenarios": results,
+            }, f, indent=2)
+        print(f"Saved results to {args.save}")
+    failed = any(r["errors"] for r in results.values())
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("-k", help="only run scenarios whose name contains this")
+    parser.add_argument("--storage", choices=("sqlite", "mongo"), default="sqlite")
+    parser.add_argument("--alloc-samples", type=int, default=20, help="sequential requests traced for allocations")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before a regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -1,4 +1,8 @@
-import { createContext, useContext, useState, useEffect, useCallback } from "react";
+import { createContext, useContext, useState, useEffect, useCallback, useRef } from "react";
+import axios from "axios";
+
+const rawAPI = process.env.REACT_APP_API_URL || "http://127.0.0.1:8000/api";
+const API = rawAPI.endsWith('/') ? rawAPI.slice(0, -1) : rawAPI;
 
 const ProgressContext = createContext();
 
@@ -15,6 +19,21 @@ export function ProgressProvider({ children }) {
     } catch { return []; }
   });
 
+  const bookmarksRef = useRef(bookmarks);
+  bookmarksRef.current = bookmarks;
+
+  // Merge local progress into the server copy once, then adopt the union
+  useEffect(() => {
+    axios.post(`${API}/progress/sync`, {
+      read_models: readModels,
+      bookmarks: bookmarks,
+    }).then(({ data }) => {
+      setReadModels(data.read_models);
+      setBookmarks(data.bookmarks);
+    }).catch(console.error);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
   useEffect(() => {
     localStorage.setItem("apm_read_models", JSON.stringify(readModels));
   }, [readModels]);
@@ -26,6 +45,7 @@ export function ProgressProvider({ children }) {
   const markAsRead = useCallback((modelId) => {
     setReadModels((prev) => {
       if (prev.includes(modelId)) return prev;
+      axios.put(`${API}/progress/read/${modelId}`).catch(console.error);
       return [...prev, modelId];
     });
   }, []);
@@ -33,6 +53,11 @@ export function ProgressProvider({ children }) {
   const isRead = useCallback((modelId) => readModels.includes(modelId), [readModels]);
 
   const toggleBookmark = useCallback((modelId) => {
+    const removing = bookmarksRef.current.includes(modelId);
+    const request = removing
+      ? axios.delete(`${API}/progress/bookmarks/${modelId}`)
+      : axios.put(`${API}/progress/bookmarks/${modelId}`);
+    request.catch(console.error);
     setBookmarks((prev) => {
       if (prev.includes(modelId)) return prev.filter((id) => id !== modelId);
       return [...prev, modelId];
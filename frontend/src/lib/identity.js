@@ -0,0 +1,44 @@
+import axios from "axios";
+
+const USER_ID_KEY = "apm_user_id";
+const CLAIMED_KEY = "apm_default_claimed";
+
+const rawAPI = process.env.REACT_APP_API_URL || "http://127.0.0.1:8000/api";
+const API = rawAPI.endsWith('/') ? rawAPI.slice(0, -1) : rawAPI;
+
+const newUserId = () => {
+  if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+  return `u-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+};
+
+// Anonymous per-browser identity; the backend partitions journal, challenge
+// and progress data by this id.
+export function getUserId() {
+  let id = localStorage.getItem(USER_ID_KEY);
+  if (!id) {
+    id = newUserId();
+    localStorage.setItem(USER_ID_KEY, id);
+  }
+  return id;
+}
+
+// Data written before per-user partitions lives under the shared "default"
+// user. Each browser asks once to take it over (only the first one finds
+// anything), and API calls wait for that so the first page already shows it.
+function claimDefaultData(id) {
+  if (localStorage.getItem(CLAIMED_KEY)) return Promise.resolve();
+  return fetch(`${API}/users/claim-default`, { method: "POST", headers: { "X-User-Id": id } })
+    .then((res) => {
+      if (res.ok) localStorage.setItem(CLAIMED_KEY, "1");
+    })
+    .catch(() => {});
+}
+
+const userId = getUserId();
+const claimed = claimDefaultData(userId);
+
+axios.defaults.headers.common["X-User-Id"] = userId;
+axios.interceptors.request.use(async (config) => {
+  await claimed;
+  return config;
+});
@@ -15,7 +15,7 @@ export default function BookmarksPage() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    axios.get(`${API}/models?limit=300`).then((r) => {
+    axios.get(`${API}/models?limit=300&fields=section_slug,section_name,model_index,title`).then((r) => {
       setAllModels(r.data);
       setLoading(false);
     }).catch(console.error);
@@ -29,7 +29,7 @@ export default function ChallengePage() {
       const [challengeRes, sectionsRes, modelsRes] = await Promise.all([
         axios.get(`${API}/challenge/active`),
         axios.get(`${API}/sections`),
-        axios.get(`${API}/models?limit=300`),
+        axios.get(`${API}/models?limit=300&fields=section_slug,section_name,model_index,title`),
       ]);
       setChallenge(challengeRes.data);
       setSections(sectionsRes.data);
@@ -65,6 +65,7 @@ export default function ChallengePage() {
     try {
       await axios.post(`${API}/challenge/complete-day`, {
         day,
+        challenge_id: challenge.id,
         reflection: reflection.trim() || null,
       });
       setReflection("");
@@ -1,12 +1,13 @@
 import { useState, useEffect } from "react";
 import { useSearchParams } from "react-router-dom";
 import { motion } from "framer-motion";
-import { Trash2, PenLine } from "lucide-react";
+import { Trash2, PenLine, Search } from "lucide-react";
 import axios from "axios";
 
 // Χρησιμοποιούμε process.env και το πρόθεμα REACT_APP_ για Create React App
 const rawAPI = process.env.REACT_APP_API_URL || "http://127.0.0.1:8000/api";
 const API = rawAPI.endsWith('/') ? rawAPI.slice(0, -1) : rawAPI;
+const PAGE_SIZE = 50;
 
 export default function JournalPage() {
   const [searchParams] = useSearchParams();
@@ -15,16 +16,57 @@ export default function JournalPage() {
 
   const [content, setContent] = useState("");
   const [entries, setEntries] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [saving, setSaving] = useState(false);
+  const [query, setQuery] = useState("");
+  const [results, setResults] = useState(null);
+  const [nextOffset, setNextOffset] = useState(null);
 
   useEffect(() => {
     loadEntries();
   }, []);
 
+  useEffect(() => {
+    const q = query.trim();
+    if (!q) {
+      setResults(null);
+      setNextOffset(null);
+      return;
+    }
+    const timer = setTimeout(() => searchEntries(q, 0), 250);
+    return () => clearTimeout(timer);
+  }, [query]);
+
+  const searchEntries = async (q, offset) => {
+    try {
+      const { data } = await axios.get(`${API}/journal/search`, {
+        params: { q, offset, limit: PAGE_SIZE },
+      });
+      setResults((prev) => (offset && prev ? [...prev, ...data.results] : data.results));
+      setNextOffset(data.next_offset);
+    } catch (e) {
+      console.error(e);
+    }
+  };
+
   const loadEntries = async () => {
     try {
-      const { data } = await axios.get(`${API}/journal`);
+      const { data, headers } = await axios.get(`${API}/journal?limit=${PAGE_SIZE}`);
       setEntries(data);
+      setNextCursor(headers["x-next-cursor"] || null);
+    } catch (e) {
+      console.error(e);
+    }
+  };
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const { data, headers } = await axios.get(
+        `${API}/journal?limit=${PAGE_SIZE}&cursor=${encodeURIComponent(nextCursor)}`
+      );
+      setEntries((prev) => [...prev, ...data]);
+      setNextCursor(headers["x-next-cursor"] || null);
     } catch (e) {
       console.error(e);
     }
@@ -50,6 +92,7 @@ export default function JournalPage() {
   const deleteEntry = async (id) => {
     try {
       await axios.delete(`${API}/journal/${id}`);
+      setResults((prev) => prev && prev.filter((r) => r.id !== id));
       await loadEntries();
     } catch (e) {
       console.error(e);
@@ -109,14 +152,29 @@ export default function JournalPage() {
             </div>
           </div>
 
+          {/* Search */}
+          <div className="relative mb-8">
+            <Search size={14} className="absolute left-4 top-1/2 -translate-y-1/2 text-white/30" />
+            <input
+              data-testid="journal-search-input"
+              type="search"
+              value={query}
+              onChange={(e) => setQuery(e.target.value)}
+              placeholder="Search your reflections"
+              className="w-full bg-[#0F0F0F] border border-white/5 rounded-full pl-10 pr-4 py-2.5 text-sm text-white placeholder:text-white/30 focus:outline-none focus:border-[#2563EB]/50"
+            />
+          </div>
+
           {/* Entries */}
-          {entries.length > 0 && (
+          {(results ?? entries).length > 0 && (
             <div>
               <p className="text-[#A1A1AA] font-mono text-xs mb-6">
-                {entries.length} reflection{entries.length !== 1 ? "s" : ""}
+                {results
+                  ? `${results.length}${nextOffset !== null ? "+" : ""} match${results.length !== 1 ? "es" : ""}`
+                  : `${entries.length}${nextCursor ? "+" : ""} reflection${entries.length !== 1 ? "s" : ""}`}
               </p>
               <div className="space-y-4">
-                {entries.map((entry, i) => (
+                {(results ?? entries).map((entry, i) => (
                   <motion.div
                     key={entry.id}
                     initial={{ opacity: 0, y: 8 }}
@@ -130,19 +188,22 @@ export default function JournalPage() {
                         <span className="text-[#A1A1AA] font-mono text-xs">
                           {formatDate(entry.created_at)}
                         </span>
+                        {entry.type === "reflection" && (
+                          <span className="blue-badge">Challenge day {entry.day}</span>
+                        )}
                         {entry.model_title && (
                           <span className="blue-badge">
                             {entry.model_title}
                           </span>
                         )}
                       </div>
-                      <button
+                      {entry.type !== "reflection" && <button
                         data-testid={`delete-entry-${i}`}
                         onClick={() => deleteEntry(entry.id)}
                         className="opacity-0 group-hover:opacity-100 p-1 text-white/20 hover:text-red-400/60 transition-opacity duration-200"
                       >
                         <Trash2 size={14} />
-                      </button>
+                      </button>}
                     </div>
                     <p className="text-[#A1A1AA] text-sm leading-relaxed whitespace-pre-wrap">
                       {entry.content}
@@ -150,6 +211,17 @@ export default function JournalPage() {
                   </motion.div>
                 ))}
               </div>
+              {(results ? nextOffset !== null : nextCursor) && (
+                <div className="flex justify-center mt-8">
+                  <button
+                    data-testid="load-more-journal-btn"
+                    onClick={results ? () => searchEntries(query.trim(), nextOffset) : loadMore}
+                    className="rounded-full px-6 py-2.5 border border-white/10 text-[#A1A1AA] text-sm hover:text-white hover:border-[#2563EB]/50 transition-colors duration-200"
+                  >
+                    {results ? "More matches" : "Load older reflections"}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </motion.div>
@@ -26,10 +26,12 @@ export default function LandingPage() {
   const [copied, setCopied] = useState(false);
 
   useEffect(() => {
-    axios.get(`${API}/sections`).then((r) => setSections(r.data)).catch(console.error);
-    axios.get(`${API}/introduction`).then((r) => setIntro(r.data)).catch(console.error);
-    axios.get(`${API}/daily-model`).then((r) => setDailyModel(r.data)).catch(console.error);
-    axios.get(`${API}/stats`).then((r) => setStats(r.data)).catch(console.error);
+    axios.get(`${API}/bootstrap?fields=sections,introduction,daily_model,stats`).then(({ data }) => {
+      setSections(data.sections);
+      setIntro(data.introduction);
+      setDailyModel(data.daily_model);
+      setStats(data.stats);
+    }).catch(console.error);
   }, []);
 
   const copyPrompt = () => {
@@ -58,6 +58,7 @@ export default function MindMapPage() {
   const navigate = useNavigate();
   const [sections, setSections] = useState([]);
   const [models, setModels] = useState([]);
+  const [graphEdges, setGraphEdges] = useState([]);
   const [nodes, setNodes, onNodesChange] = useNodesState([]);
   const [edges, setEdges, onEdgesChange] = useEdgesState([]);
 
@@ -66,11 +67,14 @@ export default function MindMapPage() {
   useEffect(() => {
     Promise.all([
       axios.get(`${API}/sections`),
-      axios.get(`${API}/models?limit=300`),
+      axios.get(`${API}/models?limit=300&view=summary`),
     ]).then(([sectionsRes, modelsRes]) => {
       setSections(sectionsRes.data);
       setModels(modelsRes.data);
     }).catch(console.error);
+    axios.get(`${API}/models/graph?cross_section=true`)
+      .then((r) => setGraphEdges(r.data.edges))
+      .catch(() => setGraphEdges([]));
   }, []);
 
   useEffect(() => {
@@ -158,9 +162,29 @@ export default function MindMapPage() {
       });
     });
 
+    // Cross-section similarity edges between the models shown on the map
+    const shownNodeIds = new Set(newNodes.map((n) => n.id));
+    const nodeIdByModelId = {};
+    models.forEach((m) => {
+      const nodeId = `model-${m.section_slug}-${m.model_index}`;
+      if (shownNodeIds.has(nodeId)) nodeIdByModelId[m.id] = nodeId;
+    });
+    graphEdges.forEach((edge) => {
+      const source = nodeIdByModelId[edge.source];
+      const target = nodeIdByModelId[edge.target];
+      if (!source || !target) return;
+      newEdges.push({
+        id: `e-related-${source}-${target}`,
+        source,
+        target,
+        type: "default",
+        style: { stroke: "#2563EB", strokeWidth: 0.5 + edge.score * 2, strokeDasharray: "4 4", opacity: 0.6 },
+      });
+    });
+
     setNodes(newNodes);
     setEdges(newEdges);
-  }, [sections, models, setNodes, setEdges]);
+  }, [sections, models, graphEdges, setNodes, setEdges]);
 
   const onNodeClick = useCallback(
     (_, node) => {
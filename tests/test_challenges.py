@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import challenges
+from indexes import ensure_indexes
+from sqlite_store import SQLiteClient
+
+MODELS = {f"m{n}": {"title": f"Model {n}", "section_slug": "s", "model_index": n} for n in range(6)}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def db():
+    client = SQLiteClient(":memory:")
+    db = client["test"]
+    run(ensure_indexes(db))
+    yield db
+    client.close()
+
+
+def start(db, user_id="u", models=("m0", "m1", "m2", "m3", "m4")):
+    challenge = challenges.new_challenge(list(models), MODELS.get)
+    return run(challenges.start(db, user_id, challenge))
+
+
+def reflections(db, challenge_id):
+    logs = run(db.challenge_logs.find({"challenge_id": challenge_id}, {"_id": 0, "day": 1, "reflection": 1}).to_list(None))
+    return {log["day"]: log["reflection"] for log in logs}
+
+
+def test_complete_day_records_the_day_and_reflection(db):
+    challenge = start(db)
+    result = run(challenges.complete_day(db, "u", 1, "first", challenge_id=challenge["id"]))
+    assert result["newly_completed"] and result["total_completed"] == 1
+    assert (result["streak"], result["last_run"], result["longest_streak"]) == (1, 1, 1)
+    assert reflections(db, challenge["id"]) == {1: "first"}
+
+    # Repeating a day keeps the count and only replaces the reflection when one is sent
+    result = run(challenges.complete_day(db, "u", 1, None))
+    assert not result["newly_completed"] and result["total_completed"] == 1
+    assert reflections(db, challenge["id"]) == {1: "first"}
+    run(challenges.complete_day(db, "u", 1, "edited"))
+    assert reflections(db, challenge["id"]) == {1: "edited"}
+
+
+def test_inactive_challenge_id_does_not_touch_its_logs(db):
+    old = start(db)
+    run(challenges.complete_day(db, "u", 1, "kept", challenge_id=old["id"]))
+    start(db, models=("m1", "m2", "m3", "m4", "m5"))
+
+    with pytest.raises(challenges.NoActiveChallenge):
+        run(challenges.complete_day(db, "u", 1, "overwritten", challenge_id=old["id"]))
+    with pytest.raises(challenges.NoActiveChallenge):
+        run(challenges.complete_day(db, "u", 2, "inserted", challenge_id=old["id"]))
+    assert reflections(db, old["id"]) == {1: "kept"}
+
+
+def test_other_users_challenge_id_is_rejected(db):
+    theirs = start(db, user_id="other")
+    start(db)
+    with pytest.raises(challenges.NoActiveChallenge):
+        run(challenges.complete_day(db, "u", 1, "mine", challenge_id=theirs["id"]))
+    assert run(db.challenge_logs.count_documents({})) == 0
+
+
+def test_concurrent_completions_count_a_day_once(db):
+    challenge = start(db)
+
+    async def complete_twice():
+        return await asyncio.gather(*(
+            challenges.complete_day(db, "u", 3, f"device {n}", challenge_id=challenge["id"]) for n in range(2)
+        ))
+
+    results = run(complete_twice())
+    assert sorted(r["newly_completed"] for r in results) == [False, True]
+    assert all(r["total_completed"] == 1 for r in results)
+    stored = run(db.challenges.find_one({"id": challenge["id"]}))
+    assert stored["completed_days"] == [3]
+    assert stored["completion_bitmap"] == challenges.day_bit(3)
+    assert run(db.challenge_logs.count_documents({"challenge_id": challenge["id"]})) == 1
+    counters = run(db.user_stats.find_one({"user_id": "u"}))
+    assert counters["challenge_progress"] == 1
@@ -0,0 +1,52 @@
+import pytest
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from database import DatabaseSettings, catalog_database, create_client
+from sqlite_store import SQLiteClient
+
+
+class Client:
+    def get_database(self, name, read_preference):
+        return name, read_preference
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("MONGO_CATALOG_READ_PREFERENCE", "primary")
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "7")
+    monkeypatch.setenv("STORAGE_BACKEND", "SQLite")
+    settings = DatabaseSettings.from_env()
+    assert (settings.catalog_read_preference, settings.max_pool_size) == ("primary", 7)
+    assert settings.storage_backend == "sqlite"
+    assert isinstance(catalog_database(Client(), settings)[1], Primary)
+
+
+def test_catalog_read_preference_defaults_to_secondary_preferred(monkeypatch):
+    monkeypatch.delenv("MONGO_CATALOG_READ_PREFERENCE", raising=False)
+    monkeypatch.setenv("MONGO_CATALOG_MAX_STALENESS_S", "120")
+    name, preference = catalog_database(Client(), DatabaseSettings.from_env())
+    assert isinstance(preference, SecondaryPreferred)
+    assert preference.max_staleness == 120
+
+
+@pytest.mark.parametrize("value", ["secondary_preferred", "PRIMARY", ""])
+def test_unknown_read_preference_names_the_variable(monkeypatch, value):
+    monkeypatch.setenv("MONGO_CATALOG_READ_PREFERENCE", value)
+    with pytest.raises(ValueError) as error:
+        DatabaseSettings.from_env()
+    message = str(error.value)
+    assert "MONGO_CATALOG_READ_PREFERENCE" in message and repr(value) in message
+    assert "primary, primaryPreferred, secondary, secondaryPreferred, nearest" in message
+
+
+def test_describe_hides_the_connection_string():
+    settings = DatabaseSettings(url="mongodb://user:secret@db:27017")
+    assert "url" not in settings.describe()
+    assert "secret" not in repr(settings.describe())
+
+
+def test_storage_backend_selects_the_client(tmp_path):
+    client = create_client(DatabaseSettings(storage_backend="sqlite", sqlite_path=str(tmp_path)))
+    assert isinstance(client, SQLiteClient)
+    client.close()
+    with pytest.raises(ValueError, match="STORAGE_BACKEND"):
+        create_client(DatabaseSettings(storage_backend="postgres"))
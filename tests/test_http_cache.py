@@ -0,0 +1,200 @@
+import asyncio
+import gzip
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from starlette.requests import Request
+
+from catalog import Catalog
+import http_cache
+from http_cache import CachedBody, CatalogResponses
+from sqlite_store import SQLiteClient
+
+UPDATED_AT = datetime(2024, 3, 1, 12, 30, 15, 500000, tzinfo=timezone.utc)
+BODY = b'{"models": [' + b",".join(b'{"id": "m%d", "title": "Model"}' % n for n in range(100)) + b"]}"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def load_responses(**kwargs) -> CatalogResponses:
+    client = SQLiteClient(":memory:")
+    db = client["test"]
+    run(db.sections.insert_one({"index": 1, "slug": "s", "title": "Section"}))
+    run(db.mental_models.insert_one({"id": "m", "section_index": 1, "section_slug": "s", "model_index": 1}))
+    run(db.meta.insert_one({"_id": "catalog", "version": "v1", "updated_at": UPDATED_AT.isoformat()}))
+    catalog = Catalog()
+    responses = CatalogResponses(catalog, lambda snapshot: {"models": BODY}, **kwargs)
+    run(catalog.load(db))
+    client.close()
+    return responses
+
+
+@pytest.fixture(scope="module")
+def responses():
+    return load_responses(max_age=60, stale_while_revalidate=600)
+
+
+def request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def get(responses, **headers):
+    return responses.respond(request(**headers), "models", lambda: pytest.fail("pre-rendered body re-rendered"))
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def test_full_response_carries_validators(responses):
+    response = get(responses)
+    entry = CachedBody(BODY)
+    assert response.status_code == 200
+    assert response.body == BODY
+    assert response.headers["etag"] == entry.etag()
+    assert response.headers["last-modified"] == "Fri, 01 Mar 2024 12:30:15 GMT"
+    assert response.headers["cache-control"] == "public, max-age=60, stale-while-revalidate=600"
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("if_none_match", [
+    '"{hash}"',
+    'W/"{hash}"',
+    '"{hash}-gzip"',
+    'W/"{hash}-br"',
+    '"other", W/"{hash}-gzip" , "more"',
+    "*",
+])
+def test_matching_etag_is_not_modified(responses, if_none_match):
+    entry = CachedBody(BODY)
+    response = get(responses, if_none_match=if_none_match.format(hash=entry.hash), accept_encoding="gzip")
+    assert response.status_code == 304
+    assert response.body == b""
+    # A 304 repeats the validators and caching headers of the full response
+    assert response.headers["etag"] == entry.etag("gzip")
+    assert response.headers["last-modified"] == "Fri, 01 Mar 2024 12:30:15 GMT"
+    assert response.headers["cache-control"] == responses.cache_control
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.parametrize("if_none_match", ['"other"', 'W/"other-gzip", "stale"', '""', "W/"])
+def test_other_etags_get_the_body(responses, if_none_match):
+    assert get(responses, if_none_match=if_none_match).status_code == 200
+
+
+@pytest.mark.parametrize("since, status", [
+    (UPDATED_AT, 304),
+    # Last-Modified has whole seconds, so the same second is not modified
+    (UPDATED_AT.replace(microsecond=0), 304),
+    (UPDATED_AT + timedelta(days=1), 304),
+    (UPDATED_AT - timedelta(seconds=1), 200),
+])
+def test_if_modified_since(responses, since, status):
+    assert get(responses, if_modified_since=http_date(since)).status_code == status
+
+
+@pytest.mark.parametrize("header", ["not a date", "", "Fri, 01 Mar 2024 12:30:15"])
+def test_unusable_if_modified_since_is_ignored(responses, header):
+    assert get(responses, if_modified_since=header).status_code == 200
+
+
+def test_if_none_match_takes_precedence(responses):
+    later = http_date(UPDATED_AT + timedelta(days=1))
+    assert get(responses, if_none_match='"other"', if_modified_since=later).status_code == 200
+    earlier = http_date(UPDATED_AT - timedelta(days=1))
+    hash = CachedBody(BODY).hash
+    assert get(responses, if_none_match=f'"{hash}"', if_modified_since=earlier).status_code == 304
+
+
+def test_later_last_modified_overrides_the_catalogs(responses):
+    day_start = datetime(2024, 6, 1, tzinfo=timezone(timedelta(hours=2)))
+    response = responses.send(request(), CachedBody(b"{}"), last_modified=day_start)
+    assert response.headers["last-modified"] == "Fri, 31 May 2024 22:00:00 GMT"
+    response = responses.send(request(), CachedBody(b"{}"), last_modified=UPDATED_AT - timedelta(days=1))
+    assert response.headers["last-modified"] == "Fri, 01 Mar 2024 12:30:15 GMT"
+
+
+needs_brotli = pytest.mark.skipif(http_cache.brotli is None, reason="brotli is not installed")
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP;Q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=nonsense", None),
+    ("deflate, compress", None),
+    pytest.param("gzip, deflate, br", "br", marks=needs_brotli),
+    pytest.param("*", "br", marks=needs_brotli),
+    ("br;q=0, *", "gzip"),
+    pytest.param("gzip;q=1.0, br;q=0.5", "gzip", marks=needs_brotli),
+    pytest.param("gzip;q=0.5, br;q=0.5", "br", marks=needs_brotli),
+    ("*;q=0", None),
+    ("identity;q=0, gzip", "gzip"),
+    pytest.param("identity;q=0, *", "br", marks=needs_brotli),
+])
+def test_negotiate_honours_q_values(accept_encoding, expected):
+    assert CachedBody(BODY).negotiate(accept_encoding) == expected
+
+
+def test_small_bodies_are_not_compressed():
+    entry = CachedBody(b"{}")
+    assert entry.encoded == {}
+    assert entry.negotiate("gzip, br") is None
+
+
+def test_encoded_response(responses):
+    response = get(responses, accept_encoding="gzip;q=1, br;q=0")
+    entry = CachedBody(BODY)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == entry.etag("gzip")
+    assert gzip.decompress(response.body) == BODY
+
+
+def test_identity_is_served_when_nothing_else_is_acceptable(responses):
+    # identity;q=0 without an acceptable coding is answered unencoded rather than with 406
+    response = get(responses, accept_encoding="identity;q=0, deflate")
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.body == BODY
+
+
+def test_unknown_keys_are_kept_uncompressed_in_a_bounded_lru():
+    responses = load_responses(max_extra=2)
+    renders = []
+
+    def render(key):
+        renders.append(key)
+        return BODY + key.encode()
+
+    for key in ("a", "b", "a", "c", "a", "b"):
+        entry = responses.cached(key, lambda: render(key))
+        assert entry.body == BODY + key.encode()
+        assert entry.encoded == {}
+    # "b" is evicted for "c", then "c" for the re-rendered "b"
+    assert renders == ["a", "b", "c", "b"]
+    assert list(responses.catalog.derived("extra_responses")) == ["a", "b"]
+    assert responses.stats == {"hits": 2, "misses": 4, "evictions": 2}
+    # Pre-rendered bodies are served compressed and never enter the LRU
+    assert "gzip" in responses.cached("models", lambda: pytest.fail("re-rendered")).encoded
+    assert responses.stats["hits"] == 3
+
+
+def test_uncached_key_is_rendered_every_time(responses):
+    renders = []
+    for _ in range(2):
+        response = responses.respond(request(), None, lambda: renders.append(1) or BODY)
+        assert response.body == BODY
+    assert len(renders) == 2
+    assert None not in responses.catalog.derived("extra_responses")
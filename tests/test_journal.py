@@ -0,0 +1,196 @@
+import asyncio
+import base64
+import json
+
+import pytest
+
+import journal
+from indexes import ensure_indexes
+from sqlite_store import SQLiteClient
+
+ENTRIES = [
+    {"id": "a", "content": "quote \" and backslash \\ and \\u escape é中\U0001f600"},
+    {"id": "b", "content": "line\nbreak, comma ] bracket } brace"},
+    {"id": "c", "content": ""},
+]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def split(data: bytes, *cuts: int):
+    bounds = [0, *cuts, len(data)]
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def rows(*chunks: bytes):
+    async def collect():
+        return [row async for row in journal.iter_rows(stream(*chunks))]
+    return run(collect())
+
+
+def as_array() -> bytes:
+    return json.dumps(ENTRIES, ensure_ascii=False, indent=1).encode()
+
+
+def as_ndjson() -> bytes:
+    return b"\n".join(json.dumps(e, ensure_ascii=False).encode() for e in ENTRIES) + b"\n"
+
+
+@pytest.mark.parametrize("encode", [as_array, as_ndjson])
+def test_rows_survive_every_chunk_boundary(encode):
+    data = encode()
+    expected = list(enumerate(ENTRIES))
+    # Cuts land inside strings, escapes and multi-byte characters
+    for cut in range(1, len(data)):
+        assert rows(*split(data, cut)) == expected, cut
+    assert rows(*(data[i:i + 1] for i in range(len(data)))) == expected
+
+
+def test_leading_whitespace_and_empty_body():
+    assert rows(b"  \n", b" [", b"]") == []
+    assert rows(b"\n\n") == []
+    assert rows() == []
+
+
+@pytest.mark.parametrize("body, message", [
+    (b'[{"id": "a"}, {"id": ', "Invalid JSON"),
+    (b'[{"id": "a"}', "Unterminated JSON array"),
+    (b'[{"id": "a"} {"id": "b"}]', "Expected ','"),
+    (b'[{"id": "a"}] trailing', "Unexpected data"),
+    (b'[{"id": "a"}, nope]', "Invalid JSON"),
+])
+def test_malformed_array_stops_after_the_complete_rows(body, message):
+    parsed = []
+
+    async def collect():
+        async for row in journal.iter_rows(stream(*split(body, 5))):
+            parsed.append(row)
+
+    with pytest.raises(journal.MalformedBody, match=message):
+        run(collect())
+    assert parsed[:1] in ([], [(0, {"id": "a"})])
+
+
+def test_bad_ndjson_line_is_reported_in_place():
+    parsed = rows(b'{"id": "a"}\n{"id": \n{"id": "c"}')
+    assert parsed[0] == (0, {"id": "a"})
+    assert isinstance(parsed[1][1], journal.MalformedBody)
+    assert parsed[2] == (2, {"id": "c"})
+
+
+@pytest.mark.parametrize("chunks", [
+    [b'{"id": "a"}\n{"id": "\xff"}\n'],
+    [b'[{"id": "a"}, {"id": "\xe2\x82', b'"}]'],
+    [b'{"id": "a"}\n{"id": "\xe2\x82'],
+])
+def test_invalid_utf8_is_a_malformed_body(chunks):
+    with pytest.raises(journal.MalformedBody, match="UTF-8"):
+        rows(*chunks)
+
+
+def to_doc(row) -> dict:
+    if not isinstance(row, dict) or not isinstance(row.get("content"), str):
+        raise ValueError("content: Field required")
+    return {"user_id": "u", "id": row.get("id") or row["content"], "content": row["content"]}
+
+
+@pytest.fixture
+def db():
+    client = SQLiteClient(":memory:")
+    db = client["test"]
+    run(ensure_indexes(db))
+    yield db
+    client.close()
+
+
+def test_import_reports_invalid_and_duplicate_rows(db):
+    run(db.journal_entries.insert_one({"user_id": "other", "id": "x", "content": "theirs"}))
+    run(db.journal_entries.insert_one({"user_id": "u", "id": "y", "content": "mine"}))
+    body = b"\n".join([
+        b'{"id": "a", "content": "one"}',
+        b'{"id": "b"}',
+        b'{"id": "a", "content": "again"}',
+        b'not json',
+        b'{"id": "x", "content": "same id as another user"}',
+        b'{"id": "y", "content": "already imported"}',
+        b'{"id": "c", "content": "three"}',
+    ])
+    report = run(journal.import_entries(db, stream(*split(body, 40, 90)), to_doc, chunk_size=2))
+    assert (report["inserted"], report["failed"], report["truncated"]) == (3, 4, False)
+    failed = {e["index"]: e["detail"] for e in report["errors"]}
+    assert sorted(failed) == [1, 2, 3, 5]
+    assert failed[1] == "content: Field required"
+    assert failed[2] == failed[5] == "Duplicate id"
+    assert failed[3].startswith("Invalid JSON")
+    ids = run(db.journal_entries.distinct("id", {"user_id": "u"}))
+    assert sorted(ids) == ["a", "c", "x", "y"]
+
+
+def test_import_keeps_rows_before_a_malformed_body(db):
+    report = run(journal.import_entries(
+        db, stream(b'[{"content": "kept"}, ', b'{"content": "\xff"}]'), to_doc,
+    ))
+    assert (report["inserted"], report["truncated"]) == (1, True)
+    assert report["errors"] == [{"index": 1, "detail": "Body is not valid UTF-8"}]
+
+    report = run(journal.import_entries(
+        db, stream(b'{"content": "also kept"}\n', b'{"content": "\xff"}\n'), to_doc,
+    ))
+    assert (report["inserted"], report["truncated"]) == (1, True)
+    assert report["errors"] == [{"index": 1, "detail": "Body is not valid UTF-8"}]
+
+
+def test_import_stops_at_the_row_limit(db):
+    body = b"".join(b'{"content": "row %d"}\n' % n for n in range(5))
+    report = run(journal.import_entries(db, stream(body), to_doc, max_rows=3))
+    assert (report["inserted"], report["truncated"]) == (3, True)
+    assert report["errors"] == [{"index": 3, "detail": "Row limit of 3 reached"}]
+
+
+def test_cursor_round_trips():
+    entry = {"created_at": "2024-01-02T03:04:05.000006+00:00", "id": "é/+?=", "content": "ignored"}
+    cursor = journal.encode_cursor(entry)
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert journal.decode_cursor(cursor) == (entry["created_at"], entry["id"])
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    journal.encode_cursor({"created_at": "2024-01-01", "id": "a"})[:-3],
+    journal.encode_cursor({"created_at": "2024-01-01", "id": "a"})[::-1],
+    base64.urlsafe_b64encode(b'["2024-01-01"]').decode(),
+    base64.urlsafe_b64encode(b'["2024-01-01", "a", "b"]').decode(),
+    base64.urlsafe_b64encode(b'["2024-01-01", 1]').decode(),
+    base64.urlsafe_b64encode(b'{"created_at": "2024-01-01", "id": "a"}').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(journal.InvalidCursor):
+        journal.page_query("u", cursor)
+
+
+def test_pages_walk_every_entry_once(db):
+    # Several entries share a timestamp, so the id breaks ties
+    entries = [
+        {"user_id": user, "id": f"e{n:02d}", "created_at": f"2024-01-{n // 4 + 1:02d}T00:00:00+00:00"}
+        for n in range(23) for user in ("u", "other")
+    ]
+    run(db.journal_entries.insert_many(entries))
+    seen, cursor = [], None
+    while True:
+        page = run(db.journal_entries.find(journal.page_query("u", cursor), {"_id": 0})
+                   .sort(journal.JOURNAL_SORT).limit(5).to_list(5))
+        seen.extend(page)
+        if len(page) < 5:
+            break
+        cursor = journal.encode_cursor(page[-1])
+    assert all(e["user_id"] == "u" for e in seen)
+    assert [e["id"] for e in seen] == [f"e{n:02d}" for n in reversed(range(23))]
+    assert journal.page_query("u") == {"user_id": "u"}
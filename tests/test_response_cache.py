@@ -0,0 +1,220 @@
+import asyncio
+
+import pytest
+
+from response_cache import AsyncLRUCache, cached, normalize_text
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Version:
+    def __init__(self):
+        self.value = 1
+
+    def __call__(self):
+        return self.value
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_cache(**kwargs):
+    clock, version = Clock(), Version()
+    cache = AsyncLRUCache("test", clock=clock, version=version, **{"maxsize": 4, "ttl": 10, **kwargs})
+    return cache, clock, version
+
+
+def value(result):
+    async def compute():
+        return result
+    return compute
+
+
+def test_hit_until_ttl_expires():
+    cache, clock, _ = make_cache()
+
+    async def scenario():
+        assert await cache.get_or_compute("k", value(1)) == 1
+        clock.now = 9.9
+        assert await cache.get_or_compute("k", value(2)) == 1
+        clock.now = 10
+        assert await cache.get_or_compute("k", value(3)) == 3
+
+    run(scenario())
+    assert cache.counters["hits"] == 1
+    assert cache.counters["misses"] == 2
+    assert cache.counters["expirations"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache, _, _ = make_cache(maxsize=2)
+
+    async def scenario():
+        await cache.get_or_compute("a", value("a"))
+        await cache.get_or_compute("b", value("b"))
+        await cache.get_or_compute("a", value("stale"))  # "a" is now the most recently used
+        await cache.get_or_compute("c", value("c"))
+        return [await cache.get_or_compute(key, value("new")) for key in ("a", "c", "b")]
+
+    # "b" was evicted for "c"; recomputing it then evicts "a"
+    assert run(scenario()) == ["a", "c", "new"]
+    assert list(cache._entries) == ["c", "b"]
+    assert cache.counters["evictions"] == 2
+
+
+def test_version_change_drops_entries():
+    cache, _, version = make_cache()
+
+    async def scenario():
+        await cache.get_or_compute("a", value(1))
+        await cache.get_or_compute("b", value(1))
+        version.value = 2
+        return await cache.get_or_compute("a", value(2)), await cache.get_or_compute("b", value(2))
+
+    assert run(scenario()) == (2, 2)
+    assert cache.counters["invalidations"] == 2
+    assert cache.counters["misses"] == 4
+
+
+def test_result_computed_across_a_version_change_is_not_stored():
+    cache, _, version = make_cache()
+
+    async def compute():
+        version.value = 2
+        return "old"
+
+    async def scenario():
+        assert await cache.get_or_compute("k", compute) == "old"
+        return await cache.get_or_compute("k", value("new"))
+
+    assert run(scenario()) == "new"
+
+
+def test_concurrent_misses_share_one_computation():
+    cache, _, _ = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return {"n": 1}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+
+    results = run(scenario())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert cache.counters["misses"] == 1
+    assert cache.counters["coalesced"] == 4
+
+
+def test_error_is_shared_with_waiters_and_not_stored():
+    cache, _, _ = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(3)), return_exceptions=True)
+        return results, await cache.get_or_compute("k", value("ok"))
+
+    results, retry = run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert results[1] is results[0]
+    assert retry == "ok"
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_cancelled_first_caller_hands_over_to_a_waiter():
+    cache, _, _ = make_cache()
+    started = []
+
+    async def compute(result):
+        started.append(result)
+        await asyncio.sleep(0.01)
+        return result
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_compute("k", lambda: compute("first")))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", lambda: compute("waiter")))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await waiter
+
+    # The waiter is not cancelled with the first caller; it computes instead
+    assert run(scenario()) == "waiter"
+    assert started == ["first", "waiter"]
+    assert cache.counters["coalesced"] == 1
+    assert cache.counters["misses"] == 2
+
+
+def test_cancelled_waiter_leaves_the_computation_running():
+    cache, _, _ = make_cache()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await first, await cache.get_or_compute("k", value("again"))
+
+    assert run(scenario()) == ("done", "done")
+
+
+def test_cached_normalizes_arguments():
+    cache, _, _ = make_cache()
+    calls = []
+
+    @cached(cache, normalize={"q": normalize_text})
+    async def search(q, limit=10):
+        calls.append((q, limit))
+        return [q]
+
+    async def scenario():
+        return [
+            await search("  Sunk   Cost"),
+            await search("sunk cost", limit=10),
+            await search(q="SUNK\tCOST"),
+            await search("sunk cost", 5),
+            await search("sunk  cost \n "),
+        ]
+
+    assert run(scenario()) == [["sunk cost"]] * 4 + [["sunk cost "]]
+    assert calls == [("sunk cost", 10), ("sunk cost", 5), ("sunk cost ", 10)]
+    assert search.cache is cache
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", ""),
+    ("   ", ""),
+    ("Bias", "bias"),
+    ("  Confirmation\t  BIAS", "confirmation bias"),
+    # A completed last word stays distinct from one still being typed
+    ("bias ", "bias "),
+    ("confirmation   bias \t\n", "confirmation bias "),
+])
+def test_normalize_text(value, expected):
+    assert normalize_text(value) == expected
@@ -0,0 +1,110 @@
+import pytest
+
+from search import MAX_PREFIX_EXPANSIONS, SearchIndex, stem, tokenize
+
+DOCS = [
+    {"title": "Opportunity Cost", "explanation": "What you give up by choosing.", "example": "Planning a trip."},
+    {"title": "Sunk Cost Fallacy", "explanation": "Throwing good money after bad.", "example": "A costly project."},
+    {"title": "Inversion", "explanation": "Think about the cost of failure first.", "example": "Avoid stupidity."},
+    {"title": "Margin of Safety", "explanation": "Plan for things going wrong.", "example": "Bridges are overbuilt."},
+    {"title": "Compounding", "explanation": "Small gains compound over time.", "example": "Interest compounds."},
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SearchIndex(DOCS)
+
+
+def titles(hits):
+    return [hit.doc["title"] for hit in hits]
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("planning", "plan"),
+    ("compounds", "compound"),
+    ("costly", "cost"),
+    ("relations", "relate"),
+    ("stupidity", "stupidity"),
+    ("class", "class"),
+    ("gas", "gas"),
+    ("2024", "2024"),
+])
+def test_stem(word, expected):
+    assert stem(word) == expected
+
+
+def test_tokenize_drops_stop_words_and_keeps_offsets():
+    text = "The Cost of Planning"
+    assert tokenize(text) == [("cost", "cost", 4, 8), ("planning", "plan", 12, 20)]
+    assert [text[start:end] for _, _, start, end in tokenize(text)] == ["Cost", "Planning"]
+
+
+def test_title_matches_outrank_body_matches(index):
+    hits = index.search("cost", prefix=False)
+    # Two title matches, then the explanation match
+    assert titles(hits)[2] == "Inversion"
+    assert set(titles(hits)[:2]) == {"Opportunity Cost", "Sunk Cost Fallacy"}
+    assert all(a.score >= b.score for a, b in zip(hits, hits[1:]))
+    # "Sunk Cost Fallacy" also has "costly" in its example
+    assert titles(hits)[0] == "Sunk Cost Fallacy"
+
+
+def test_all_words_must_match(index):
+    assert titles(index.search("cost failure")) == ["Inversion"]
+    assert index.search("cost compounding") == []
+    assert index.search("the of") == []
+    assert index.search("") == []
+
+
+def test_words_match_by_stem(index):
+    assert titles(index.search("compounded", prefix=False)) == ["Compounding"]
+    assert titles(index.search("plans", prefix=False)) == ["Margin of Safety", "Opportunity Cost"]
+
+
+def test_last_word_matches_by_prefix(index):
+    assert titles(index.search("compo")) == ["Compounding"]
+    assert titles(index.search("sunk co")) == ["Sunk Cost Fallacy"]
+    # Only the word being typed expands
+    assert index.search("co sunk") == []
+    assert index.search("compo", prefix=False) == []
+
+
+def test_trailing_space_completes_the_last_word(index):
+    assert titles(index.search("compo")) == ["Compounding"]
+    assert index.search("compo ") == []
+    assert set(titles(index.search("cost "))) == {"Opportunity Cost", "Sunk Cost Fallacy", "Inversion"}
+
+
+def test_prefix_expansion_is_bounded():
+    docs = [{"title": f"pre{n:03d}", "explanation": "", "example": ""} for n in range(MAX_PREFIX_EXPANSIONS * 2)]
+    assert len(SearchIndex(docs).search("pre")) == MAX_PREFIX_EXPANSIONS
+
+
+def test_allowed_and_limit(index):
+    assert titles(index.search("cost", allowed=[0, 2])) == ["Opportunity Cost", "Inversion"]
+    assert index.search("cost", allowed=[]) == []
+    hits = index.search("cost", limit=1)
+    assert titles(hits) == ["Sunk Cost Fallacy"]
+
+
+def test_ties_keep_catalog_order():
+    docs = [{"title": "Same words", "explanation": "", "example": ""} for _ in range(3)]
+    assert [hit.position for hit in SearchIndex(docs).search("same")] == [0, 1, 2]
+
+
+def test_highlights_point_at_matched_words(index):
+    hit = index.search("cost plan")[0]
+    assert hit.doc["title"] == "Opportunity Cost"
+    spans = index.highlights(hit)
+    assert spans == {"title": [[12, 16]], "example": [[0, 8]]}
+    assert [hit.doc[field][start:end] for field, ranges in spans.items() for start, end in ranges] == ["Cost", "Planning"]
+
+
+def test_highlights_cover_prefix_expansions(index):
+    hit = index.search("compoun")[0]
+    highlighted = {
+        field: [hit.doc[field][start:end] for start, end in ranges]
+        for field, ranges in index.highlights(hit).items()
+    }
+    assert highlighted == {"title": ["Compounding"], "explanation": ["compound"], "example": ["compounds"]}
@@ -0,0 +1,324 @@
+import asyncio
+
+import pytest
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from sqlite_store import DUPLICATE_KEY, SQLiteClient, _translate, matches
+
+DOCS = [
+    {"_id": 1, "a": 1, "b": "x", "n": {"x": 1}},
+    {"_id": 2, "a": 1.5, "b": "y"},
+    {"_id": 3, "a": "1", "b": "x", "n": {"x": "1"}},
+    {"_id": 4, "a": True, "b": None},
+    {"_id": 5, "a": False},
+    {"_id": 6, "a": None, "b": "z"},
+    {"_id": 7, "b": "x", "tags": ["p", "q"]},
+    {"_id": 8, "a": 0, "b": "w", "tags": []},
+    {"_id": 9, "a": "b", "n": {"x": 2}},
+]
+
+QUERIES = [
+    {},
+    {"a": 1},
+    {"a": 0},
+    {"a": True},
+    {"a": False},
+    {"a": "1"},
+    {"a": None},
+    {"a": {"$eq": 1.5}},
+    {"a": {"$gt": 0}},
+    {"a": {"$gte": 1, "$lt": 2}},
+    {"a": {"$lt": "c"}},
+    {"a": {"$gt": False}},
+    {"a": {"$in": [1, 0]}},
+    {"a": {"$in": [1, "b"]}},
+    {"a": {"$in": [True]}},
+    {"a": {"$ne": 1}},
+    {"a": {"$nin": [1, None]}},
+    {"a": {"$exists": False}},
+    {"b": "x", "a": {"$exists": True}},
+    {"n.x": 1},
+    {"n.x": {"$gte": 1}},
+    {"$or": [{"a": 1}, {"b": "z"}]},
+    {"$or": [{"a": {"$lt": 1}}, {"b": "x", "a": {"$gt": 1}}]},
+    {"$and": [{"a": {"$gte": 0}}, {"a": {"$lte": 1}}]},
+    {"$nor": [{"b": "x"}]},
+    {"tags": "p"},
+    {"tags": {"$size": 0}},
+    {"_id": 3},
+    {"_id": {"$in": [1, 9]}},
+    {"_id": {"$gt": 4}},
+]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def db():
+    client = SQLiteClient(":memory:")
+    yield client["test"]
+    client.close()
+
+
+def ids(docs):
+    return sorted(d["_id"] for d in docs)
+
+
+@pytest.fixture
+def docs(db):
+    run(db.indexed.create_indexes([
+        IndexModel([("a", ASCENDING)], name="a"),
+        IndexModel([("b", ASCENDING), ("n.x", ASCENDING)], name="b_n.x"),
+    ]))
+    for name in ("indexed", "plain"):
+        run(db[name].insert_many([dict(d) for d in DOCS]))
+    return db
+
+
+@pytest.mark.parametrize("query", QUERIES, ids=repr)
+def test_pushdown_matches_python_matcher(docs, query):
+    expected = [d["_id"] for d in DOCS if matches(d, query)]
+    assert ids(run(docs.indexed.find(query).to_list(None))) == expected
+    assert ids(run(docs.plain.find(query).to_list(None))) == expected
+    assert run(docs.indexed.count_documents(query)) == len(expected)
+
+
+def test_comparisons_stay_within_a_type_bracket(docs):
+    assert ids(run(docs.indexed.find({"a": 1}).to_list(None))) == [1]
+    assert ids(run(docs.indexed.find({"a": True}).to_list(None))) == [4]
+    assert ids(run(docs.indexed.find({"a": {"$gt": 0}}).to_list(None))) == [1, 2]
+    assert ids(run(docs.indexed.find({"a": {"$lt": "c"}}).to_list(None))) == [3, 9]
+    assert ids(run(docs.indexed.find({"a": None}).to_list(None))) == [6, 7]
+    assert _translate({"a": {"$gt": 0}}, docs.indexed.indexed_fields)[2]
+
+
+def test_projection_sort_skip_limit(docs):
+    found = run(docs.indexed.find({"b": {"$in": ["x", "y", "z"]}}, {"_id": 0, "b": 1}).sort("b", -1).skip(1).limit(2)
+                .to_list(None))
+    assert found == [{"b": "y"}, {"b": "x"}]
+    assert run(docs.plain.find_one({"_id": 1}, {"n.x": 1})) == {"_id": 1, "n": {"x": 1}}
+    assert run(docs.plain.find_one({"_id": 2}, {"a": 0, "_id": 0})) == {"b": "y"}
+
+
+@pytest.mark.parametrize("collection", ["indexed", "plain"])
+def test_skip_and_limit_without_sort(db, collection):
+    run(db.indexed.create_indexes([IndexModel([("k", ASCENDING)], name="k")]))
+    run(db[collection].insert_many([{"_id": n, "k": 1} for n in range(1, 6)] + [{"_id": 6, "k": 2}]))
+    assert _translate({"k": 1}, db.indexed.indexed_fields)[2]
+
+    def found(cursor):
+        return [d["_id"] for d in run(cursor.to_list(None))]
+
+    assert found(db[collection].find({"k": 1}).skip(2).limit(2)) == [3, 4]
+    assert found(db[collection].find({"k": 1}).skip(2)) == [3, 4, 5]
+    assert found(db[collection].find({"k": 1}).limit(2)) == [1, 2]
+    assert found(db[collection].find({"k": 1}).skip(5)) == []
+
+
+def test_keyset_pagination_with_or(db):
+    run(db.journal.create_indexes([
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_id_created_at_id"),
+    ]))
+    entries = [
+        {"user_id": user, "created_at": f"2024-01-{n // 3:02d}", "id": f"e{n:02d}"}
+        for n in range(25) for user in ("u", "other")
+    ]
+    run(db.journal.insert_many(entries))
+    sort = [("created_at", -1), ("id", -1)]
+    pages, query = [], {"user_id": "u"}
+    while True:
+        page = run(db.journal.find(query, {"_id": 0}).sort(sort).limit(4).to_list(4))
+        pages.extend(page)
+        if len(page) < 4:
+            break
+        last = page[-1]
+        query = {"user_id": "u", "$or": [
+            {"created_at": {"$lt": last["created_at"]}},
+            {"created_at": last["created_at"], "id": {"$lt": last["id"]}},
+        ]}
+        # Keyset pages are answered by SQL alone, including ORDER BY and LIMIT
+        assert _translate(query, db.journal.indexed_fields)[2]
+    expected = sorted((e for e in entries if e["user_id"] == "u"), key=lambda e: (e["created_at"], e["id"]), reverse=True)
+    assert [e["id"] for e in pages] == [e["id"] for e in expected]
+
+
+def test_update_operators(db):
+    run(db.c.insert_one({"_id": "d", "n": 1, "tags": ["a"], "bits": 1, "gone": 1, "nested": {"k": 1}}))
+    run(db.c.update_one({"_id": "d"}, {
+        "$set": {"nested.k": 2, "nested.new": True},
+        "$unset": {"gone": ""},
+        "$inc": {"n": 2, "fresh": 5},
+        "$max": {"high": 3},
+        "$min": {"n": 10},
+        "$addToSet": {"tags": {"$each": ["a", "b", "b"]}},
+        "$push": {"log": "x"},
+        "$bit": {"bits": {"or": 4}},
+    }))
+    doc = run(db.c.find_one({"_id": "d"}))
+    assert doc == {
+        "_id": "d", "n": 3, "tags": ["a", "b"], "bits": 5, "nested": {"k": 2, "new": True},
+        "fresh": 5, "high": 3, "log": ["x"],
+    }
+    run(db.c.update_one({"_id": "d"}, {"$pull": {"tags": "a", "log": {"$in": ["x"]}}}))
+    doc = run(db.c.find_one({"_id": "d"}, {"tags": 1, "log": 1, "_id": 0}))
+    assert doc == {"tags": ["b"], "log": []}
+    with pytest.raises(OperationFailure):
+        run(db.c.update_one({"_id": "d"}, {"$rename": {"n": "m"}}))
+
+
+def test_upserts(db):
+    query = {"user_id": "u", "kind": {"$eq": "k"}, "n": {"$gt": 100}}
+    update = {"$inc": {"count": 2}, "$setOnInsert": {"created": 1}}
+    result = run(db.c.update_one(query, update, upsert=True))
+    assert result.upserted_id is not None
+    # Only equality conditions seed the new document
+    doc = run(db.c.find_one({"_id": result.upserted_id}, {"_id": 0}))
+    assert doc == {"user_id": "u", "kind": "k", "count": 2, "created": 1}
+
+    result = run(db.c.update_one({"user_id": "u"}, {"$inc": {"count": 2}, "$setOnInsert": {"created": 2}}, upsert=True))
+    assert (result.upserted_id, result.matched_count, result.modified_count) == (None, 1, 1)
+    assert run(db.c.find_one({"user_id": "u"}, {"_id": 0, "count": 1, "created": 1})) == {"count": 4, "created": 1}
+
+    after = run(db.c.find_one_and_update(
+        {"user_id": "v"}, {"$set": {"x": 1}}, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER,
+    ))
+    assert after == {"user_id": "v", "x": 1}
+    assert run(db.c.find_one_and_update({"user_id": "w"}, {"$set": {"x": 1}})) is None
+
+    result = run(db.c.bulk_write([
+        UpdateOne({"user_id": "z"}, {"$set": {"x": 1}}, upsert=True),
+        UpdateOne({"user_id": "u"}, {"$set": {"x": 1}}, upsert=True),
+        UpdateMany({"x": 1}, {"$set": {"y": 1}}),
+    ]))
+    assert (result.upserted_count, result.matched_count, result.modified_count) == (1, 4, 4)
+
+
+def test_unique_index(db):
+    run(db.c.create_indexes([IndexModel([("id", ASCENDING)], name="id", unique=True)]))
+    run(db.c.insert_one({"id": "a"}))
+    with pytest.raises(DuplicateKeyError) as error:
+        run(db.c.insert_one({"id": "a"}))
+    assert error.value.code == DUPLICATE_KEY
+
+    with pytest.raises(BulkWriteError) as error:
+        run(db.c.insert_many([{"id": "b"}, {"id": "a"}, {"id": "c"}], ordered=False))
+    assert error.value.details["nInserted"] == 2
+    assert [(e["index"], e["code"]) for e in error.value.details["writeErrors"]] == [(1, DUPLICATE_KEY)]
+
+    with pytest.raises(BulkWriteError) as error:
+        run(db.c.bulk_write([InsertOne({"id": "d"}), InsertOne({"id": "a"}), InsertOne({"id": "e"})], ordered=True))
+    assert error.value.details["nInserted"] == 1
+    assert run(db.c.count_documents({"id": "e"})) == 0
+
+    with pytest.raises(DuplicateKeyError):
+        run(db.c.update_one({"id": "b"}, {"$set": {"id": "a"}}))
+
+
+def test_unique_index_build_and_spec_conflicts(db):
+    run(db.c.insert_many([{"k": 1}, {"k": 1}]))
+    with pytest.raises(OperationFailure) as error:
+        run(db.c.create_indexes([IndexModel([("k", ASCENDING)], name="k", unique=True)]))
+    assert error.value.code == DUPLICATE_KEY
+
+    run(db.c.create_indexes([IndexModel([("k", ASCENDING)], name="k")]))
+    # Declaring the same index again is a no-op; changing it is a conflict
+    run(db.c.create_indexes([IndexModel([("k", ASCENDING)], name="k")]))
+    with pytest.raises(OperationFailure) as error:
+        run(db.c.create_indexes([IndexModel([("k", DESCENDING)], name="k")]))
+    assert error.value.code == 86
+
+    run(db.c.drop_index("k"))
+    assert "k" not in run(db.c.index_information())
+    with pytest.raises(OperationFailure) as error:
+        run(db.c.drop_index("k"))
+    assert error.value.code == 27
+
+
+def test_partial_unique_index(db):
+    run(db.challenges.create_indexes([
+        IndexModel([("user_id", ASCENDING)], name="user_id_active", unique=True,
+                   partialFilterExpression={"is_active": True}),
+    ]))
+    info = run(db.challenges.index_information())["user_id_active"]
+    assert info["unique"] and info["partialFilterExpression"] == {"is_active": True}
+
+    run(db.challenges.insert_many([
+        {"user_id": "u", "is_active": False},
+        {"user_id": "u", "is_active": False},
+        {"user_id": "u", "is_active": True},
+        {"user_id": "v", "is_active": True},
+        # 1 is not true, so it is outside the index like in MongoDB
+        {"user_id": "u", "is_active": 1},
+    ]))
+    with pytest.raises(DuplicateKeyError):
+        run(db.challenges.insert_one({"user_id": "u", "is_active": True}))
+
+    # Deactivate-then-insert in one ordered bulk, as a challenge start does
+    run(db.challenges.bulk_write([
+        UpdateMany({"user_id": "u", "is_active": True}, {"$set": {"is_active": False}}),
+        InsertOne({"user_id": "u", "is_active": True, "id": "new"}),
+    ], ordered=True))
+    active = run(db.challenges.find({"user_id": "u", "is_active": True}).to_list(None))
+    assert [c["id"] for c in active] == ["new"]
+
+
+def test_text_search(db):
+    with pytest.raises(OperationFailure):
+        run(db.notes.find({"$text": {"$search": "focus"}}).to_list(None))
+    run(db.notes.create_indexes([
+        IndexModel([("user_id", ASCENDING), ("content", TEXT), ("title", TEXT)],
+                   name="user_id_text", weights={"content": 1, "title": 3}),
+    ]))
+    run(db.notes.insert_many([
+        {"_id": 1, "user_id": "u", "content": "deep focus today", "title": "morning"},
+        {"_id": 2, "user_id": "u", "content": "nothing relevant", "title": "focus"},
+        {"_id": 3, "user_id": "u", "content": "unrelated words", "title": "evening"},
+        {"_id": 4, "user_id": "other", "content": "focus focus", "title": "focus"},
+    ]))
+    found = run(db.notes.find(
+        {"user_id": "u", "$text": {"$search": "focus"}}, {"score": {"$meta": "textScore"}, "_id": 1},
+    ).sort([("score", {"$meta": "textScore"})]).to_list(None))
+    # The title match outranks the content match; non-matching documents are dropped
+    assert [d["_id"] for d in found] == [2, 1]
+    assert found[0]["score"] > found[1]["score"] > 0
+    assert run(db.notes.count_documents({"user_id": "u", "$text": {"$search": "focus"}})) == 2
+
+
+def test_distinct_and_aggregate(docs):
+    assert sorted(run(docs.plain.distinct("b", {"b": {"$ne": None}}))) == ["w", "x", "y", "z"]
+    grouped = run(docs.plain.aggregate([
+        {"$match": {"b": {"$in": ["x", "y"]}}},
+        {"$group": {"_id": "$b", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None))
+    assert grouped == [{"_id": "x", "ids": [1, 3, 7], "count": 3}, {"_id": "y", "ids": [2], "count": 1}]
+    with pytest.raises(OperationFailure):
+        run(docs.plain.aggregate([{"$indexStats": {}}]).to_list(None))
+
+
+def test_change_streams_are_unavailable(db):
+    async def watch():
+        async with db.watch([]):
+            pass
+
+    with pytest.raises(OperationFailure) as error:
+        run(watch())
+    assert error.value.code == 40573
+
+
+def test_file_storage_persists(tmp_path):
+    client = SQLiteClient(str(tmp_path))
+    run(client["app"].c.create_indexes([IndexModel([("k", ASCENDING)], name="k", unique=True)]))
+    run(client["app"].c.insert_one({"k": 1, "v": "kept"}))
+    mode = client["app"]._execute("PRAGMA journal_mode").fetchone()[0]
+    client.close()
+    assert mode == "wal"
+
+    client = SQLiteClient(str(tmp_path))
+    assert run(client["app"].c.find_one({"k": 1}, {"_id": 0})) == {"k": 1, "v": "kept"}
+    with pytest.raises(DuplicateKeyError):
+        run(client["app"].c.insert_one({"k": 1}))
+    client.close()
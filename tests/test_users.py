@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from indexes import ensure_indexes
+from sqlite_store import SQLiteClient
+from users import DEFAULT_USER_ID, claim_default
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def db():
+    client = SQLiteClient(":memory:")
+    db = client["test"]
+    run(ensure_indexes(db))
+    yield db
+    client.close()
+
+
+def owned(db, collection, user_id):
+    return sorted(d["id"] for d in run(db[collection].find({"user_id": user_id}).to_list(None)))
+
+
+def test_claim_moves_the_default_partition(db):
+    run(db.journal_entries.insert_many([{"user_id": DEFAULT_USER_ID, "id": f"e{n}"} for n in range(3)]))
+    run(db.challenges.insert_one({"user_id": DEFAULT_USER_ID, "id": "c", "is_active": True}))
+    run(db.challenge_logs.insert_one({"user_id": DEFAULT_USER_ID, "id": "l", "challenge_id": "c", "day": 1}))
+    run(db.user_progress.insert_one({"user_id": DEFAULT_USER_ID, "read_models": ["m1"], "bookmarks": []}))
+    run(db.user_progress.insert_one({"user_id": "u", "read_models": ["m2"], "bookmarks": ["m3"]}))
+
+    moved, skipped = run(claim_default(db, "u"))
+    assert moved == {"journal_entries": 3, "challenges": 1, "challenge_logs": 1, "user_progress": 1}
+    assert not any(skipped.values())
+    assert owned(db, "journal_entries", "u") == ["e0", "e1", "e2"]
+    progress = run(db.user_progress.find_one({"user_id": "u"}))
+    assert sorted(progress["read_models"]) == ["m1", "m2"] and progress["bookmarks"] == ["m3"]
+    assert run(db.user_progress.count_documents({"user_id": DEFAULT_USER_ID})) == 0
+
+    # Nothing is left to claim
+    moved, skipped = run(claim_default(db, "v"))
+    assert not any(moved.values()) and not any(skipped.values())
+
+
+def test_claim_skips_entries_the_user_already_has(db):
+    run(db.journal_entries.insert_many(
+        [{"user_id": DEFAULT_USER_ID, "id": f"e{n}", "content": "original"} for n in range(4)]
+        # The user imported the default partition's export before claiming it
+        + [{"user_id": "u", "id": f"e{n}", "content": "imported"} for n in (1, 3)]
+    ))
+    moved, skipped = run(claim_default(db, "u"))
+    assert (moved["journal_entries"], skipped["journal_entries"]) == (2, 2)
+    assert owned(db, "journal_entries", "u") == ["e0", "e1", "e2", "e3"]
+    assert owned(db, "journal_entries", DEFAULT_USER_ID) == ["e1", "e3"]
+    contents = {d["id"]: d["content"] for d in run(db.journal_entries.find({"user_id": "u"}).to_list(None))}
+    assert contents == {"e0": "original", "e1": "imported", "e2": "original", "e3": "imported"}
+
+
+def test_claimants_active_challenge_stays_active(db):
+    run(db.challenges.insert_many([
+        {"user_id": DEFAULT_USER_ID, "id": "old", "is_active": True},
+        {"user_id": "u", "id": "mine", "is_active": True},
+    ]))
+    moved, _ = run(claim_default(db, "u"))
+    assert moved["challenges"] == 1
+    active = run(db.challenges.find({"user_id": "u", "is_active": True}).to_list(None))
+    assert [c["id"] for c in active] == ["mine"]
+
+
+def test_default_user_cannot_claim_itself(db):
+    run(db.journal_entries.insert_one({"user_id": DEFAULT_USER_ID, "id": "e"}))
+    assert run(claim_default(db, DEFAULT_USER_ID)) == ({}, {})
+    assert owned(db, "journal_entries", DEFAULT_USER_ID) == ["e"]